@@ -17,6 +17,8 @@ from flask_cors import CORS, cross_origin # Import CORS
 # Import services
 from services.auth_service import AuthService
 from services.supabase_service import SupabaseService
+from utils.auth_utils import init_request_auth
+from core.container import get_container
 # Payment service import
 try:
     from services.payment_service import PaymentService
@@ -181,6 +183,8 @@ def create_app():
   
   # Create Supabase client with service role key for admin operations
   app.supabase_service = SupabaseService(supabase_url, supabase_service_role_key)
+  # Share the one client with every service (SubscriptionService, LifecycleSubscriptionService, ...)
+  get_container().register_singleton('supabase_client', app.supabase_service.supabase)
   
   # Initialize PaymentService
   app.payment_service = None
@@ -209,6 +213,32 @@ def create_app():
       print("Authentication features will be disabled.")
       app.auth_service = None
 
+  # Resolve the caller once per request and share it via flask.g
+  init_request_auth(app)
+
+  # Process Paystack webhook events stored by /api/payment/webhook
+  if app.payment_service:
+      try:
+          from services.webhook_inbox import webhook_inbox
+          webhook_inbox.register_handler('payment', app.payment_service.process_webhook)
+      except Exception as e:
+          print(f"Warning: Failed to start webhook inbox workers: {str(e)}")
+
+  # Start the outbound email workers so mail queued before a restart is delivered
+  try:
+      from services.email_outbox import email_outbox
+      email_outbox.start()
+      print("Email outbox workers started.")
+  except Exception as e:
+      print(f"Warning: Failed to start email outbox workers: {str(e)}")
+
+  # Convert meal plans stored in older shapes to the canonical format in the background
+  try:
+      from services.meal_plan_format import register_meal_plan_jobs
+      register_meal_plan_jobs(lambda: app.supabase_service.supabase)
+  except Exception as e:
+      print(f"Warning: Failed to schedule meal plan format migration: {str(e)}")
+
   # Register blueprints with API prefix
   app.register_blueprint(feedback_bp, url_prefix='/api')
   app.register_blueprint(meal_plan_bp, url_prefix='/api')
@@ -235,6 +265,14 @@ def create_app():
   if LIFECYCLE_ROUTES_ENABLED:
       app.register_blueprint(lifecycle_bp, url_prefix='/api/lifecycle')
       print("Lifecycle routes registered.")
+      # Expire lapsed trials/subscriptions periodically (one leader worker per host)
+      try:
+          from routes.lifecycle_routes import get_lifecycle_service
+          from services.maintenance_scheduler import register_lifecycle_jobs
+          register_lifecycle_jobs(get_lifecycle_service)
+          print("Maintenance scheduler started.")
+      except Exception as e:
+          print(f"Warning: Failed to start maintenance scheduler: {str(e)}")
   else:
       print("Lifecycle routes disabled.")
 
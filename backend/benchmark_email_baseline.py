@@ -0,0 +1,488 @@
+"""
+Baseline for benchmark_email_templates.py: the f-string message builders
+EmailService used before the precompiled templates (services/email_templates.py).
+
+Each function is the body of the old sender from `msg = MIMEMultipart(...)`
+up to the SMTP send, copied unchanged apart from the From header and, for
+invitation_accepted, the dashboard link being passed in. Do not edit the
+markup: it is the comparison point, not a template.
+"""
+
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from typing import Optional
+
+
+def invitation(
+        from_header: str, to_email: str, enterprise_name: str, inviter_name: str, invitation_link: str,
+        custom_message: Optional[str] = None
+) -> MIMEMultipart:
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = f'Invitation to join {enterprise_name} on MeallensAI'
+    msg['From'] = from_header
+    msg['To'] = to_email
+
+    # Create HTML email body
+    html_body = f"""
+            <!DOCTYPE html>
+            <html>
+            <head>
+                <meta charset="UTF-8">
+                <meta name="viewport" content="width=device-width, initial-scale=1.0">
+                <style>
+                    body {{
+                        font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;
+                        line-height: 1.6;
+                        color: #333;
+                        max-width: 600px;
+                        margin: 0 auto;
+                        padding: 20px;
+                    }}
+                    .container {{
+                        background-color: #ffffff;
+                        border: 1px solid #e0e0e0;
+                        padding: 30px;
+                    }}
+                    .header {{
+                        text-align: center;
+                        margin-bottom: 30px;
+                    }}
+                    .logo {{
+                        font-size: 28px;
+                        font-weight: bold;
+                        color: #4CAF50;
+                    }}
+                    .content {{
+                        margin-bottom: 30px;
+                    }}
+                    .button {{
+                        display: inline-block;
+                        padding: 15px 30px;
+                        background-color: #4CAF50;
+                        color: white !important;
+                        text-decoration: none;
+                        font-weight: bold;
+                        text-align: center;
+                        margin: 20px 0;
+                    }}
+                    .button:hover {{
+                        background-color: #45a049;
+                    }}
+                    .custom-message {{
+                        background-color: #f5f5f5;
+                        border-left: 4px solid #4CAF50;
+                        padding: 15px;
+                        margin: 20px 0;
+                        font-style: italic;
+                    }}
+                    .footer {{
+                        margin-top: 30px;
+                        padding-top: 20px;
+                        border-top: 1px solid #e0e0e0;
+                        font-size: 12px;
+                        color: #666;
+                        text-align: center;
+                    }}
+                    .link {{
+                        color: #4CAF50;
+                        word-break: break-all;
+                    }}
+                </style>
+            </head>
+            <body>
+                <div class="container">
+                    <div class="header">
+                        <div class="logo">MeallensAI</div>
+                    </div>
+                    
+                    <div class="content">
+                        <h2>You've been invited!</h2>
+                        
+                        <p>Hello,</p>
+                        
+                        <p><strong>{inviter_name}</strong> has invited you to join <strong>{enterprise_name}</strong> on MeallensAI.</p>
+                        
+                        {f'<div class="custom-message"><strong>Personal message:</strong><br>{custom_message}</div>' if custom_message else ''}
+                        
+                        <p>MeallensAI is an AI-powered nutrition and meal planning platform that helps you make healthier food choices and create personalized meal plans.</p>
+                        
+                        <p>Click the button below to accept the invitation and get started:</p>
+                        
+                        <div style="text-align: center;">
+                            <a href="{invitation_link}" class="button">Accept Invitation</a>
+                        </div>
+                        
+                        <p>Or copy and paste this link into your browser:</p>
+                        <p class="link">{invitation_link}</p>
+                        
+                        <p><small>This invitation will expire in 30 days.</small></p>
+                    </div>
+                    
+                    <div class="footer">
+                        <p>This email was sent to {to_email} because {inviter_name} invited you to join their organization on MeallensAI.</p>
+                        <p>&copy; 2025 MeallensAI. All rights reserved.</p>
+                    </div>
+                </div>
+            </body>
+            </html>
+            """
+
+    # Create plain text version as fallback
+    text_body = f"""
+            You've been invited to join {enterprise_name} on MeallensAI!
+            
+            {inviter_name} has invited you to join their organization on MeallensAI.
+            
+            {f'Personal message: {custom_message}' if custom_message else ''}
+            
+            MeallensAI is an AI-powered nutrition and meal planning platform that helps you make healthier food choices and create personalized meal plans.
+            
+            Accept your invitation by visiting this link:
+            {invitation_link}
+            
+            This invitation will expire in 30 days.
+            
+            ---
+            This email was sent to {to_email} because {inviter_name} invited you to join their organization on MeallensAI.
+            © 2025 MeallensAI. All rights reserved.
+            """
+
+    # Attach both versions
+    msg.attach(MIMEText(text_body, 'plain'))
+    msg.attach(MIMEText(html_body, 'html'))
+    return msg
+
+
+def welcome(
+        from_header: str, to_email: str, enterprise_name: str
+) -> MIMEMultipart:
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = f'Welcome to {enterprise_name} on MeallensAI!'
+    msg['From'] = from_header
+    msg['To'] = to_email
+
+    html_body = f"""
+            <!DOCTYPE html>
+            <html>
+            <head>
+                <meta charset="UTF-8">
+                <style>
+                    body {{
+                        font-family: Arial, sans-serif;
+                        line-height: 1.6;
+                        color: #333;
+                        max-width: 600px;
+                        margin: 0 auto;
+                        padding: 20px;
+                    }}
+                    .container {{
+                        background-color: #ffffff;
+                        border: 1px solid #e0e0e0;
+                        padding: 30px;
+                    }}
+                    .header {{
+                        text-align: center;
+                        margin-bottom: 30px;
+                    }}
+                    .logo {{
+                        font-size: 28px;
+                        font-weight: bold;
+                        color: #4CAF50;
+                    }}
+                </style>
+            </head>
+            <body>
+                <div class="container">
+                    <div class="header">
+                        <div class="logo">MeallensAI</div>
+                    </div>
+                    
+                    <h2>Welcome to MeallensAI! 🎉</h2>
+                    
+                    <p>Congratulations! You've successfully joined <strong>{enterprise_name}</strong> on MeallensAI.</p>
+                    
+                    <p>You now have access to:</p>
+                    <ul>
+                        <li>AI-powered food detection and analysis</li>
+                        <li>Personalized meal planning</li>
+                        <li>Nutritional guidance tailored to your needs</li>
+                        <li>Access to recipes and meal suggestions</li>
+                    </ul>
+                    
+                    <p>Get started by logging in to your account and exploring the features!</p>
+                    
+                    <p>If you have any questions, don't hesitate to reach out to your healthcare provider or our support team.</p>
+                    
+                    <p>Best regards,<br>
+                    The MeallensAI Team</p>
+                </div>
+            </body>
+            </html>
+            """
+
+    msg.attach(MIMEText(html_body, 'html'))
+    return msg
+
+
+def user_creation(
+        from_header: str, to_email: str, enterprise_name: str, inviter_name: str, login_url: str
+) -> MIMEMultipart:
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = f'Your MeallensAI account has been created - {enterprise_name}'
+    msg['From'] = from_header
+    msg['To'] = to_email
+
+    html_body = f"""
+            <!DOCTYPE html>
+            <html>
+            <head>
+                <meta charset="UTF-8">
+                <style>
+                    body {{
+                        font-family: Arial, sans-serif;
+                        line-height: 1.6;
+                        color: #333;
+                        max-width: 600px;
+                        margin: 0 auto;
+                        padding: 20px;
+                    }}
+                    .container {{
+                        background-color: #ffffff;
+                        border: 1px solid #e0e0e0;
+                        padding: 30px;
+                    }}
+                    .header {{
+                        text-align: center;
+                        margin-bottom: 30px;
+                    }}
+                    .logo {{
+                        font-size: 28px;
+                        font-weight: bold;
+                        color: #4CAF50;
+                    }}
+                    .button {{
+                        display: inline-block;
+                        background-color: #4CAF50;
+                        color: white;
+                        padding: 12px 24px;
+                        text-decoration: none;
+                        border-radius: 5px;
+                        font-weight: bold;
+                        margin: 20px 0;
+                    }}
+                    .credentials {{
+                        background-color: #f9f9f9;
+                        border: 1px solid #ddd;
+                        padding: 15px;
+                        border-radius: 5px;
+                        margin: 20px 0;
+                    }}
+                </style>
+            </head>
+            <body>
+                <div class="container">
+                    <div class="header">
+                        <div class="logo">MeallensAI</div>
+                    </div>
+                    
+                    <h2>Your account has been created! 🎉</h2>
+                    
+                    <p>Hello,</p>
+                    
+                    <p><strong>{inviter_name}</strong> has created an account for you and added you to <strong>{enterprise_name}</strong> on MeallensAI.</p>
+                    
+                    <p>MeallensAI is an AI-powered nutrition and meal planning platform that helps you make healthier food choices and create personalized meal plans.</p>
+                    
+                    <div class="credentials">
+                        <h3>Your Login Information:</h3>
+                        <p><strong>Email:</strong> {to_email}</p>
+                        <p><strong>Password:</strong> [The password set by your organization admin]</p>
+                    </div>
+                    
+                    <p>Click the button below to log in and get started:</p>
+                    
+                    <div style="text-align: center;">
+                        <a href="{login_url}" class="button" target="_blank">Login to MeallensAI</a>
+                    </div>
+                    
+                    <p>Or copy and paste this link into your browser:</p>
+                    <p style="word-break: break-all; color: #666;">{login_url}</p>
+                    
+                    <p style="font-size: 12px; color: #666; margin-top: 20px;">
+                        <strong>Note:</strong> If you're already logged in as someone else, please log out first or open this link in a new browser tab/incognito window.
+                    </p>
+                    
+                    <p>Once logged in, you'll have access to:</p>
+                    <ul>
+                        <li>AI-powered food detection and analysis</li>
+                        <li>Personalized meal planning</li>
+                        <li>Nutritional guidance tailored to your needs</li>
+                        <li>Access to recipes and meal suggestions</li>
+                    </ul>
+                    
+                    <p>If you have any questions, please contact your organization administrator.</p>
+                    
+                    <hr style="margin: 30px 0; border: none; border-top: 1px solid #eee;">
+                    
+                    <p style="font-size: 12px; color: #666;">
+                        This email was sent to {to_email} because {inviter_name} created an account for you on MeallensAI.<br>
+                        © 2025 MeallensAI. All rights reserved.
+                    </p>
+                </div>
+            </body>
+            </html>
+            """
+
+    # Create the HTML part
+    html_part = MIMEText(html_body, 'html')
+    msg.attach(html_part)
+    return msg
+
+
+def invitation_accepted(
+        from_header: str, to_email: str, admin_name: str, accepted_user_email: str,
+        accepted_user_name: str, enterprise_name: str, role: str, dashboard_link: str
+) -> MIMEMultipart:
+    msg = MIMEMultipart('alternative')
+    msg['Subject'] = f'✅ {accepted_user_name or accepted_user_email} accepted your invitation to {enterprise_name}'
+    msg['From'] = from_header
+    msg['To'] = to_email
+
+    # Create HTML email body
+    html_body = f"""
+            <!DOCTYPE html>
+            <html>
+            <head>
+                <meta charset="UTF-8">
+                <meta name="viewport" content="width=device-width, initial-scale=1.0">
+                <style>
+                    body {{
+                        font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;
+                        line-height: 1.6;
+                        color: #333;
+                        max-width: 600px;
+                        margin: 0 auto;
+                        padding: 20px;
+                    }}
+                    .container {{
+                        background-color: #ffffff;
+                        border: 1px solid #e0e0e0;
+                        padding: 30px;
+                    }}
+                    .header {{
+                        text-align: center;
+                        margin-bottom: 30px;
+                    }}
+                    .logo {{
+                        font-size: 28px;
+                        font-weight: bold;
+                        color: #4CAF50;
+                    }}
+                    .success-badge {{
+                        background-color: #4CAF50;
+                        color: white;
+                        padding: 10px 20px;
+                        border-radius: 5px;
+                        display: inline-block;
+                        margin: 20px 0;
+                        font-weight: bold;
+                    }}
+                    .content {{
+                        margin-bottom: 30px;
+                    }}
+                    .user-info {{
+                        background-color: #f5f5f5;
+                        border-left: 4px solid #4CAF50;
+                        padding: 15px;
+                        margin: 20px 0;
+                    }}
+                    .button {{
+                        display: inline-block;
+                        padding: 15px 30px;
+                        background-color: #4CAF50;
+                        color: white !important;
+                        text-decoration: none;
+                        font-weight: bold;
+                        text-align: center;
+                        margin: 20px 0;
+                        border-radius: 5px;
+                    }}
+                    .footer {{
+                        margin-top: 30px;
+                        padding-top: 20px;
+                        border-top: 1px solid #e0e0e0;
+                        font-size: 12px;
+                        color: #666;
+                        text-align: center;
+                    }}
+                </style>
+            </head>
+            <body>
+                <div class="container">
+                    <div class="header">
+                        <div class="logo">MeallensAI</div>
+                    </div>
+                    
+                    <div class="content">
+                        <div class="success-badge">✓ Invitation Accepted</div>
+                        
+                        <h2>Great news, {admin_name}!</h2>
+                        
+                        <p>A user has accepted your invitation to join <strong>{enterprise_name}</strong>.</p>
+                        
+                        <div class="user-info">
+                            <p><strong>User Details:</strong></p>
+                            <p><strong>Name:</strong> {accepted_user_name or 'Not provided'}</p>
+                            <p><strong>Email:</strong> {accepted_user_email}</p>
+                            <p><strong>Role:</strong> {role}</p>
+                        </div>
+                        
+                        <p>You can now view and manage this user's settings from your enterprise dashboard.</p>
+                        
+                        <p style="text-align: center; margin-top: 30px;">
+                            <a href="{dashboard_link}" class="button">View in Dashboard</a>
+                        </p>
+                    </div>
+                    
+                    <div class="footer">
+                        <p>This is an automated notification from MeallensAI</p>
+                        <p>You received this email because you are an administrator of {enterprise_name}</p>
+                    </div>
+                </div>
+            </body>
+            </html>
+            """
+
+    text_body = f"""
+            Invitation Accepted
+            
+            Great news, {admin_name}!
+            
+            A user has accepted your invitation to join {enterprise_name}.
+            
+            User Details:
+            Name: {accepted_user_name or 'Not provided'}
+            Email: {accepted_user_email}
+            Role: {role}
+            
+            You can now view and manage this user's settings from your enterprise dashboard.
+            
+            View Dashboard: {dashboard_link}
+            
+            ---
+            This is an automated notification from MeallensAI
+            You received this email because you are an administrator of {enterprise_name}
+            """
+
+    # Attach both HTML and plain text versions
+    msg.attach(MIMEText(text_body, 'plain'))
+    msg.attach(MIMEText(html_body, 'html'))
+    return msg
+
+
+BASELINE = {
+    'invitation': invitation,
+    'welcome': welcome,
+    'user_creation': user_creation,
+    'invitation_accepted': invitation_accepted,
+}
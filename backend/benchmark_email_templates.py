@@ -0,0 +1,90 @@
+#!/usr/bin/env python
+"""
+Micro-benchmark for the precompiled email templates against the old senders.
+
+For each email, times the per-message work EmailService does per recipient
+before SMTP, for both the f-string builders EmailService used before the
+templates (benchmark_email_baseline.py) and the current render_email +
+build_message path:
+
+    build   render the bodies and build the MIME message
+    total   build plus as_bytes(), i.e. what is handed to SMTP
+
+Best of 3 runs. Run from the backend directory:
+
+    python benchmark_email_templates.py [iterations]
+"""
+
+import sys
+import timeit
+
+from benchmark_email_baseline import BASELINE
+from services.email_templates import TEMPLATES, build_message, render_email
+
+SAMPLE_PARAMS = {
+    'invitation': {
+        'to_email': 'new.member@example.com',
+        'enterprise_name': 'Green Valley Clinic',
+        'inviter_name': 'admin@example.com',
+        'invitation_link': 'https://www.meallensai.com/accept-invitation?token=abcdefghijklmnopqrstuvwxyz012345',
+        'custom_message': 'Looking forward to working with you & your team!',
+    },
+    'welcome': {
+        'enterprise_name': 'Green Valley Clinic',
+    },
+    'user_creation': {
+        'to_email': 'new.member@example.com',
+        'enterprise_name': 'Green Valley Clinic',
+        'inviter_name': 'admin@example.com',
+        'login_url': 'https://www.meallensai.com/accept-invitation',
+    },
+    'invitation_accepted': {
+        'admin_name': 'Clinic Admin',
+        'accepted_user_email': 'new.member@example.com',
+        'accepted_user_name': 'New Member',
+        'enterprise_name': 'Green Valley Clinic',
+        'role': 'patient',
+        'dashboard_link': 'https://www.meallensai.com/enterprise',
+    },
+}
+
+FROM_HEADER = 'MeallensAI <noreply@example.com>'
+
+
+def per_message_us(func, iterations: int) -> float:
+    return min(timeit.repeat(func, number=iterations, repeat=3)) / iterations * 1e6
+
+
+def bench(name: str, iterations: int) -> None:
+    params = SAMPLE_PARAMS[name]
+    to_email = params.get('to_email', 'admin@example.com')
+    baseline_params = {key: value for key, value in params.items() if key != 'to_email'}
+
+    def old_build():
+        return BASELINE[name](FROM_HEADER, to_email, **baseline_params)
+
+    def new_build():
+        return build_message(render_email(name, params), FROM_HEADER, to_email)
+
+    old_build_us = per_message_us(old_build, iterations)
+    new_build_us = per_message_us(new_build, iterations)
+    old_total_us = per_message_us(lambda: old_build().as_bytes(), iterations)
+    new_total_us = per_message_us(lambda: new_build().as_bytes(), iterations)
+
+    change = (new_total_us - old_total_us) / old_total_us * 100
+    print(
+        f"{name:<22} build {old_build_us:7.1f} -> {new_build_us:7.1f} us   "
+        f"total {old_total_us:7.1f} -> {new_total_us:7.1f} us/message ({change:+.0f}%)"
+    )
+
+
+def main() -> None:
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    print(f"Email template benchmark, old f-string senders -> templates ({iterations} iterations per email)")
+    print("-" * 96)
+    for name in TEMPLATES:
+        bench(name, iterations)
+
+
+if __name__ == '__main__':
+    main()
@@ -44,6 +44,8 @@ class Config:
     SUPABASE_URL = os.environ.get("SUPABASE_URL")
     SUPABASE_ANON_KEY = os.environ.get("SUPABASE_ANON_KEY")
     SUPABASE_SERVICE_ROLE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+    SUPABASE_JWT_SECRET = os.environ.get("SUPABASE_JWT_SECRET")
+    SUPABASE_LOCAL_JWT_VERIFY = os.environ.get("SUPABASE_LOCAL_JWT_VERIFY", "true").lower() == "true"
     
     # Payment Configuration
     PAYSTACK_SECRET_KEY = os.environ.get("PAYSTACK_SECRET_KEY")
@@ -8,6 +8,7 @@ from config.settings import get_config, Config
 from core.extensions import init_extensions
 from core.service_registry import init_services
 from core.blueprints import register_blueprints
+from utils.auth_utils import init_request_auth
 
 # Configure logging
 logging.basicConfig(
@@ -47,6 +48,9 @@ def create_app(config_name: str = None) -> Flask:
         logger.error("Failed to initialize required services")
         raise RuntimeError("Service initialization failed")
     
+    # Resolve the caller once per request and share it via flask.g
+    init_request_auth(app)
+    
     # Register blueprints (routes)
     logger.info("Registering blueprints...")
     register_blueprints(app)
@@ -13,6 +13,11 @@ def get_supabase_service() -> Optional[SupabaseService]:
     return get_service('supabase_service')
 
 
+def get_supabase_client() -> Optional[any]:
+    """Get the shared Supabase client from container"""
+    return get_service('supabase_client')
+
+
 def get_auth_service() -> Optional[AuthService]:
     """Get Auth service from container"""
     return get_service('auth_service')
@@ -32,7 +32,13 @@ def init_services(config: Config) -> bool:
             config.SUPABASE_SERVICE_ROLE_KEY
         )
         container.register_singleton('supabase_service', supabase_service)
+        # Single Supabase client shared by every service in this worker
+        container.register_singleton('supabase_client', supabase_service.supabase)
         logger.info("Supabase service initialized successfully")
+
+        # Background conversion of meal plans stored in older shapes
+        from services.meal_plan_format import register_meal_plan_jobs
+        register_meal_plan_jobs(lambda: supabase_service.supabase)
         
         # Initialize Auth Service (Required)
         logger.info("Initializing Auth service...")
@@ -47,6 +53,9 @@ def init_services(config: Config) -> bool:
                 logger.info("Initializing Payment service...")
                 payment_service = PaymentService(supabase_service.supabase)
                 container.register_singleton('payment_service', payment_service)
+                
+                from services.webhook_inbox import webhook_inbox
+                webhook_inbox.register_handler('payment', payment_service.process_webhook)
                 logger.info("Payment service initialized successfully")
             except ImportError as e:
                 logger.warning(f"Payment service not available: {e}")
@@ -59,7 +68,7 @@ def init_services(config: Config) -> bool:
         try:
             from services.subscription_service import SubscriptionService
             logger.info("Initializing Subscription service...")
-            subscription_service = SubscriptionService()
+            subscription_service = SubscriptionService(supabase_service.supabase)
             container.register_singleton('subscription_service', subscription_service)
             logger.info("Subscription service initialized successfully")
         except ImportError as e:
@@ -71,9 +80,14 @@ def init_services(config: Config) -> bool:
         try:
             from services.lifecycle_subscription_service import LifecycleSubscriptionService
             logger.info("Initializing Lifecycle Subscription service...")
-            lifecycle_service = LifecycleSubscriptionService()
+            lifecycle_service = LifecycleSubscriptionService(supabase_service.supabase)
             container.register_singleton('lifecycle_service', lifecycle_service)
             logger.info("Lifecycle Subscription service initialized successfully")
+
+            from services.maintenance_scheduler import maintenance_scheduler, register_lifecycle_jobs
+            register_lifecycle_jobs(lambda: lifecycle_service)
+            container.register_singleton('maintenance_scheduler', maintenance_scheduler)
+            logger.info("Maintenance scheduler started")
         except ImportError as e:
             logger.warning(f"Lifecycle Subscription service not available: {e}")
         except Exception as e:
@@ -88,6 +102,11 @@ def init_services(config: Config) -> bool:
                 email_service = EmailService()
                 container.register_singleton('email_service', email_service)
                 logger.info("Email service initialized successfully")
+                
+                from services.email_outbox import email_outbox
+                email_outbox.start()
+                container.register_singleton('email_outbox', email_outbox)
+                logger.info("Email outbox workers started")
             except ImportError as e:
                 logger.warning(f"Email service not available: {e}")
             except Exception as e:
@@ -0,0 +1,38 @@
+-- ═══════════════════════════════════════════════════════════════════
+-- ADD CASE-INSENSITIVE EMAIL LOOKUP FOR PROFILES
+-- ═══════════════════════════════════════════════════════════════════
+-- Invite/create-user flows used to walk auth.admin.list_users() to find an
+-- existing account by email. That only returns the first page and costs a
+-- full scan. This migration adds an index on lower(email) and a service-role
+-- RPC that resolves an email to a user id in a single indexed lookup.
+
+-- Case-insensitive index used by find_user_id_by_email
+CREATE INDEX IF NOT EXISTS idx_profiles_email_lower ON public.profiles (lower(email));
+
+-- Resolve an email to a user id: profiles first, then auth.users
+-- (GoTrue stores emails lowercased, so the plain email index applies there)
+CREATE OR REPLACE FUNCTION public.find_user_id_by_email(p_email TEXT)
+RETURNS UUID
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    SELECT matched.id
+    FROM (
+        SELECT p.id, 1 AS priority
+        FROM public.profiles p
+        WHERE lower(p.email) = lower(trim(p_email))
+        UNION ALL
+        SELECT u.id, 2 AS priority
+        FROM auth.users u
+        WHERE u.email = lower(trim(p_email))
+    ) AS matched
+    ORDER BY matched.priority
+    LIMIT 1;
+$$;
+
+-- Only the backend (service role) may resolve emails
+REVOKE ALL ON FUNCTION public.find_user_id_by_email(TEXT) FROM PUBLIC;
+REVOKE ALL ON FUNCTION public.find_user_id_by_email(TEXT) FROM anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.find_user_id_by_email(TEXT) TO service_role;
@@ -0,0 +1,31 @@
+-- ═══════════════════════════════════════════════════════════════════
+-- ADD BULK EMAIL -> USER ID LOOKUP
+-- ═══════════════════════════════════════════════════════════════════
+-- Bulk invitations need to know which of several hundred emails already
+-- belong to an account. This resolves the whole list in one call using the
+-- same indexes as find_user_id_by_email (migration 006).
+
+CREATE OR REPLACE FUNCTION public.find_user_ids_by_emails(p_emails TEXT[])
+RETURNS TABLE (email TEXT, user_id UUID)
+LANGUAGE sql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    SELECT DISTINCT ON (matched.email) matched.email, matched.user_id
+    FROM (
+        SELECT lower(p.email) AS email, p.id AS user_id, 1 AS priority
+        FROM public.profiles p
+        WHERE lower(p.email) = ANY (SELECT lower(trim(e)) FROM unnest(p_emails) AS e)
+        UNION ALL
+        SELECT u.email::TEXT AS email, u.id AS user_id, 2 AS priority
+        FROM auth.users u
+        WHERE u.email = ANY (SELECT lower(trim(e)) FROM unnest(p_emails) AS e)
+    ) AS matched
+    ORDER BY matched.email, matched.priority;
+$$;
+
+-- Only the backend (service role) may resolve emails
+REVOKE ALL ON FUNCTION public.find_user_ids_by_emails(TEXT[]) FROM PUBLIC;
+REVOKE ALL ON FUNCTION public.find_user_ids_by_emails(TEXT[]) FROM anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.find_user_ids_by_emails(TEXT[]) TO service_role;
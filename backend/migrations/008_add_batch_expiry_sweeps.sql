@@ -0,0 +1,88 @@
+-- ═══════════════════════════════════════════════════════════════════
+-- ADD BATCH EXPIRY SWEEPS FOR TRIALS AND SUBSCRIPTIONS
+-- ═══════════════════════════════════════════════════════════════════
+-- check_and_update_expired_trials / _subscriptions used to fetch every
+-- expired row and call mark_trial_used / mark_subscription_expired once per
+-- user over HTTP. These functions expire one chunk of due rows per call and
+-- return the affected users.
+--
+-- Each due row still goes through mark_trial_used / mark_subscription_expired,
+-- now called inside the database: besides flipping the row they update the
+-- user's lifecycle state (trial_used / expired), and their definitions are not
+-- part of this repository, so the batch must not reimplement only the row
+-- change. The row itself is then flipped (user_trials.is_used = TRUE,
+-- user_subscriptions.status = 'expired') so a chunk always makes progress.
+--
+-- Expired rows stop matching the due predicate, so the backend simply calls
+-- again until a chunk comes back short. SKIP LOCKED lets a sweep run
+-- alongside another one (or a user's own activation) without blocking.
+
+CREATE OR REPLACE FUNCTION public.expire_trials_batch(p_limit INTEGER DEFAULT 500)
+RETURNS TABLE (user_id UUID)
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+#variable_conflict use_column
+DECLARE
+    v_due RECORD;
+BEGIN
+    FOR v_due IN
+        SELECT d.id, d.user_id
+        FROM public.user_trials AS d
+        WHERE d.is_used = FALSE
+          AND d.end_date < NOW()
+        ORDER BY d.end_date
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    LOOP
+        PERFORM public.mark_trial_used(v_due.user_id);
+        UPDATE public.user_trials AS t SET is_used = TRUE WHERE t.id = v_due.id;
+        user_id := v_due.user_id;
+        RETURN NEXT;
+    END LOOP;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.expire_subscriptions_batch(p_limit INTEGER DEFAULT 500)
+RETURNS TABLE (user_id UUID)
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+#variable_conflict use_column
+DECLARE
+    v_due RECORD;
+BEGIN
+    FOR v_due IN
+        SELECT d.id, d.user_id
+        FROM public.user_subscriptions AS d
+        WHERE d.status = 'active'
+          AND d.current_period_end <= NOW()
+        ORDER BY d.current_period_end
+        LIMIT p_limit
+        FOR UPDATE SKIP LOCKED
+    LOOP
+        PERFORM public.mark_subscription_expired(v_due.user_id);
+        UPDATE public.user_subscriptions AS s
+        SET status = 'expired', updated_at = NOW()
+        WHERE s.id = v_due.id AND s.status = 'active';
+        user_id := v_due.user_id;
+        RETURN NEXT;
+    END LOOP;
+END;
+$$;
+
+-- Partial indexes so each chunk is an index range scan, not a table scan
+CREATE INDEX IF NOT EXISTS idx_user_trials_unused_end_date
+    ON public.user_trials (end_date) WHERE is_used = FALSE;
+CREATE INDEX IF NOT EXISTS idx_user_subscriptions_active_period_end
+    ON public.user_subscriptions (current_period_end) WHERE status = 'active';
+
+-- Only the backend (service role) may run sweeps
+REVOKE ALL ON FUNCTION public.expire_trials_batch(INTEGER) FROM PUBLIC;
+REVOKE ALL ON FUNCTION public.expire_trials_batch(INTEGER) FROM anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.expire_trials_batch(INTEGER) TO service_role;
+REVOKE ALL ON FUNCTION public.expire_subscriptions_batch(INTEGER) FROM PUBLIC;
+REVOKE ALL ON FUNCTION public.expire_subscriptions_batch(INTEGER) FROM anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.expire_subscriptions_batch(INTEGER) TO service_role;
@@ -0,0 +1,84 @@
+-- ═══════════════════════════════════════════════════════════════════
+-- ADD DAY-TO-OFFSET INDEX FOR MEAL PLAN JSON PROJECTION
+-- ═══════════════════════════════════════════════════════════════════
+-- Day and meal endpoints only need one element of the meal_plan document.
+-- day_index records where the day array lives inside meal_plan and the array
+-- offset of each day, e.g.
+--   {"path": ["mealPlan"], "days": {"Monday": 0, "Tuesday": 1}}
+-- so the backend can select meal_plan->mealPlan->1 through PostgREST instead
+-- of downloading and parsing the whole document.
+--
+-- It is maintained by a trigger, so every writer (inserts, RPC updates)
+-- keeps it current. Rows whose meal_plan has no recognisable day array get
+-- NULL and are served by the full-document path.
+
+ALTER TABLE public.meal_plan_management
+    ADD COLUMN IF NOT EXISTS day_index JSONB;
+
+CREATE OR REPLACE FUNCTION public.meal_plan_day_index(p_meal_plan JSONB)
+RETURNS JSONB
+LANGUAGE plpgsql
+IMMUTABLE
+AS $$
+DECLARE
+    v_days JSONB;
+    v_path TEXT[];
+    v_index JSONB := '{}'::JSONB;
+    v_elem JSONB;
+    v_offset BIGINT;
+BEGIN
+    IF p_meal_plan IS NULL THEN
+        RETURN NULL;
+    END IF;
+
+    -- Same shapes the API accepts: a bare day list, {mealPlan: [...]},
+    -- and the legacy {plan_data: {mealPlan: [...]}} / {plan_data: [...]} envelopes
+    IF jsonb_typeof(p_meal_plan) = 'array' THEN
+        v_days := p_meal_plan; v_path := ARRAY[]::TEXT[];
+    ELSIF jsonb_typeof(p_meal_plan -> 'plan_data' -> 'mealPlan') = 'array' THEN
+        v_days := p_meal_plan -> 'plan_data' -> 'mealPlan'; v_path := ARRAY['plan_data', 'mealPlan'];
+    ELSIF jsonb_typeof(p_meal_plan -> 'plan_data') = 'array' THEN
+        v_days := p_meal_plan -> 'plan_data'; v_path := ARRAY['plan_data'];
+    ELSIF jsonb_typeof(p_meal_plan -> 'mealPlan') = 'array' THEN
+        v_days := p_meal_plan -> 'mealPlan'; v_path := ARRAY['mealPlan'];
+    ELSE
+        RETURN NULL;
+    END IF;
+
+    FOR v_elem, v_offset IN
+        SELECT value, ordinality - 1 FROM jsonb_array_elements(v_days) WITH ORDINALITY
+    LOOP
+        -- First occurrence wins, matching the API's linear search
+        IF jsonb_typeof(v_elem -> 'day') = 'string' AND NOT v_index ? (v_elem ->> 'day') THEN
+            v_index := v_index || jsonb_build_object(v_elem ->> 'day', v_offset);
+        END IF;
+    END LOOP;
+
+    RETURN jsonb_build_object('path', to_jsonb(v_path), 'days', v_index);
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION public.set_meal_plan_day_index()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    BEGIN
+        NEW.day_index := public.meal_plan_day_index(to_jsonb(NEW.meal_plan));
+    EXCEPTION WHEN OTHERS THEN
+        -- Never block a save over the index; NULL falls back to full reads
+        NEW.day_index := NULL;
+    END;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_meal_plan_day_index ON public.meal_plan_management;
+CREATE TRIGGER trg_meal_plan_day_index
+    BEFORE INSERT OR UPDATE OF meal_plan ON public.meal_plan_management
+    FOR EACH ROW EXECUTE FUNCTION public.set_meal_plan_day_index();
+
+-- Backfill existing plans
+UPDATE public.meal_plan_management
+SET day_index = public.meal_plan_day_index(to_jsonb(meal_plan))
+WHERE day_index IS NULL AND meal_plan IS NOT NULL;
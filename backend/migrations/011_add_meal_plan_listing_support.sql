@@ -0,0 +1,43 @@
+-- ═══════════════════════════════════════════════════════════════════
+-- MEAL PLAN LISTING: SUMMARY DAY COUNT + KEYSET INDEX
+-- ═══════════════════════════════════════════════════════════════════
+-- GET /api/meal_plan?view=summary returns plan metadata without the
+-- meal_plan document. day_count is stored (maintained by the same trigger as
+-- day_index, migration 010) so a summary never reads the JSON blob.
+-- Pages are walked by (updated_at, id) descending; the index below serves
+-- that order per user.
+
+ALTER TABLE public.meal_plan_management
+    ADD COLUMN IF NOT EXISTS day_count INTEGER;
+
+CREATE OR REPLACE FUNCTION public.set_meal_plan_day_index()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    BEGIN
+        NEW.day_index := public.meal_plan_day_index(to_jsonb(NEW.meal_plan));
+        NEW.day_count := CASE
+            WHEN NEW.day_index IS NULL THEN NULL
+            ELSE jsonb_array_length(
+                to_jsonb(NEW.meal_plan) #> ARRAY(SELECT jsonb_array_elements_text(NEW.day_index -> 'path'))
+            )
+        END;
+    EXCEPTION WHEN OTHERS THEN
+        -- Never block a save over the index; NULL falls back to full reads
+        NEW.day_index := NULL;
+        NEW.day_count := NULL;
+    END;
+    RETURN NEW;
+END;
+$$;
+
+-- Backfill existing plans
+UPDATE public.meal_plan_management
+SET day_count = jsonb_array_length(
+    to_jsonb(meal_plan) #> ARRAY(SELECT jsonb_array_elements_text(day_index -> 'path'))
+)
+WHERE day_count IS NULL AND day_index IS NOT NULL;
+
+CREATE INDEX IF NOT EXISTS idx_meal_plan_management_user_updated
+    ON public.meal_plan_management (user_id, updated_at DESC, id DESC);
@@ -0,0 +1,45 @@
+-- ═══════════════════════════════════════════════════════════════════
+-- CANONICAL MEAL PLAN STORAGE FORMAT (format_version)
+-- ═══════════════════════════════════════════════════════════════════
+-- Format 1: meal_plan is a bare JSON array of day objects; name, start_date
+-- and end_date live in their own columns. Readers skip all shape detection
+-- for such rows (see services/meal_plan_format.py).
+--
+-- format_version is derived from the stored shape by a trigger, so no writer
+-- (direct inserts, the update_meal_plan RPC) can mislabel a row:
+--   1    meal_plan is an array
+--   NULL anything else; the backend's background migration converts the row
+--        or marks it 0 (no recognisable day list, served by the legacy path)
+-- Bump the literal below together with MEAL_PLAN_FORMAT_VERSION.
+
+ALTER TABLE public.meal_plan_management
+    ADD COLUMN IF NOT EXISTS format_version SMALLINT;
+
+CREATE OR REPLACE FUNCTION public.set_meal_plan_format_version()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF jsonb_typeof(to_jsonb(NEW.meal_plan)) = 'array' THEN
+        NEW.format_version := 1;
+    ELSE
+        NEW.format_version := NULL;
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_meal_plan_format_version ON public.meal_plan_management;
+CREATE TRIGGER trg_meal_plan_format_version
+    BEFORE INSERT OR UPDATE OF meal_plan ON public.meal_plan_management
+    FOR EACH ROW EXECUTE FUNCTION public.set_meal_plan_format_version();
+
+-- Rows already stored as a day list are canonical; the rest are left NULL
+-- for the background migration
+UPDATE public.meal_plan_management
+SET format_version = 1
+WHERE format_version IS NULL AND jsonb_typeof(to_jsonb(meal_plan)) = 'array';
+
+-- Lets the background migration find remaining rows without a scan
+CREATE INDEX IF NOT EXISTS idx_meal_plan_management_unmigrated
+    ON public.meal_plan_management (id) WHERE format_version IS NULL;
@@ -0,0 +1,45 @@
+-- ═══════════════════════════════════════════════════════════════════
+-- MEAL PLAN CONTENT HASH (DEDUPLICATION)
+-- ═══════════════════════════════════════════════════════════════════
+-- content_hash is a SHA-256 of the canonical day list together with name,
+-- start_date, end_date, has_sickness and sickness_type, computed by the
+-- backend (services/meal_plan_format.py). At most one row per user may carry
+-- a given hash: re-saving an identical plan bumps the existing row, and the
+-- backend's compaction job hashes older rows and deletes exact copies.
+-- NULL hashes (not yet compacted, legacy shapes, empty plans) are not constrained.
+
+ALTER TABLE public.meal_plan_management
+    ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_meal_plan_management_user_content_hash
+    ON public.meal_plan_management (user_id, content_hash);
+
+-- Writers that change any hashed column without supplying a new hash (e.g.
+-- the update_meal_plan RPC) invalidate it; compaction re-hashes the row
+CREATE OR REPLACE FUNCTION public.clear_stale_meal_plan_hash()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    IF NEW.content_hash IS NOT DISTINCT FROM OLD.content_hash
+       AND (to_jsonb(NEW.meal_plan) IS DISTINCT FROM to_jsonb(OLD.meal_plan)
+            OR NEW.name IS DISTINCT FROM OLD.name
+            OR NEW.start_date IS DISTINCT FROM OLD.start_date
+            OR NEW.end_date IS DISTINCT FROM OLD.end_date
+            OR NEW.has_sickness IS DISTINCT FROM OLD.has_sickness
+            OR NEW.sickness_type IS DISTINCT FROM OLD.sickness_type) THEN
+        NEW.content_hash := NULL;
+    END IF;
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_meal_plan_clear_stale_hash ON public.meal_plan_management;
+CREATE TRIGGER trg_meal_plan_clear_stale_hash
+    BEFORE UPDATE OF meal_plan, name, start_date, end_date, has_sickness, sickness_type
+    ON public.meal_plan_management
+    FOR EACH ROW EXECUTE FUNCTION public.clear_stale_meal_plan_hash();
+
+-- Lets compaction find unhashed canonical rows without a scan
+CREATE INDEX IF NOT EXISTS idx_meal_plan_management_unhashed
+    ON public.meal_plan_management (id) WHERE content_hash IS NULL AND format_version = 1;
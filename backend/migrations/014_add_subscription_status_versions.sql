@@ -0,0 +1,100 @@
+-- ═══════════════════════════════════════════════════════════════════
+-- ADD SUBSCRIPTION STATUS VERSIONS FOR CROSS-WORKER CACHE INVALIDATION
+-- ═══════════════════════════════════════════════════════════════════
+-- The backend caches each user's computed subscription status in memory.
+-- A write in one worker (payment webhook, expiry sweep, admin change) cannot
+-- drop another worker's cached copy, so every cached status is tagged with
+-- the user's row version from this table and is only served while that
+-- version is unchanged.
+--
+-- Versions are bumped by triggers on every table the status is computed
+-- from, so all writers (backend, RPCs, dashboard edits) invalidate the cache
+-- without having to remember to.
+
+CREATE TABLE IF NOT EXISTS public.subscription_status_versions (
+    user_id UUID PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 1,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Backend only (service role bypasses RLS); no client policies
+ALTER TABLE public.subscription_status_versions ENABLE ROW LEVEL SECURITY;
+
+CREATE OR REPLACE FUNCTION public.bump_subscription_status_version(p_user_id UUID)
+RETURNS VOID
+LANGUAGE sql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+    INSERT INTO public.subscription_status_versions AS v (user_id)
+    VALUES (p_user_id)
+    ON CONFLICT (user_id) DO UPDATE
+    SET version = v.version + 1, updated_at = NOW();
+$$;
+
+-- Row trigger for tables with a user_id column
+CREATE OR REPLACE FUNCTION public.bump_subscription_status_version_trigger()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    IF TG_OP IN ('INSERT', 'UPDATE') AND NEW.user_id IS NOT NULL THEN
+        PERFORM public.bump_subscription_status_version(NEW.user_id);
+    END IF;
+    IF TG_OP IN ('UPDATE', 'DELETE') AND OLD.user_id IS NOT NULL
+       AND (TG_OP = 'DELETE' OR OLD.user_id IS DISTINCT FROM NEW.user_id) THEN
+        PERFORM public.bump_subscription_status_version(OLD.user_id);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_user_subscriptions_status_version ON public.user_subscriptions;
+CREATE TRIGGER trg_user_subscriptions_status_version
+    AFTER INSERT OR UPDATE OR DELETE ON public.user_subscriptions
+    FOR EACH ROW EXECUTE FUNCTION public.bump_subscription_status_version_trigger();
+
+DROP TRIGGER IF EXISTS trg_user_trials_status_version ON public.user_trials;
+CREATE TRIGGER trg_user_trials_status_version
+    AFTER INSERT OR UPDATE OR DELETE ON public.user_trials
+    FOR EACH ROW EXECUTE FUNCTION public.bump_subscription_status_version_trigger();
+
+DROP TRIGGER IF EXISTS trg_payment_transactions_status_version ON public.payment_transactions;
+CREATE TRIGGER trg_payment_transactions_status_version
+    AFTER INSERT OR UPDATE OR DELETE ON public.payment_transactions
+    FOR EACH ROW EXECUTE FUNCTION public.bump_subscription_status_version_trigger();
+
+DROP TRIGGER IF EXISTS trg_organization_users_status_version ON public.organization_users;
+CREATE TRIGGER trg_organization_users_status_version
+    AFTER INSERT OR UPDATE OR DELETE ON public.organization_users
+    FOR EACH ROW EXECUTE FUNCTION public.bump_subscription_status_version_trigger();
+
+-- Organization-wide time restriction defaults apply to every member
+CREATE OR REPLACE FUNCTION public.bump_enterprise_members_status_version()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+BEGIN
+    INSERT INTO public.subscription_status_versions AS v (user_id)
+    SELECT DISTINCT ou.user_id
+    FROM public.organization_users AS ou
+    WHERE ou.enterprise_id = NEW.id AND ou.user_id IS NOT NULL
+    ON CONFLICT (user_id) DO UPDATE
+    SET version = v.version + 1, updated_at = NOW();
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS trg_enterprises_status_version ON public.enterprises;
+CREATE TRIGGER trg_enterprises_status_version
+    AFTER UPDATE OF time_restrictions_enabled, default_start_time, default_end_time, default_timezone
+    ON public.enterprises
+    FOR EACH ROW EXECUTE FUNCTION public.bump_enterprise_members_status_version();
+
+REVOKE ALL ON FUNCTION public.bump_subscription_status_version(UUID) FROM PUBLIC;
+REVOKE ALL ON FUNCTION public.bump_subscription_status_version(UUID) FROM anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.bump_subscription_status_version(UUID) TO service_role;
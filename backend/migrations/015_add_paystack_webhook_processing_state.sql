@@ -0,0 +1,32 @@
+-- ═══════════════════════════════════════════════════════════════════
+-- ADD PROCESSING STATE TO PAYSTACK WEBHOOKS
+-- ═══════════════════════════════════════════════════════════════════
+-- paystack_webhooks becomes the durable record for incoming events: the
+-- webhook routes write the event here (once per event_key) before answering
+-- Paystack, handlers skip events already processed or dead, and the
+-- backend's recovery job re-queues events left 'received' (e.g. when the
+-- host that accepted them was lost).
+--
+-- status: received -> processed, or dead for events that failed permanently
+-- or exhausted their retries. Rows from before this migration are marked
+-- 'legacy' unless already processed, so recovery does not replay history.
+
+ALTER TABLE public.paystack_webhooks
+    ADD COLUMN IF NOT EXISTS event_key TEXT,
+    ADD COLUMN IF NOT EXISTS source TEXT,
+    ADD COLUMN IF NOT EXISTS status TEXT NOT NULL DEFAULT 'received',
+    ADD COLUMN IF NOT EXISTS last_error TEXT,
+    ADD COLUMN IF NOT EXISTS processed_at TIMESTAMPTZ,
+    ADD COLUMN IF NOT EXISTS received_at TIMESTAMPTZ NOT NULL DEFAULT NOW();
+
+UPDATE public.paystack_webhooks
+SET status = CASE WHEN processed THEN 'processed' ELSE 'legacy' END
+WHERE event_key IS NULL;
+
+-- Dedupe target for the backend's upsert (NULL keys on legacy rows never conflict)
+CREATE UNIQUE INDEX IF NOT EXISTS idx_paystack_webhooks_event_key
+    ON public.paystack_webhooks (event_key);
+
+-- Recovery scan: the few rows still waiting, oldest first
+CREATE INDEX IF NOT EXISTS idx_paystack_webhooks_received
+    ON public.paystack_webhooks (received_at) WHERE status = 'received';
@@ -0,0 +1,128 @@
+-- ═══════════════════════════════════════════════════════════════════
+-- ADD SHARED IDEMPOTENCY KEYS FOR PAYMENT ACTIVATION
+-- ═══════════════════════════════════════════════════════════════════
+-- Activation endpoints (subscription/activate, activate-days, payment/success,
+-- lifecycle/activate-subscription) claim the Paystack reference before
+-- running and store their successful response. Records are keyed by
+-- (reference, scope), so a response is only ever replayed to the endpoint that
+-- produced it. A separate lookup across scopes keeps one payment from being
+-- activated twice through different endpoints: while another endpoint holds
+-- the reference the claim waits, and once it has completed the claim answers
+-- "activated_elsewhere" instead of replaying that endpoint's body.
+--
+-- Every claim gets a fresh claim_id. complete/release must match it, so a
+-- worker whose abandoned claim was taken over cannot overwrite or delete the
+-- new owner's record.
+--
+-- begin_payment_idempotency is the atomic claim. It returns
+--   {"state": "claimed", "claim_id"}                        run the activation
+--   {"state": "completed", "status_code", "body", "scope"}  replay the stored response
+--   {"state": "activated_elsewhere", "scope"}               another endpoint activated it
+--   {"state": "in_progress", "scope"}                       another request holds the claim
+--   {"state": "conflict"}                                   reference used by another user
+
+CREATE TABLE IF NOT EXISTS public.payment_idempotency_keys (
+    reference TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    owner TEXT,
+    status TEXT NOT NULL,
+    claim_id UUID NOT NULL,
+    status_code INTEGER,
+    body JSONB,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    expires_at TIMESTAMPTZ NOT NULL,
+    -- reference first, so the cross-scope lookup uses the primary key
+    PRIMARY KEY (reference, scope)
+);
+
+CREATE INDEX IF NOT EXISTS idx_payment_idempotency_keys_expiry
+    ON public.payment_idempotency_keys (expires_at);
+
+-- Backend only (service role bypasses RLS); no client policies
+ALTER TABLE public.payment_idempotency_keys ENABLE ROW LEVEL SECURITY;
+
+CREATE OR REPLACE FUNCTION public.begin_payment_idempotency(
+    p_reference TEXT,
+    p_scope TEXT,
+    p_owner TEXT,
+    p_ttl_seconds INTEGER DEFAULT 86400,
+    p_claim_timeout_seconds INTEGER DEFAULT 120
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_row public.payment_idempotency_keys%ROWTYPE;
+    v_other public.payment_idempotency_keys%ROWTYPE;
+    -- gen_random_uuid is built in (pg_catalog), so it resolves under the pinned search_path
+    v_claim_id UUID := gen_random_uuid();
+    v_expires TIMESTAMPTZ := NOW() + make_interval(secs => p_ttl_seconds);
+BEGIN
+    -- Opportunistic purge, bounded so a claim never pays for a large backlog
+    DELETE FROM public.payment_idempotency_keys
+    WHERE (reference, scope) IN (
+        SELECT k.reference, k.scope FROM public.payment_idempotency_keys AS k
+        WHERE k.expires_at < NOW()
+        LIMIT 100
+    );
+
+    -- Serialize claims on one reference across every scope, so two endpoints
+    -- cannot both pass the cross-scope check below
+    PERFORM pg_advisory_xact_lock(hashtext('payment_idempotency:' || p_reference));
+
+    FOR v_other IN
+        SELECT * FROM public.payment_idempotency_keys
+        WHERE reference = p_reference AND scope <> p_scope AND expires_at >= NOW()
+        ORDER BY (status = 'completed') DESC, updated_at DESC
+    LOOP
+        IF v_other.owner IS NOT NULL AND p_owner IS NOT NULL AND v_other.owner <> p_owner THEN
+            RETURN jsonb_build_object('state', 'conflict');
+        END IF;
+        IF v_other.status = 'completed' THEN
+            RETURN jsonb_build_object('state', 'activated_elsewhere', 'scope', v_other.scope);
+        END IF;
+        IF v_other.updated_at > NOW() - make_interval(secs => p_claim_timeout_seconds) THEN
+            RETURN jsonb_build_object('state', 'in_progress', 'scope', v_other.scope);
+        END IF;
+    END LOOP;
+
+    SELECT * INTO v_row FROM public.payment_idempotency_keys
+    WHERE reference = p_reference AND scope = p_scope
+    FOR UPDATE;
+
+    IF NOT FOUND THEN
+        INSERT INTO public.payment_idempotency_keys
+            (reference, scope, owner, status, claim_id, updated_at, expires_at)
+        VALUES (p_reference, p_scope, p_owner, 'in_progress', v_claim_id, NOW(), v_expires);
+        RETURN jsonb_build_object('state', 'claimed', 'claim_id', v_claim_id);
+    END IF;
+
+    IF v_row.expires_at >= NOW() THEN
+        IF v_row.owner IS NOT NULL AND p_owner IS NOT NULL AND v_row.owner <> p_owner THEN
+            RETURN jsonb_build_object('state', 'conflict');
+        END IF;
+        IF v_row.status = 'completed' THEN
+            RETURN jsonb_build_object(
+                'state', 'completed', 'status_code', v_row.status_code, 'body', v_row.body, 'scope', v_row.scope
+            );
+        END IF;
+        IF v_row.updated_at > NOW() - make_interval(secs => p_claim_timeout_seconds) THEN
+            RETURN jsonb_build_object('state', 'in_progress', 'scope', v_row.scope);
+        END IF;
+    END IF;
+
+    -- Expired record or abandoned claim (crashed worker): take it over. The new
+    -- claim_id fences off the previous holder's complete/release.
+    UPDATE public.payment_idempotency_keys
+    SET owner = p_owner, status = 'in_progress', claim_id = v_claim_id, status_code = NULL, body = NULL,
+        updated_at = NOW(), expires_at = v_expires
+    WHERE reference = p_reference AND scope = p_scope;
+    RETURN jsonb_build_object('state', 'claimed', 'claim_id', v_claim_id);
+END;
+$$;
+
+REVOKE ALL ON FUNCTION public.begin_payment_idempotency(TEXT, TEXT, TEXT, INTEGER, INTEGER) FROM PUBLIC;
+REVOKE ALL ON FUNCTION public.begin_payment_idempotency(TEXT, TEXT, TEXT, INTEGER, INTEGER) FROM anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.begin_payment_idempotency(TEXT, TEXT, TEXT, INTEGER, INTEGER) TO service_role;
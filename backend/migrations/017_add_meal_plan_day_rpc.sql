@@ -0,0 +1,67 @@
+-- ═══════════════════════════════════════════════════════════════════
+-- ADD SINGLE-CALL MEAL PLAN DAY LOOKUP
+-- ═══════════════════════════════════════════════════════════════════
+-- Day and meal endpoints used two round trips: one to read day_index
+-- (migration 010), one to select meal_plan-><path>-><offset>. This does the
+-- index lookup and the projection in one call. It returns
+--   {"plan_found": false}                               no such plan for the user
+--   {"plan_found": true, "indexed": false}              no usable index (or it is
+--                                                       stale); read the full plan
+--   {"plan_found": true, "indexed": true, "day_plan": } the day (or only p_fields
+--                                                       of it, plus "day"), or null
+--                                                       if the plan has no such day
+
+CREATE OR REPLACE FUNCTION public.get_meal_plan_day(
+    p_user_id UUID,
+    p_plan_id UUID,
+    p_day TEXT,
+    p_fields TEXT[] DEFAULT NULL
+)
+RETURNS JSONB
+LANGUAGE plpgsql
+STABLE
+SECURITY DEFINER
+SET search_path = public
+AS $$
+DECLARE
+    v_index JSONB;
+    v_elem JSONB;
+BEGIN
+    SELECT
+        m.day_index,
+        to_jsonb(m.meal_plan) #> (
+            ARRAY(SELECT jsonb_array_elements_text(m.day_index -> 'path'))
+            || (m.day_index -> 'days' ->> p_day)
+        )
+    INTO v_index, v_elem
+    FROM public.meal_plan_management AS m
+    WHERE m.user_id = p_user_id AND m.id = p_plan_id;
+
+    IF NOT FOUND THEN
+        RETURN jsonb_build_object('plan_found', FALSE);
+    END IF;
+    IF jsonb_typeof(v_index -> 'days') IS DISTINCT FROM 'object'
+       OR jsonb_typeof(v_index -> 'path') IS DISTINCT FROM 'array' THEN
+        RETURN jsonb_build_object('plan_found', TRUE, 'indexed', FALSE);
+    END IF;
+    IF NOT (v_index -> 'days') ? p_day THEN
+        RETURN jsonb_build_object('plan_found', TRUE, 'indexed', TRUE, 'day_plan', NULL);
+    END IF;
+    IF jsonb_typeof(v_elem) IS DISTINCT FROM 'object' OR v_elem ->> 'day' IS DISTINCT FROM p_day THEN
+        -- Index out of date with the document
+        RETURN jsonb_build_object('plan_found', TRUE, 'indexed', FALSE);
+    END IF;
+
+    IF p_fields IS NOT NULL THEN
+        SELECT jsonb_object_agg(f.name, v_elem -> f.name)
+        INTO v_elem
+        FROM unnest(array_prepend('day', p_fields)) AS f(name);
+    END IF;
+    RETURN jsonb_build_object('plan_found', TRUE, 'indexed', TRUE, 'day_plan', v_elem);
+END;
+$$;
+
+-- Only the backend (service role) reads plans through this; it checks ownership itself
+REVOKE ALL ON FUNCTION public.get_meal_plan_day(UUID, UUID, TEXT, TEXT[]) FROM PUBLIC;
+REVOKE ALL ON FUNCTION public.get_meal_plan_day(UUID, UUID, TEXT, TEXT[]) FROM anon, authenticated;
+GRANT EXECUTE ON FUNCTION public.get_meal_plan_day(UUID, UUID, TEXT, TEXT[]) TO service_role;
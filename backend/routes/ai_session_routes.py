@@ -1,6 +1,7 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from services.supabase_service import SupabaseService
 from services.auth_service import AuthService
+from utils.auth_utils import get_user_id_from_token
 
 ai_session_bp = Blueprint('ai_session', __name__)
 
@@ -28,13 +29,8 @@ def store_session():
         if not auth_header or not auth_header.startswith('Bearer '):
             return jsonify({'error': 'Missing or invalid Authorization header'}), 401
 
-        # Get user ID from auth token
-        from flask import current_app
-        auth_service = current_app.auth_service
-        if not auth_service:
-            return jsonify({'error': 'Authentication service not available'}), 500
-        
-        user_id, auth_type = auth_service.get_supabase_user_id_from_token(auth_header)
+        # Get user ID from the per-request principal
+        user_id, error = get_user_id_from_token()
         if not user_id:
             return jsonify({'error': 'Invalid authentication token'}), 401
 
@@ -4,6 +4,8 @@ import os
 import json
 from services.auth_service import AuthService
 from services.subscription_service import SubscriptionService
+from services.supabase_clients import create_isolated_client, get_anon_client
+from services.user_directory_service import user_directory
 from supabase import Client
 from utils.auth_utils import get_user_id_from_token
 
@@ -32,23 +34,55 @@ def get_supabase_client(use_admin: bool = False) -> Optional[Client]:
         if use_admin:
             return current_app.supabase_service.supabase
         else:
-            from supabase import create_client
-            anon_key = os.environ.get('SUPABASE_ANON_KEY')
-            if not anon_key:
-                current_app.logger.warning("SUPABASE_ANON_KEY not found, falling back to service role key")
-                return current_app.supabase_service.supabase
-            return create_client(
-                current_app.supabase_service.supabase_url,
-                anon_key
-            )
+            # Shared anon client - only for calls that store no session (reset emails)
+            anon_client = get_anon_client(current_app.supabase_service.supabase_url)
+            if not anon_client:
+                # Never the shared admin client: auth calls would replace its session
+                current_app.logger.warning("SUPABASE_ANON_KEY not found, using a throwaway service role client")
+                return create_isolated_client(current_app.supabase_service.supabase_url)
+            return anon_client
     except Exception as e:
         current_app.logger.error(f"Error getting Supabase client: {str(e)}")
         return None
 
 
+def get_session_client() -> Optional[Client]:
+    """
+    Per-request Supabase client for auth calls that store a session
+    (sign in, sign up, refresh). Each call gets its own client, so concurrent
+    logins never share or overwrite each other's session state.
+    """
+    if not hasattr(current_app, 'supabase_service') or not current_app.supabase_service:
+        current_app.logger.error("Supabase service not initialized in app context")
+        return None
+
+    try:
+        # Falls back to the service role key when no anon key is configured
+        return create_isolated_client(
+            current_app.supabase_service.supabase_url,
+            os.environ.get('SUPABASE_ANON_KEY')
+        )
+    except Exception as e:
+        current_app.logger.error(f"Error creating Supabase session client: {str(e)}")
+        return None
+
+
 ## Supabase-only authentication
 
 
+def _user_exists_by_email(norm_email: str) -> bool:
+    """
+    Existence check for the login failure path: one indexed lookup with
+    short-lived caching of misses, so failed-login bursts stay cheap.
+    """
+    try:
+        return user_directory.user_exists(norm_email)
+    except Exception as e:
+        current_app.logger.warning(f"Existence check failed for {norm_email}: {str(e)}")
+        # Fail towards the generic 'incorrect credentials' message
+        return True
+
+
 def _handle_supabase_login(email: str, password: str, supabase, supabase_service) -> tuple[dict, int]:
     """Handle Supabase email/password login."""
     from datetime import datetime
@@ -57,86 +91,6 @@ def _handle_supabase_login(email: str, password: str, supabase, supabase_service
         # Normalize email for consistent lookups and auth
         normalized_email = str(email or '').strip().lower()
         
-        # Helper: robust existence check using profiles, then admin get_user_by_email, then paginated list
-        def _user_exists_by_email(norm_email: str) -> bool:
-            # 1) profiles table via ADMIN client (bypasses RLS), case-insensitive
-            try:
-                admin_client_local = get_supabase_client(use_admin=True)
-                if admin_client_local:
-                    profile_check_local = admin_client_local.table('profiles').select('id,email').ilike('email', norm_email).execute()
-                    if bool(profile_check_local.data):
-                        return True
-            except Exception as profiles_err:
-                current_app.logger.warning(f"Admin profiles check failed for {norm_email}: {str(profiles_err)}")
-
-            # 2) admin get_user_by_email if available
-            try:
-                admin_client_local = admin_client_local or get_supabase_client(use_admin=True)
-                if admin_client_local and hasattr(admin_client_local, 'auth') and hasattr(admin_client_local.auth, 'admin'):
-                    try:
-                        user_res = getattr(admin_client_local.auth.admin, 'get_user_by_email', None)
-                        if callable(user_res):
-                            res = admin_client_local.auth.admin.get_user_by_email(norm_email)
-                            # supabase-py may return dict-like or object with 'user'
-                            maybe_user = getattr(res, 'user', None)
-                            if maybe_user is None and isinstance(res, dict):
-                                maybe_user = res.get('user') or res.get('data')
-                            if maybe_user is not None:
-                                return True
-                    except Exception as get_email_err:
-                        current_app.logger.info(f"admin.get_user_by_email unavailable/failed, falling back to list: {str(get_email_err)}")
-
-                    # 3) paginated list fallback
-                    try:
-                        per_page = 200
-                        for page in range(1, 11):
-                            try:
-                                # try kwargs then positional for compatibility
-                                try:
-                                    admin_res = admin_client_local.auth.admin.list_users(page=page, per_page=per_page)
-                                except TypeError:
-                                    admin_res = admin_client_local.auth.admin.list_users(page, per_page)
-                            except Exception as list_err:
-                                current_app.logger.warning(f"Admin list_users failed on page {page}: {str(list_err)}")
-                                break
-
-                            users_list = []
-                            try:
-                                data_obj = getattr(admin_res, 'data', None)
-                                if isinstance(data_obj, dict) and isinstance(data_obj.get('users'), list):
-                                    users_list = data_obj.get('users')
-                                else:
-                                    users_list = getattr(admin_res, 'users', None) or (data_obj if isinstance(data_obj, list) else [])
-                            except Exception:
-                                users_list = []
-
-                            if not users_list:
-                                break
-
-                            for u in users_list:
-                                try:
-                                    u_email = getattr(u, 'email', None)
-                                    if not u_email and isinstance(u, dict):
-                                        u_email = u.get('email')
-                                    if isinstance(u_email, str) and u_email.strip().lower() == norm_email:
-                                        return True
-                                except Exception:
-                                    continue
-
-                            try:
-                                if len(users_list) < per_page:
-                                    break
-                            except Exception:
-                                break
-                    except Exception as paging_err:
-                        current_app.logger.warning(f"Admin pagination check failed for {norm_email}: {str(paging_err)}")
-            except Exception as admin_err:
-                current_app.logger.warning(f"Admin existence check failed for {norm_email}: {str(admin_err)}")
-
-            return False
-
-        user_exists = _user_exists_by_email(normalized_email)
-        
         # Attempt to authenticate with Supabase
         response = supabase.auth.sign_in_with_password({
             'email': normalized_email,
@@ -145,14 +99,15 @@ def _handle_supabase_login(email: str, password: str, supabase, supabase_service
         
         if not response.user:
             current_app.logger.warning(f"Supabase login failed for {email}: No user in response")
-            if not user_exists:
+            if not _user_exists_by_email(normalized_email):
                 return {'status': 'error', 'message': "You don't have an account. Please sign up to create one."}, 401
             else:
                 return {'status': 'error', 'message': 'Incorrect email or password. Please check your credentials and try again.'}, 401
         # Prefer profiles.id when available; otherwise fall back to Supabase auth user ID
         user_id = None
         try:
-            profile = supabase.table('profiles').select('id').ilike('email', normalized_email).execute()
+            # Admin client: the lookup must not depend on the signed-in user's RLS
+            profile = supabase_service.supabase.table('profiles').select('id').ilike('email', normalized_email).execute()
             if profile.data:
                 user_id = profile.data[0]['id']
         except Exception:
@@ -219,12 +174,10 @@ def _handle_supabase_login(email: str, password: str, supabase, supabase_service
         current_app.logger.error(f"Supabase login error for {email}: {str(e)}")
         error_msg = str(e).lower()
         
-        # Check if user exists to provide appropriate error message (reuse robust helper)
-        normalized_email = str(email or '').strip().lower()
-        user_exists = _user_exists_by_email(normalized_email)
-        
+        # Check if user exists to provide appropriate error message (only on credential errors)
         if 'invalid login credentials' in error_msg or 'invalid password' in error_msg or 'wrong password' in error_msg:
-            if not user_exists:
+            normalized_email = str(email or '').strip().lower()
+            if not _user_exists_by_email(normalized_email):
                 return {'status': 'error', 'message': "You don't have an account. Please sign up to create one."}, 401
             else:
                 return {'status': 'error', 'message': 'Incorrect email or password. Please check your credentials and try again.'}, 401
@@ -237,7 +190,7 @@ def login_user():
     """
     Supabase email/password login. Returns access and refresh tokens; also sets httpOnly cookie.
     """
-    supabase = get_supabase_client()
+    supabase = get_session_client()
     supabase_service = getattr(current_app, 'supabase_service', None)
 
     if not all([supabase, supabase_service]):
@@ -287,8 +240,8 @@ def refresh_token():
         if not refresh_token:
             return jsonify({'status': 'error', 'message': 'Refresh token is required'}), 400
 
-        # Get Supabase client (anon key is fine for refreshing)
-        supabase = get_supabase_client(use_admin=False)
+        # Per-request client: refresh_session stores the refreshed session on it
+        supabase = get_session_client()
         if not supabase:
              return jsonify({'status': 'error', 'message': 'Database service not available'}), 500
 
@@ -702,10 +655,14 @@ def register_user():
             # The auth API will catch duplicates anyway
             current_app.logger.debug(f"Profile check skipped: {str(profile_err)}")
         
-        # 1. Try to create user with client auth first
-        user_id, error_response = _create_user_with_client_auth(
-            supabase, email, password, first_name, last_name, signup_type
-        )
+        # 1. Try to create user with client auth first. sign_up stores the new
+        # user's session on the client, so it runs on a per-request client.
+        auth_client = get_session_client()
+        user_id = None
+        if auth_client:
+            user_id, error_response = _create_user_with_client_auth(
+                auth_client, email, password, first_name, last_name, signup_type
+            )
         
         # 2. If client auth fails, try admin API
         if not user_id:
@@ -724,6 +681,8 @@ def register_user():
         # For initial registration, do not manually insert into profiles.
 
         current_app.logger.info(f"Successfully completed registration for user {user_id}")
+        # Clear any cached "no such account" result from earlier failed logins
+        user_directory.remember_email(email, user_id)
         
         # Create a trial for the new user in Supabase (async, non-blocking)
         # Use a background thread to avoid blocking the response
@@ -868,7 +827,7 @@ def change_password():
 
         # Get clients
         admin_client = get_supabase_client(use_admin=True)
-        client = get_supabase_client(use_admin=False)
+        client = get_session_client()
         if not admin_client or not client:
             return jsonify({'status': 'error', 'message': 'Database service not available'}), 500
 
@@ -879,7 +838,7 @@ def change_password():
 
         email = profile_res.data['email']
 
-        # Validate current password by signing in with anon client
+        # Validate current password by signing in on a per-request client
         try:
             auth_res = client.auth.sign_in_with_password({
                 'email': email,
@@ -8,8 +8,17 @@ from functools import wraps
 import uuid
 import secrets
 import os
+import re
+import csv
+import io
 from datetime import datetime, timedelta, timezone
 from services.email_service import email_service
+from services.email_outbox import email_outbox
+from services.supabase_clients import get_admin_client
+from services.user_directory_service import user_directory
+from services.fanout import fan_out
+from services.subscription_service import subscription_status_cache
+from utils.auth_utils import resolve_request_principal
 from supabase import Client
 
 def get_frontend_url():
@@ -37,16 +46,27 @@ def get_frontend_url():
 
 enterprise_bp = Blueprint('enterprise', __name__)
 
+INVITABLE_ROLES = ['client', 'patient', 'doctor', 'nutritionist']
+EMAIL_PATTERN = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+try:
+    BULK_INVITE_MAX = max(1, int(os.environ.get('ENTERPRISE_BULK_INVITE_MAX', '500')))
+except ValueError:
+    BULK_INVITE_MAX = 500
+# PostgREST puts in_() filters in the URL, so keep value lists to a safe length
+IN_FILTER_CHUNK = 200
+
+
+def _normalize_invite_role(role) -> str:
+    role = (role or 'patient').lower().strip()
+    # Normalize "doctors" to "doctor"
+    return 'doctor' if role == 'doctors' else role
+
+
 def get_supabase_client(use_admin: bool = False) -> Client:
     """Helper function to get the Supabase client from the app context."""
     if use_admin:
-        # Use admin client that bypasses RLS
-        from supabase import create_client
-        import os
-        return create_client(
-            os.getenv('SUPABASE_URL'),
-            os.getenv('SUPABASE_SERVICE_ROLE_KEY')
-        )
+        # Shared admin client that bypasses RLS (one per worker, connections reused)
+        return get_admin_client()
     
     if hasattr(current_app, 'supabase_service'):
         return current_app.supabase_service.supabase
@@ -60,15 +80,14 @@ def require_auth(f):
         if not auth_header or not auth_header.startswith('Bearer '):
             return jsonify({'error': 'Missing or invalid authorization header'}), 401
         
-        token = auth_header.split(' ')[1]
         try:
-            supabase = get_supabase_client()
-            user = supabase.auth.get_user(token)
-            if not user:
+            # Resolved once per request by the shared auth stage (and cached per token)
+            principal, error = resolve_request_principal()
+            if not principal:
                 return jsonify({'error': 'Invalid token'}), 401
-            request.user_id = user.user.id
-            request.user_email = user.user.email
-            request.user_metadata = getattr(user.user, 'user_metadata', {}) or {}
+            request.user_id = principal['user_id']
+            request.user_email = principal.get('email')
+            request.user_metadata = principal.get('user_metadata') or {}
         except Exception as e:
             return jsonify({'error': f'Authentication failed: {str(e)}'}), 401
         
@@ -478,20 +497,18 @@ def get_enterprise_users(enterprise_id):
             if inv.get('accepted_by'):
                 accepted_invitations_by_user_id[inv['accepted_by']] = inv
         
-        # Format response with user details from auth
+        # Resolve user details for every member in one batched lookup
+        details_by_user_id = user_directory.get_user_details(org_user['user_id'] for org_user in result.data)
+        
+        # Format response with user details
         users = []
         for org_user in result.data:
-            # Get user details from auth
-            try:
-                user_details = supabase.auth.admin.get_user_by_id(org_user['user_id'])
-                if user_details and user_details.user:
-                    user_metadata = user_details.user.user_metadata or {}
-                    first_name = user_metadata.get('first_name', '')
-                    last_name = user_metadata.get('last_name', '')
-                    email = user_details.user.email
-                else:
-                    first_name = last_name = email = 'Unknown'
-            except:
+            user_details = details_by_user_id.get(org_user['user_id'])
+            if user_details:
+                first_name = user_details['first_name']
+                last_name = user_details['last_name']
+                email = user_details['email']
+            else:
                 first_name = last_name = email = 'Unknown'
             
             # Find the invitation this user accepted (check by user_id first, then email)
@@ -582,17 +599,11 @@ def invite_user(enterprise_id):
         current_app.logger.info(f"[INVITE] Inviting email: {email}")
         
         # Validate role
-        ALLOWED_ROLES = ['client', 'patient', 'doctor', 'nutritionist']
-        role = data.get('role', 'patient').lower().strip()
-        
-        # Normalize "doctors" to "doctor"
-        if role == 'doctors':
-            role = 'doctor'
-            current_app.logger.info(f"[INVITE] Normalized 'doctors' to 'doctor'")
+        role = _normalize_invite_role(data.get('role', 'patient'))
         
-        if role not in ALLOWED_ROLES:
+        if role not in INVITABLE_ROLES:
             current_app.logger.error(f"[INVITE] Invalid role: {role}")
-            return jsonify({'success': False, 'error': f'Invalid role. Must be one of: {", ".join(ALLOWED_ROLES)}'}), 400
+            return jsonify({'success': False, 'error': f'Invalid role. Must be one of: {", ".join(INVITABLE_ROLES)}'}), 400
         
         current_app.logger.info(f"[INVITE] Role validated: {role}")
         
@@ -646,20 +657,14 @@ def invite_user(enterprise_id):
         # First, try to find if a user with this email exists in auth
         current_app.logger.info(f"[INVITE] Checking if user with email {email} is already a member")
         try:
-            # Try to get user by email from auth
-            # Note: This will only work if the user already has an account
+            # Indexed email -> user id lookup (cached)
+            # Note: This only finds users who already have an account
             # If they don't have an account yet, they can't be a member, so we skip this check
-            user_list = supabase.auth.admin.list_users()
-            existing_user = None
-            if user_list and hasattr(user_list, 'users'):
-                for user in user_list.users:
-                    if user.email and user.email.lower() == email.lower():
-                        existing_user = user
-                        break
+            existing_user_id = user_directory.find_user_id_by_email(email)
             
-            if existing_user:
+            if existing_user_id:
                 # Check if this user is already a member
-                existing_member = supabase.table('organization_users').select('id').eq('enterprise_id', enterprise_id).eq('user_id', existing_user.id).execute()
+                existing_member = supabase.table('organization_users').select('id').eq('enterprise_id', enterprise_id).eq('user_id', existing_user_id).execute()
                 if existing_member.data:
                     current_app.logger.warning(f"[INVITE] User is already a member")
                     return jsonify({'success': False, 'error': 'User is already a member of this organization'}), 400
@@ -723,12 +728,13 @@ def invite_user(enterprise_id):
         except Exception as e:
             current_app.logger.warning(f"[INVITE] Could not fetch inviter details: {str(e)}")
         
-        # Send invitation email with timeout protection
+        # Queue the invitation email; delivery happens in the outbox workers, so the
+        # response reports email_status 'queued' and email_sent stays False (not yet delivered)
         # IMPORTANT: Invitation is already created above, so we continue even if email fails
-        email_sent = False
         email_error_message = None
+        email_job_id = None
         try:
-            current_app.logger.info(f"[INVITE] Attempting to send invitation email to {email}")
+            current_app.logger.info(f"[INVITE] Queueing invitation email to {email}")
             
             # Check if email service is configured
             if not email_service.is_configured:
@@ -737,48 +743,19 @@ def invite_user(enterprise_id):
                 current_app.logger.warning(f"[INVITE] SMTP_PASSWORD: {'SET' if email_service.smtp_password else 'NOT SET'}")
                 email_error_message = "Email service not configured. Please set SMTP_USER and SMTP_PASSWORD environment variables."
             else:
-                # Use a thread to send email asynchronously with timeout
-                import threading
-                
-                email_result = {'sent': False, 'error': None}
-                
-                def send_email_async():
-                    try:
-                        result = email_service.send_invitation_email(
-                            to_email=email,
-                            enterprise_name=enterprise_data['name'],
-                            inviter_name=inviter_name,
-                            invitation_link=invitation_link,
-                            custom_message=data.get('message')
-                        )
-                        email_result['sent'] = result
-                        if not result and hasattr(email_service, 'last_error_message'):
-                            email_result['error'] = email_service.last_error_message
-                    except Exception as e:
-                        current_app.logger.error(f"[INVITE] Email thread error: {e}")
-                        email_result['sent'] = False
-                        email_result['error'] = str(e)
-                
-                email_thread = threading.Thread(target=send_email_async)
-                email_thread.daemon = True
-                email_thread.start()
-                
-                # Wait up to 10 seconds for email to send (increased from 5)
-                email_thread.join(timeout=10.0)
-                
-                if email_thread.is_alive():
-                    current_app.logger.warning(f"[INVITE] Email sending timed out after 10 seconds, but invitation was created successfully")
-                    email_sent = False
-                    email_error_message = "Email sending timed out. The invitation was created - you can share the link manually."
-                else:
-                    email_sent = email_result['sent']
-                    current_app.logger.info(f"[INVITE] Email sent status: {email_sent}")
-                    if not email_sent:
-                        email_error_message = email_result.get('error') or "Failed to send email. The invitation was created - you can share the link manually."
+                # Hand off to the durable outbox; a bounded worker pool delivers it with retries
+                email_job_id = email_outbox.enqueue(
+                    'invitation',
+                    to_email=email,
+                    enterprise_name=enterprise_data['name'],
+                    inviter_name=inviter_name,
+                    invitation_link=invitation_link,
+                    custom_message=data.get('message')
+                )
+                current_app.logger.info(f"[INVITE] Invitation email queued: {email_job_id}")
                 
         except Exception as email_error:
             current_app.logger.error(f"[INVITE] Email service error: {email_error}", exc_info=True)
-            email_sent = False
             email_error_message = f"Email error: {str(email_error)}. The invitation was created - you can share the link manually."
         
         current_app.logger.info(f"[INVITE] ✅ Invitation process completed successfully")
@@ -788,7 +765,9 @@ def invite_user(enterprise_id):
             'message': 'Invitation created successfully',
             'invitation': invitation,
             'invitation_link': invitation_link,
-            'email_sent': email_sent,
+            'email_sent': False,
+            'email_status': 'queued' if email_job_id else 'not_sent',
+            'email_job_id': email_job_id,
             'email_error': email_error_message
         }), 201
         
@@ -801,6 +780,284 @@ def invite_user(enterprise_id):
         return jsonify({'success': False, 'error': f'Server error: {str(e)}'}), 500
 
 
+def _parse_bulk_invite_entries(data) -> tuple:
+    """
+    Collect invite entries from a bulk request.
+
+    Accepts an uploaded CSV file ('file'), a text/csv body, a JSON 'csv' string,
+    a JSON 'invitations' list (strings or {email, role, message} objects) /
+    'emails' list, or a top-level JSON list of the same. CSV rows are
+    "email[,role]"; a header row is optional. Top-level 'role' and 'message'
+    apply to entries that don't set their own.
+
+    Entries whose email or role is not a string keep email/role None, so the
+    caller reports them as invalid instead of failing the whole request.
+
+    Returns:
+        (entries, None) or (None, error message) for a malformed body
+    """
+    if isinstance(data, list):
+        data = {'invitations': data}
+    elif not isinstance(data, dict):
+        return None, 'Request body must be a JSON object or list'
+
+    default_role = data.get('role')
+    default_message = data.get('message')
+
+    csv_text = None
+    upload = request.files.get('file')
+    if upload:
+        csv_text = upload.read().decode('utf-8-sig', errors='replace')
+    elif request.mimetype == 'text/csv':
+        csv_text = request.get_data(as_text=True)
+    elif isinstance(data.get('csv'), str):
+        csv_text = data['csv']
+
+    raw_entries = []
+    if csv_text is not None:
+        for row in csv.reader(io.StringIO(csv_text)):
+            cells = [cell.strip() for cell in row]
+            if not cells or not cells[0] or cells[0].lower() == 'email':
+                continue
+            raw_entries.append({'email': cells[0], 'role': cells[1] if len(cells) > 1 and cells[1] else None})
+    else:
+        key = 'invitations' if data.get('invitations') is not None else 'emails'
+        items = data.get(key)
+        if items is None:
+            items = []
+        elif not isinstance(items, list):
+            # A string would otherwise be iterated character by character
+            return None, f"'{key}' must be a list"
+        for item in items:
+            if isinstance(item, str):
+                raw_entries.append({'email': item})
+            elif isinstance(item, dict):
+                raw_entries.append(item)
+            else:
+                raw_entries.append({'email': None})
+
+    entries = []
+    for entry in raw_entries:
+        email = entry.get('email')
+        role = entry.get('role') or default_role
+        entries.append({
+            'email': email.lower().strip() if isinstance(email, str) else None,
+            'role': _normalize_invite_role(role) if role is None or isinstance(role, str) else None,
+            'message': entry.get('message') or default_message,
+        })
+    return entries, None
+
+
+def _select_in_chunks(supabase: Client, table: str, column: str, values: list, select: str, **filters) -> list:
+    """Run `select ... where column in (values)` in URL-safe chunks."""
+    rows = []
+    for start in range(0, len(values), IN_FILTER_CHUNK):
+        query = supabase.table(table).select(select)
+        for key, value in filters.items():
+            query = query.eq(key, value)
+        result = query.in_(column, values[start:start + IN_FILTER_CHUNK]).execute()
+        rows.extend(result.data or [])
+    return rows
+
+
+@enterprise_bp.route('/api/enterprise/<enterprise_id>/invite/bulk', methods=['POST'])
+@require_auth
+def bulk_invite_users(enterprise_id):
+    """Invite many users at once from a list or CSV"""
+    try:
+        if not enterprise_id or enterprise_id == 'undefined' or enterprise_id == 'null':
+            return jsonify({
+                'success': False,
+                'error': 'No organization selected. Please select an organization first.',
+                'error_code': 'INVALID_ENTERPRISE_ID'
+            }), 400
+
+        data = request.get_json(silent=True)
+        if data is None or data == {}:
+            data = request.form.to_dict() or {}
+        entries, parse_error = _parse_bulk_invite_entries(data)
+        if parse_error:
+            return jsonify({
+                'success': False,
+                'error': parse_error,
+                'error_code': 'INVALID_REQUEST'
+            }), 400
+        if not entries:
+            return jsonify({
+                'success': False,
+                'error': 'No email addresses provided',
+                'error_code': 'EMPTY_REQUEST'
+            }), 400
+        if len(entries) > BULK_INVITE_MAX:
+            return jsonify({
+                'success': False,
+                'error': f'Too many invitations in one request (maximum {BULK_INVITE_MAX})',
+                'error_code': 'TOO_MANY_INVITATIONS'
+            }), 400
+
+        supabase = get_supabase_client(use_admin=True)
+
+        enterprise_check = supabase.table('enterprises').select('*').eq('id', enterprise_id).execute()
+        if not enterprise_check.data:
+            return jsonify({'success': False, 'error': 'Organization not found'}), 404
+        enterprise_data = enterprise_check.data[0]
+
+        is_admin, reason = check_user_is_org_admin(request.user_id, enterprise_id, supabase)
+        if not is_admin:
+            return jsonify({'success': False, 'error': f'Access denied: {reason}'}), 403
+
+        # Validate and dedupe within the request
+        skipped = []
+        candidates = {}
+        for entry in entries:
+            email = entry['email']
+            if email is None or not EMAIL_PATTERN.match(email):
+                skipped.append({'email': email, 'reason': 'invalid_email'})
+            elif entry['role'] not in INVITABLE_ROLES:
+                skipped.append({'email': email, 'reason': 'invalid_role'})
+            elif email in candidates:
+                skipped.append({'email': email, 'reason': 'duplicate_in_request'})
+            else:
+                candidates[email] = entry
+
+        emails = list(candidates)
+
+        def load_member_emails():
+            user_ids_by_email = user_directory.find_user_ids_by_emails(emails)
+            if not user_ids_by_email:
+                return set()
+            member_rows = _select_in_chunks(
+                supabase, 'organization_users', 'user_id', list(set(user_ids_by_email.values())),
+                'user_id', enterprise_id=enterprise_id
+            )
+            member_ids = {row['user_id'] for row in member_rows}
+            return {email for email, user_id in user_ids_by_email.items() if user_id in member_ids}
+
+        # Capacity and both dedupe checks are independent set-based queries
+        results = fan_out({
+            'count': lambda: supabase.table('organization_users').select('id', count='exact').eq('enterprise_id', enterprise_id).execute(),
+            'pending': lambda: _select_in_chunks(
+                supabase, 'invitations', 'email', emails, 'email',
+                enterprise_id=enterprise_id, status='pending'
+            ) if emails else [],
+            'members': load_member_emails if emails else (lambda: set()),
+        })
+
+        pending_emails = {row['email'].lower() for row in results['pending'] if row.get('email')}
+        member_emails = results['members']
+
+        to_invite = []
+        for email, entry in candidates.items():
+            if email in member_emails:
+                skipped.append({'email': email, 'reason': 'already_member'})
+            elif email in pending_emails:
+                skipped.append({'email': email, 'reason': 'already_invited'})
+            else:
+                to_invite.append(entry)
+
+        if not to_invite:
+            return jsonify({
+                'success': True,
+                'message': 'No new invitations to create',
+                'invited': [],
+                'skipped': skipped,
+                'email_status': 'not_sent'
+            }), 200
+
+        current_count = results['count'].count if results['count'].count is not None else 0
+        max_users = enterprise_data.get('max_users', 100)
+        remaining = max(0, max_users - current_count)
+        if len(to_invite) > remaining:
+            return jsonify({
+                'success': False,
+                'error': f"Maximum user limit ({max_users}) would be exceeded: {remaining} slots remaining, {len(to_invite)} invitations requested",
+                'error_code': 'USER_LIMIT_EXCEEDED',
+                'remaining_slots': remaining,
+                'skipped': skipped
+            }), 400
+
+        expires_at = (datetime.now(timezone.utc) + timedelta(days=30)).isoformat()
+        invitation_rows = [
+            {
+                'enterprise_id': enterprise_id,
+                'email': entry['email'],
+                'invited_by': request.user_id,
+                'invitation_token': secrets.token_urlsafe(32),
+                'role': entry['role'],
+                'message': entry['message'],
+                'expires_at': expires_at
+            }
+            for entry in to_invite
+        ]
+
+        # One INSERT for the whole batch
+        try:
+            insert_result = supabase.table('invitations').insert(invitation_rows).execute()
+        except Exception as insert_error:
+            current_app.logger.error(f"[BULK INVITE] Invitation insert failed: {insert_error}", exc_info=True)
+            error_msg = str(insert_error).lower()
+            if 'unique' in error_msg or 'duplicate' in error_msg:
+                return jsonify({'success': False, 'error': 'One or more invitations already exist. Please retry.'}), 409
+            return jsonify({'success': False, 'error': f'Failed to create invitations: {str(insert_error)}'}), 500
+
+        invitations = insert_result.data or []
+        current_app.logger.info(f"[BULK INVITE] Created {len(invitations)} invitations for enterprise {enterprise_id}")
+
+        frontend_url = get_frontend_url()
+        links = {
+            invitation['id']: f"{frontend_url}/accept-invitation?token={invitation['invitation_token']}"
+            for invitation in invitations
+        }
+
+        inviter_details = user_directory.get_user_details([request.user_id]).get(request.user_id)
+        inviter_name = inviter_details['email'] if inviter_details else 'A team member'
+
+        # Hand every email to the outbox in one batch
+        email_status = 'not_sent'
+        email_error_message = None
+        job_ids = {}
+        if not email_service.is_configured:
+            email_error_message = "Email service not configured. Please set SMTP_USER and SMTP_PASSWORD environment variables."
+        else:
+            try:
+                queued = email_outbox.enqueue_many('invitation', [
+                    {
+                        'to_email': invitation['email'],
+                        'enterprise_name': enterprise_data['name'],
+                        'inviter_name': inviter_name,
+                        'invitation_link': links[invitation['id']],
+                        'custom_message': invitation.get('message')
+                    }
+                    for invitation in invitations
+                ])
+                job_ids = {invitation['id']: job_id for invitation, job_id in zip(invitations, queued)}
+                email_status = 'queued'
+            except Exception as email_error:
+                current_app.logger.error(f"[BULK INVITE] Failed to queue invitation emails: {email_error}", exc_info=True)
+                email_error_message = f"Email error: {str(email_error)}. The invitations were created - you can share the links manually."
+
+        return jsonify({
+            'success': True,
+            'message': f'{len(invitations)} invitations created',
+            'invited': [
+                {
+                    'invitation': invitation,
+                    'invitation_link': links[invitation['id']],
+                    'email_job_id': job_ids.get(invitation['id'])
+                }
+                for invitation in invitations
+            ],
+            'skipped': skipped,
+            'email_sent': False,
+            'email_status': email_status,
+            'email_error': email_error_message
+        }), 201
+
+    except Exception as e:
+        current_app.logger.error(f"[BULK INVITE] Error: {str(e)}", exc_info=True)
+        return jsonify({'success': False, 'error': f'Server error: {str(e)}'}), 500
+
+
 @enterprise_bp.route('/api/enterprise/<enterprise_id>/invitations', methods=['GET'])
 @require_auth
 def get_invitations(enterprise_id):
@@ -1160,29 +1417,18 @@ def accept_invitation():
                         frontend_url = get_frontend_url()
                         dashboard_url = f"{frontend_url}/enterprise"
                         
-                        # Send notification email
-                        import threading
-                        def send_notification():
-                            try:
-                                email_sent = email_service.send_invitation_accepted_notification(
-                                    admin_email=owner_email,
-                                    admin_name=owner_name,
-                                    accepted_user_email=accepted_user_email,
-                                    accepted_user_name=accepted_user_name,
-                                    enterprise_name=enterprise_name,
-                                    role=invitation.get('role', 'member'),
-                                    dashboard_url=dashboard_url
-                                )
-                                if email_sent:
-                                    current_app.logger.info(f"[ACCEPT] ✅ Notification email sent to admin {owner_email}")
-                                else:
-                                    current_app.logger.warning(f"[ACCEPT] ⚠️ Failed to send notification email to {owner_email}")
-                            except Exception as e:
-                                current_app.logger.error(f"[ACCEPT] Error sending notification email: {e}")
-                        
-                        notification_thread = threading.Thread(target=send_notification)
-                        notification_thread.daemon = True
-                        notification_thread.start()
+                        # Queue notification email (delivered by the outbox workers)
+                        email_outbox.enqueue(
+                            'invitation_accepted',
+                            admin_email=owner_email,
+                            admin_name=owner_name,
+                            accepted_user_email=accepted_user_email,
+                            accepted_user_name=accepted_user_name,
+                            enterprise_name=enterprise_name,
+                            role=invitation.get('role', 'member'),
+                            dashboard_url=dashboard_url
+                        )
+                        current_app.logger.info(f"[ACCEPT] Notification email queued for admin {owner_email}")
                 except Exception as e:
                     current_app.logger.warning(f"[ACCEPT] Could not send notification email: {e}")
             
@@ -1317,29 +1563,18 @@ def complete_invitation():
                     frontend_url = get_frontend_url()
                     dashboard_url = f"{frontend_url}/enterprise"
                     
-                    # Send notification email
-                    import threading
-                    def send_notification():
-                        try:
-                            email_sent = email_service.send_invitation_accepted_notification(
-                                admin_email=owner_email,
-                                admin_name=owner_name,
-                                accepted_user_email=accepted_user_email,
-                                accepted_user_name=accepted_user_name,
-                                enterprise_name=enterprise_name,
-                                role=invitation.get('role', 'member'),
-                                dashboard_url=dashboard_url
-                            )
-                            if email_sent:
-                                current_app.logger.info(f"[COMPLETE] ✅ Notification email sent to admin {owner_email}")
-                            else:
-                                current_app.logger.warning(f"[COMPLETE] ⚠️ Failed to send notification email to {owner_email}")
-                        except Exception as e:
-                            current_app.logger.error(f"[COMPLETE] Error sending notification email: {e}")
-                    
-                    notification_thread = threading.Thread(target=send_notification)
-                    notification_thread.daemon = True
-                    notification_thread.start()
+                    # Queue notification email (delivered by the outbox workers)
+                    email_outbox.enqueue(
+                        'invitation_accepted',
+                        admin_email=owner_email,
+                        admin_name=owner_name,
+                        accepted_user_email=accepted_user_email,
+                        accepted_user_name=accepted_user_name,
+                        enterprise_name=enterprise_name,
+                        role=invitation.get('role', 'member'),
+                        dashboard_url=dashboard_url
+                    )
+                    current_app.logger.info(f"[COMPLETE] Notification email queued for admin {owner_email}")
             except Exception as e:
                 current_app.logger.warning(f"[COMPLETE] Could not send notification email: {e}")
         
@@ -1381,13 +1616,11 @@ def create_user():
         
         enterprise = enterprise_result.data[0]
         
-        # Check if user already exists by listing users and checking email
+        # Check if user already exists (indexed email lookup)
         try:
-            users_list = supabase.auth.admin.list_users()
-            for user in users_list:
-                if user.email == data['email']:
-                    return jsonify({'error': 'User with this email already exists'}), 400
-        except:
+            if user_directory.find_user_id_by_email(data['email']):
+                return jsonify({'error': 'User with this email already exists'}), 400
+        except Exception:
             # If we can't check, continue with creation
             pass
         
@@ -1407,6 +1640,7 @@ def create_user():
             return jsonify({'error': 'Failed to create user account'}), 500
         
         user_id = user_response.user.id
+        user_directory.remember_email(data['email'], user_id)
         
         # Add user to organization
         membership_data = {
@@ -1437,11 +1671,8 @@ def create_user():
             print(f"⚠️ Error creating trial for user {user_id}: {trial_error}")
             # Don't fail the user creation if trial creation fails
 
-        # Send welcome email to the new user
+        # Queue welcome email to the new user (never blocks the request on SMTP)
         try:
-            from services.email_service import EmailService
-            email_service = EmailService()
-            
             # Get the current user's name for the email
             current_user_result = supabase.auth.admin.get_user_by_id(request.user_id)
             inviter_name = "Organization Admin"
@@ -1456,19 +1687,16 @@ def create_user():
             frontend_url = get_frontend_url()
             login_url = f"{frontend_url}/accept-invitation"
             
-            email_sent = email_service.send_user_creation_email(
+            email_outbox.enqueue(
+                'user_creation',
                 to_email=data['email'],
                 enterprise_name=enterprise['name'],
                 inviter_name=inviter_name,
                 login_url=login_url
             )
-            
-            if email_sent:
-                print(f"✅ User creation email sent to {data['email']}")
-            else:
-                print(f"⚠️ Failed to send user creation email to {data['email']}")
+            print(f"✅ User creation email queued for {data['email']}")
         except Exception as email_error:
-            print(f"⚠️ Error sending user creation email to {data['email']}: {email_error}")
+            print(f"⚠️ Error queueing user creation email to {data['email']}: {email_error}")
             # Don't fail the user creation if email sending fails
         
         return jsonify({
@@ -1542,6 +1770,8 @@ def delete_organization_user(user_relation_id):
             admin_supabase = get_supabase_client(use_admin=True)
             delete_auth_result = admin_supabase.auth.admin.delete_user(user_id)
             
+            if user_email != 'Unknown':
+                user_directory.forget_email(user_email)
             if delete_auth_result:
                 print(f"✅ Deleted Supabase auth account for user {user_id}")
             else:
@@ -1680,19 +1910,15 @@ def get_enterprise_settings_history(enterprise_id):
         # Get settings history for these users from user_settings_history table
         history_result = supabase.table('user_settings_history').select('*').in_('user_id', user_ids).eq('settings_type', 'health_profile').order('created_at', desc=True).limit(100).execute()
         
-        # Enrich with user details
+        # Enrich with user details (one batched lookup for all records)
+        details_by_user_id = user_directory.get_user_details(record['user_id'] for record in history_result.data)
         history = []
         for record in history_result.data:
-            try:
-                user_details = supabase.auth.admin.get_user_by_id(record['user_id'])
-                if user_details and user_details.user:
-                    user_metadata = user_details.user.user_metadata or {}
-                    user_name = f"{user_metadata.get('first_name', '')} {user_metadata.get('last_name', '')}".strip()
-                    user_email = user_details.user.email
-                else:
-                    user_name = 'Unknown'
-                    user_email = 'Unknown'
-            except:
+            user_details = details_by_user_id.get(record['user_id'])
+            if user_details:
+                user_name = f"{user_details['first_name']} {user_details['last_name']}".strip()
+                user_email = user_details['email']
+            else:
                 user_name = 'Unknown'
                 user_email = 'Unknown'
             
@@ -1926,6 +2152,13 @@ def update_enterprise_time_restrictions(enterprise_id):
         if not update_result.data:
             return jsonify({'error': 'Failed to update time restrictions'}), 500
         
+        # Members' cached access status depends on these restrictions
+        try:
+            members = supabase.table('organization_users').select('user_id').eq('enterprise_id', enterprise_id).execute()
+            subscription_status_cache.invalidate_many(member['user_id'] for member in members.data or [])
+        except Exception as e:
+            current_app.logger.warning(f'Could not invalidate cached subscription status: {str(e)}')
+        
         return jsonify({
             'success': True,
             'message': 'Time restrictions updated successfully',
@@ -1962,8 +2195,17 @@ def get_enterprise_statistics(enterprise_id):
                 'error': f'Access denied: {reason}'
             }), 403
         
-        # Get enterprise details including owner
-        enterprise_result = supabase.table('enterprises').select('*').eq('id', enterprise_id).execute()
+        # Enterprise, members and invitations are independent - fetch them concurrently
+        results = fan_out({
+            'enterprise': lambda: supabase.table('enterprises').select('*').eq('id', enterprise_id).execute(),
+            # Get all users (excludes owner)
+            'users': lambda: supabase.table('organization_users').select('status').eq('enterprise_id', enterprise_id).execute(),
+            'invitations': lambda: supabase.table('invitations').select('status').eq('enterprise_id', enterprise_id).execute(),
+        })
+        enterprise_result = results['enterprise']
+        users_result = results['users']
+        invitations_result = results['invitations']
+        
         if not enterprise_result.data:
             return jsonify({
                 'success': False,
@@ -1976,24 +2218,20 @@ def get_enterprise_statistics(enterprise_id):
         # Get owner information
         owner_info = {'id': owner_id, 'email': 'Unknown', 'name': 'Unknown'}
         try:
-            owner_details = supabase.auth.admin.get_user_by_id(owner_id)
-            if owner_details and owner_details.user:
-                owner_metadata = owner_details.user.user_metadata or {}
+            owner_details = user_directory.get_user_details([owner_id]).get(owner_id)
+            if owner_details:
                 owner_info = {
                     'id': owner_id,
-                    'email': owner_details.user.email,
-                    'name': f"{owner_metadata.get('first_name', '')} {owner_metadata.get('last_name', '')}".strip() or 'Owner'
+                    'email': owner_details['email'],
+                    'name': f"{owner_details['first_name']} {owner_details['last_name']}".strip() or 'Owner'
                 }
         except Exception as e:
             current_app.logger.warning(f'Could not fetch owner details: {str(e)}')
         
-        # Get all users (excludes owner)
-        users_result = supabase.table('organization_users').select('status').eq('enterprise_id', enterprise_id).execute()
         total_users = len(users_result.data)
         active_users = sum(1 for user in users_result.data if user.get('status', 'active') == 'active')
         
-        # Get invitation statistics
-        invitations_result = supabase.table('invitations').select('status').eq('enterprise_id', enterprise_id).execute()
+        # Invitation statistics
         total_invitations = len(invitations_result.data)
         pending_invitations = sum(1 for inv in invitations_result.data if inv.get('status') == 'pending')
         accepted_invitations = sum(1 for inv in invitations_result.data if inv.get('status') == 'accepted')
@@ -1,15 +1,25 @@
 from flask import Blueprint, request, jsonify
 from services.lifecycle_subscription_service import LifecycleSubscriptionService
 from utils.auth_utils import get_user_id_from_token
+from utils.idempotency import idempotent_by_reference
+from core.container import get_container
 import uuid
 
 # Create blueprint
 lifecycle_bp = Blueprint('lifecycle', __name__)
 
+_lifecycle_service = None
+
 def get_lifecycle_service():
-    """Get lifecycle subscription service instance"""
+    """Get lifecycle subscription service instance (container singleton, or one per worker)"""
+    global _lifecycle_service
     try:
-        return LifecycleSubscriptionService()
+        service = get_container().get('lifecycle_service')
+        if service is not None:
+            return service
+        if _lifecycle_service is None:
+            _lifecycle_service = LifecycleSubscriptionService()
+        return _lifecycle_service
     except Exception as e:
         print(f"Error initializing lifecycle service: {str(e)}")
         return None
@@ -119,6 +129,7 @@ def mark_trial_used():
         }), 500
 
 @lifecycle_bp.route('/activate-subscription', methods=['POST'])
+@idempotent_by_reference('lifecycle.activate_subscription')
 def activate_subscription():
     """Activate subscription and update user state to paid"""
     try:
@@ -266,6 +277,19 @@ def get_user_state_display():
             'error': str(e)
         }), 500
 
+def _sweep_options():
+    """dry_run / chunk_size for an expiry sweep, from the JSON body or query string"""
+    data = request.get_json(silent=True) or {}
+    dry_run = data.get('dry_run', request.args.get('dry_run', False))
+    if isinstance(dry_run, str):
+        dry_run = dry_run.strip().lower() in ('1', 'true', 'yes', 'on')
+    chunk_size = data.get('chunk_size', request.args.get('chunk_size'))
+    try:
+        chunk_size = int(chunk_size) if chunk_size is not None else None
+    except (TypeError, ValueError):
+        chunk_size = None
+    return bool(dry_run), chunk_size
+
 @lifecycle_bp.route('/check-expired-trials', methods=['POST'])
 def check_expired_trials():
     """Check for expired trials and mark them as used (admin function)"""
@@ -284,7 +308,8 @@ def check_expired_trials():
                 'error': 'Service not available'
             }), 500
         
-        result = lifecycle_service.check_and_update_expired_trials()
+        dry_run, chunk_size = _sweep_options()
+        result = lifecycle_service.check_and_update_expired_trials(dry_run=dry_run, chunk_size=chunk_size)
         
         if result['success']:
             return jsonify(result)
@@ -316,7 +341,8 @@ def check_expired_subscriptions():
                 'error': 'Service not available'
             }), 500
         
-        result = lifecycle_service.check_and_update_expired_subscriptions()
+        dry_run, chunk_size = _sweep_options()
+        result = lifecycle_service.check_and_update_expired_subscriptions(dry_run=dry_run, chunk_size=chunk_size)
         
         if result['success']:
             return jsonify(result)
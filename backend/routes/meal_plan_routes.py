@@ -1,6 +1,6 @@
 from flask import Blueprint, request, jsonify, current_app
-import json
 from utils.auth_utils import get_user_id_from_token, log_error
+from services.meal_plan_format import is_canonical, normalize_legacy_plan, split_plan_body
 
 meal_plan_bp = Blueprint('meal_plan', __name__)
 
@@ -23,7 +23,13 @@ def save_meal_plan():
         # Save to meal_plan_management table
         result = supabase_service.save_meal_plan(user_id, plan_data)
         if isinstance(result, dict):
-            # Success - return the inserted data
+            # Success - return the inserted (or refreshed, for an identical re-save) data
+            if result.get('deduplicated'):
+                return jsonify({
+                    'status': 'success',
+                    'message': 'Meal plan already saved.',
+                    'data': result
+                }), 200
             return jsonify({
                 'status': 'success', 
                 'message': 'Meal plan saved.',
@@ -40,55 +46,68 @@ def save_meal_plan():
         error_message = str(e)
         return jsonify({'status': 'error', 'message': error_message}), 500
 
+# Page size limits for GET /meal_plan?limit=
+MEAL_PLAN_PAGE_DEFAULT = 20
+MEAL_PLAN_PAGE_MAX = 100
+
+def _with_plan_fields(plan):
+    """Fill name/start_date/end_date from the meal_plan JSON when missing at the top level"""
+    canonical = is_canonical(plan)
+    plan.pop('format_version', None)
+    if canonical:
+        # Stored pre-normalized (services/meal_plan_format.py)
+        return plan
+    return normalize_legacy_plan(plan)
+
 @meal_plan_bp.route('/meal_plan', methods=['GET'])
 def get_meal_plan():
     """
     Retrieves a user's meal plans from the public.meal_plan_management table. Requires authentication.
     Extracts name, start_date, and end_date from meal_plan JSON if missing at the top level.
+
+    Query parameters (all optional; without them every full plan is returned as before):
+        view: 'summary' for id, name, dates, sickness flags and day_count without the meal_plan body
+        limit: page size (max 100); enables pagination
+        cursor: next_cursor from the previous page
     """
     try:
         user_id, error = get_user_id_from_token()
         if error:
             return jsonify({'status': 'error', 'message': f'Authentication failed: {error}'}), 401
 
+        view = (request.args.get('view') or 'full').lower()
+        if view not in ('full', 'summary'):
+            return jsonify({'status': 'error', 'message': "view must be 'full' or 'summary'."}), 400
+        cursor = request.args.get('cursor') or None
+        limit = request.args.get('limit')
+        if limit is not None or cursor:
+            try:
+                limit = int(limit) if limit is not None else MEAL_PLAN_PAGE_DEFAULT
+            except ValueError:
+                return jsonify({'status': 'error', 'message': 'limit must be an integer.'}), 400
+            limit = max(1, min(limit, MEAL_PLAN_PAGE_MAX))
+
         supabase_service = current_app.supabase_service
-        meal_plans, error = supabase_service.get_meal_plans(user_id)
-        print(f"[DEBUG] Data fetched from meal_plan_management for user {user_id}: {meal_plans}")  # Debug print
+        try:
+            page, error = supabase_service.get_meal_plans_page(user_id, limit=limit, cursor=cursor, summary=view == 'summary')
+        except ValueError as e:
+            return jsonify({'status': 'error', 'message': str(e)}), 400
 
-        # Parse meal_plan and extract fields if missing
-        if meal_plans is not None:
-            if isinstance(meal_plans, dict):
-                meal_plans = [meal_plans]
-            for plan in meal_plans:
-                meal_plan_obj = plan.get('meal_plan')
-                # Parse if string
-                if isinstance(meal_plan_obj, str):
-                    try:
-                        meal_plan_obj = json.loads(meal_plan_obj)
-                    except Exception as e:
-                        print(f"[DEBUG] Failed to parse meal_plan for plan {plan.get('id')}: {e}")
-                        meal_plan_obj = {}
-                # If plan_data key, use it
-                if isinstance(meal_plan_obj, dict) and meal_plan_obj and 'plan_data' in meal_plan_obj:
-                    meal_plan_obj = meal_plan_obj['plan_data']
-                # Extract fields robustly with null checks
-                if meal_plan_obj and isinstance(meal_plan_obj, dict):
-                    plan['name'] = plan.get('name') or meal_plan_obj.get('name')
-                    plan['start_date'] = plan.get('start_date') or meal_plan_obj.get('startDate')
-                    plan['end_date'] = plan.get('end_date') or meal_plan_obj.get('endDate')
-                    plan['meal_plan'] = meal_plan_obj
-                else:
-                    # If meal_plan_obj is None or not a dict, keep existing values
-                    plan['meal_plan'] = meal_plan_obj or []
-                # Log the extracted fields for debugging
-                current_app.logger.info(f"[EXTRACTED] Plan ID: {plan.get('id')}, Name: {plan.get('name')}, Start: {plan.get('start_date')}, End: {plan.get('end_date')}")
-            print('[DEBUG] Final meal_plans to return:', meal_plans)
-        
-        if meal_plans is not None:
-            return jsonify({'status': 'success', 'meal_plans': meal_plans}), 200
-        else:
+        if page is None:
             log_error(f"Failed to retrieve meal plans for user {user_id}", Exception(error))
             return jsonify({'status': 'error', 'message': f'Failed to retrieve meal plans: {error}'}), 500
+
+        meal_plans = page['meal_plans']
+        if view == 'full':
+            for plan in meal_plans:
+                _with_plan_fields(plan)
+        current_app.logger.debug(f"[MealPlan] Returning {len(meal_plans)} {view} plans for user {user_id}")
+
+        response = {'status': 'success', 'meal_plans': meal_plans}
+        if limit is not None:
+            response['next_cursor'] = page['next_cursor']
+            response['has_more'] = page['next_cursor'] is not None
+        return jsonify(response), 200
     except Exception as e:
         log_error("Unexpected error in get_meal_plan", e)
         return jsonify({'status': 'error', 'message': 'Internal server error'}), 500
@@ -198,6 +217,55 @@ def clear_meal_plans():
         log_error("Unexpected error in clear_meal_plans", e)
         return jsonify({'status': 'error', 'message': 'Internal server error'}), 500
 
+def _fetch_plan(user_id, plan_id):
+    """
+    Load one plan for the user by id.
+
+    Returns:
+        (plan, None) on success, or (None, (response, status)) to return as-is
+    """
+    plan, error = current_app.supabase_service.get_meal_plan_by_id(user_id, plan_id)
+    if error:
+        log_error(f"Failed to load meal plan {plan_id} for user {user_id}", Exception(error))
+        return None, (jsonify({'status': 'error', 'message': 'Failed to load meal plan.'}), 500)
+    if not plan:
+        return None, (jsonify({'status': 'error', 'message': 'Meal plan not found.'}), 404)
+    # Internal projection metadata (migration 010), not part of the plan
+    plan.pop('day_index', None)
+    return plan, None
+
+def _plan_body(plan):
+    """The plan's meal_plan JSON, decoded and unwrapped from a legacy 'plan_data' envelope"""
+    if is_canonical(plan):
+        return plan.get('meal_plan')
+    return split_plan_body(plan.get('meal_plan'))[2]
+
+def _find_day(meal_plan_obj, day):
+    if isinstance(meal_plan_obj, dict) and 'mealPlan' in meal_plan_obj:
+        return next((d for d in meal_plan_obj['mealPlan'] if d.get('day') == day), None)
+    if isinstance(meal_plan_obj, list):
+        return next((d for d in meal_plan_obj if d.get('day') == day), None)
+    return None
+
+def _projected_day(user_id, plan_id, day, fields=None):
+    """
+    Fetch only one day (or some of its fields) via JSON path projection.
+
+    Returns:
+        (day_plan, None) on success, (None, (response, status)) for a 404, or
+        (None, None) when the plan can't be projected and the caller should
+        load the full document instead
+    """
+    projected, reason = current_app.supabase_service.get_meal_plan_day(user_id, plan_id, day, fields)
+    if projected is None:
+        current_app.logger.debug(f"[MealPlan] Projection unavailable for plan {plan_id}: {reason}")
+        return None, None
+    if not projected['plan_found']:
+        return None, (jsonify({'status': 'error', 'message': 'Meal plan not found.'}), 404)
+    if not projected['day_plan']:
+        return None, (jsonify({'status': 'error', 'message': 'Day not found in meal plan.'}), 404)
+    return projected['day_plan'], None
+
 @meal_plan_bp.route('/meal_plan/<plan_id>', methods=['GET'])
 def get_single_meal_plan(plan_id):
     """
@@ -208,37 +276,11 @@ def get_single_meal_plan(plan_id):
         if error:
             return jsonify({'status': 'error', 'message': f'Authentication failed: {error}'}), 401
 
-        supabase_service = current_app.supabase_service
-        meal_plans, error = supabase_service.get_meal_plans(user_id)
-        if error or not meal_plans:
-            return jsonify({'status': 'error', 'message': 'No meal plans found.'}), 404
-
-        if isinstance(meal_plans, dict):
-            meal_plans = [meal_plans]
-        plan = next((p for p in meal_plans if str(p.get('id')) == str(plan_id)), None)
-        if not plan:
-            return jsonify({'status': 'error', 'message': 'Meal plan not found.'}), 404
-
-        # Extraction logic (reuse from GET /meal_plan)
-        meal_plan_obj = plan.get('meal_plan')
-        if isinstance(meal_plan_obj, str):
-            try:
-                meal_plan_obj = json.loads(meal_plan_obj)
-            except Exception:
-                meal_plan_obj = {}
-        if isinstance(meal_plan_obj, dict) and meal_plan_obj and 'plan_data' in meal_plan_obj:
-            meal_plan_obj = meal_plan_obj['plan_data']
-        # Extract fields robustly with null checks
-        if meal_plan_obj and isinstance(meal_plan_obj, dict):
-            plan['name'] = plan.get('name') or meal_plan_obj.get('name')
-            plan['start_date'] = plan.get('start_date') or meal_plan_obj.get('startDate')
-            plan['end_date'] = plan.get('end_date') or meal_plan_obj.get('endDate')
-            plan['meal_plan'] = meal_plan_obj
-        else:
-            # If meal_plan_obj is None or not a dict, keep existing values
-            plan['meal_plan'] = meal_plan_obj or []
+        plan, error_response = _fetch_plan(user_id, plan_id)
+        if error_response:
+            return error_response
 
-        return jsonify({'status': 'success', 'meal_plan': plan}), 200
+        return jsonify({'status': 'success', 'meal_plan': _with_plan_fields(plan)}), 200
     except Exception as e:
         log_error("Unexpected error in get_single_meal_plan", e)
         return jsonify({'status': 'error', 'message': 'Internal server error'}), 500
@@ -253,30 +295,14 @@ def get_single_day_plan(plan_id, day):
         if error:
             return jsonify({'status': 'error', 'message': f'Authentication failed: {error}'}), 401
 
-        supabase_service = current_app.supabase_service
-        meal_plans, error = supabase_service.get_meal_plans(user_id)
-        if error or not meal_plans:
-            return jsonify({'status': 'error', 'message': 'No meal plans found.'}), 404
-
-        if isinstance(meal_plans, dict):
-            meal_plans = [meal_plans]
-        plan = next((p for p in meal_plans if str(p.get('id')) == str(plan_id)), None)
-        if not plan:
-            return jsonify({'status': 'error', 'message': 'Meal plan not found.'}), 404
-
-        meal_plan_obj = plan.get('meal_plan')
-        if isinstance(meal_plan_obj, str):
-            try:
-                meal_plan_obj = json.loads(meal_plan_obj)
-            except Exception:
-                meal_plan_obj = {}
-        if isinstance(meal_plan_obj, dict) and 'plan_data' in meal_plan_obj:
-            meal_plan_obj = meal_plan_obj['plan_data']
-        day_plan = None
-        if isinstance(meal_plan_obj, dict) and 'mealPlan' in meal_plan_obj:
-            day_plan = next((d for d in meal_plan_obj['mealPlan'] if d.get('day') == day), None)
-        elif isinstance(meal_plan_obj, list):
-            day_plan = next((d for d in meal_plan_obj if d.get('day') == day), None)
+        day_plan, error_response = _projected_day(user_id, plan_id, day)
+        if error_response:
+            return error_response
+        if day_plan is None:
+            plan, error_response = _fetch_plan(user_id, plan_id)
+            if error_response:
+                return error_response
+            day_plan = _find_day(_plan_body(plan), day)
         if not day_plan:
             return jsonify({'status': 'error', 'message': 'Day not found in meal plan.'}), 404
         return jsonify({'status': 'success', 'day_plan': day_plan}), 200
@@ -294,30 +320,14 @@ def get_single_meal(plan_id, day, meal_type):
         if error:
             return jsonify({'status': 'error', 'message': f'Authentication failed: {error}'}), 401
 
-        supabase_service = current_app.supabase_service
-        meal_plans, error = supabase_service.get_meal_plans(user_id)
-        if error or not meal_plans:
-            return jsonify({'status': 'error', 'message': 'No meal plans found.'}), 404
-
-        if isinstance(meal_plans, dict):
-            meal_plans = [meal_plans]
-        plan = next((p for p in meal_plans if str(p.get('id')) == str(plan_id)), None)
-        if not plan:
-            return jsonify({'status': 'error', 'message': 'Meal plan not found.'}), 404
-
-        meal_plan_obj = plan.get('meal_plan')
-        if isinstance(meal_plan_obj, str):
-            try:
-                meal_plan_obj = json.loads(meal_plan_obj)
-            except Exception:
-                meal_plan_obj = {}
-        if isinstance(meal_plan_obj, dict) and 'plan_data' in meal_plan_obj:
-            meal_plan_obj = meal_plan_obj['plan_data']
-        day_plan = None
-        if isinstance(meal_plan_obj, dict) and 'mealPlan' in meal_plan_obj:
-            day_plan = next((d for d in meal_plan_obj['mealPlan'] if d.get('day') == day), None)
-        elif isinstance(meal_plan_obj, list):
-            day_plan = next((d for d in meal_plan_obj if d.get('day') == day), None)
+        day_plan, error_response = _projected_day(user_id, plan_id, day, [meal_type, f'{meal_type}_ingredients'])
+        if error_response:
+            return error_response
+        if day_plan is None:
+            plan, error_response = _fetch_plan(user_id, plan_id)
+            if error_response:
+                return error_response
+            day_plan = _find_day(_plan_body(plan), day)
         if not day_plan:
             return jsonify({'status': 'error', 'message': 'Day not found in meal plan.'}), 404
         meal_value = day_plan.get(meal_type)
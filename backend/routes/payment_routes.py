@@ -2,7 +2,9 @@ from flask import Blueprint, request, jsonify, current_app
 from services.payment_service import PaymentService
 from services.auth_service import AuthService
 from services.subscription_service import SubscriptionService
-from utils.auth_utils import get_user_id_from_token
+from services.webhook_inbox import ASYNC_WEBHOOKS_ENABLED, webhook_event_key, webhook_inbox
+from utils.auth_utils import resolve_request_principal
+from utils.idempotency import idempotent_by_reference
 import uuid
 from datetime import datetime
 from typing import Optional
@@ -22,10 +24,10 @@ def get_auth_service() -> Optional[AuthService]:
     return current_app.auth_service
 
 def authenticate_user() -> Optional[str]:
-    """Authenticate user and return user ID using common helper (supports header or cookie)."""
+    """Authenticate user and return user ID using the per-request principal (supports header or cookie)."""
     try:
-        user_id, error = get_user_id_from_token()
-        return user_id
+        principal, error = resolve_request_principal()
+        return principal['user_id'] if principal else None
     except Exception:
         return None
 
@@ -344,7 +346,15 @@ def paystack_webhook():
     # Process webhook
     try:
         event_data = request.get_json()
-        result = payment_service.process_webhook(event_data)
+        
+        if ASYNC_WEBHOOKS_ENABLED:
+            # Store and acknowledge; the inbox workers run process_webhook once per event
+            event_key, is_new = webhook_inbox.ingest('payment', event_data, request.get_data())
+            return jsonify({'status': 'success', 'queued': is_new, 'duplicate': not is_new}), 200
+        
+        result = payment_service.process_webhook(
+            event_data, event_key=webhook_event_key('payment', event_data, request.get_data())
+        )
         
         if result['success']:
             return jsonify({'status': 'success'}), 200
@@ -478,6 +488,7 @@ def payment_status():
     }), 200
 
 @payment_bp.route('/success', methods=['POST'])
+@idempotent_by_reference('payment.success')
 def handle_payment_success():
     """
     Handle successful payment and activate subscription
@@ -3,9 +3,13 @@ import json
 from datetime import datetime
 from services.subscription_service import SubscriptionService
 from services.auth_service import AuthService
+from services.paystack_client import verify_webhook_signature
+from services.webhook_inbox import ASYNC_WEBHOOKS_ENABLED, webhook_event_key, webhook_inbox
+from utils.idempotency import idempotent_by_reference
 
 subscription_bp = Blueprint('subscription', __name__)
 subscription_service = SubscriptionService()
+webhook_inbox.register_handler('subscription', subscription_service.process_paystack_webhook)
 # auth_service will be initialized when needed
 
 @subscription_bp.route('/status', methods=['GET'])
@@ -141,6 +145,7 @@ def create_user_trial():
         }), 500
 
 @subscription_bp.route('/activate', methods=['POST'])
+@idempotent_by_reference('subscription.activate')
 def activate_subscription():
     """
     Activate a subscription for a user after successful payment
@@ -178,6 +183,7 @@ def activate_subscription():
         }), 500
 
 @subscription_bp.route('/activate-days', methods=['POST'])
+@idempotent_by_reference('subscription.activate_days')
 def activate_subscription_for_days():
     """
     Activate a subscription for a specific number of days
@@ -268,6 +274,13 @@ def process_webhook():
     Process Paystack webhook events
     """
     try:
+        # Only Paystack-signed events are stored or processed, in either mode
+        if not verify_webhook_signature(request.get_data(), request.headers.get('X-Paystack-Signature')):
+            return jsonify({
+                'success': False,
+                'error': 'Invalid webhook signature'
+            }), 400
+        
         # Get webhook data
         webhook_data = request.get_json()
         
@@ -277,8 +290,19 @@ def process_webhook():
                 'error': 'Webhook data required'
             }), 400
         
+        if ASYNC_WEBHOOKS_ENABLED:
+            # Ingestion mode: dedupe and store; inbox workers do the processing
+            event_key, is_new = webhook_inbox.ingest('subscription', webhook_data, request.get_data())
+            return jsonify({
+                'success': True,
+                'queued': is_new,
+                'duplicate': not is_new
+            }), 200
+        
         # Process webhook
-        result = subscription_service.process_paystack_webhook(webhook_data)
+        result = subscription_service.process_paystack_webhook(
+            webhook_data, event_key=webhook_event_key('subscription', webhook_data, request.get_data())
+        )
         
         if result['success']:
             return jsonify(result), 200
@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify, current_app
 from utils.auth_utils import get_user_id_from_token, log_error
+from services.supabase_clients import get_admin_client
 import json
 
 user_settings_bp = Blueprint('user_settings', __name__)
@@ -143,12 +144,7 @@ def get_user_settings_history():
         current_app.logger.info(f"[SETTINGS_HISTORY] Fetching history for user {user_id}, type: {settings_type}")
         
         # Use admin client to bypass RLS for history fetch
-        from supabase import create_client
-        import os
-        admin_client = create_client(
-            os.getenv('SUPABASE_URL'),
-            os.getenv('SUPABASE_SERVICE_ROLE_KEY')
-        )
+        admin_client = get_admin_client()
         
         # Query settings history
         result = admin_client.table('user_settings_history')\
@@ -1,5 +1,23 @@
+import os
+import threading
+import time
+import requests
 from supabase import Client  # Import Client for type hinting
-from typing import Optional, Tuple
+from typing import Any, Dict, Optional, Tuple
+from utils.token_cache import token_cache
+
+# PyJWT is optional - without it every token is verified remotely via Supabase
+try:
+    import jwt
+    JWT_AVAILABLE = True
+except ImportError:
+    jwt = None
+    JWT_AVAILABLE = False
+
+# Algorithms Supabase uses to sign access tokens (legacy shared secret + asymmetric signing keys)
+_SYMMETRIC_ALGORITHMS = ('HS256',)
+_ASYMMETRIC_ALGORITHMS = ('RS256', 'ES256')
+
 
 class AuthService:
     """
@@ -14,61 +32,256 @@ class AuthService:
         """
         self.supabase_admin = supabase_admin_client
 
-    def _verify_supabase_token(self, token: str) -> Tuple[Optional[str], str]:
+        # Local JWT verification settings
+        self.supabase_url = (os.environ.get('SUPABASE_URL') or '').rstrip('/')
+        self.jwt_audience = os.environ.get('SUPABASE_JWT_AUDIENCE', 'authenticated')
+        self.local_verification_enabled = JWT_AVAILABLE and os.environ.get(
+            'SUPABASE_LOCAL_JWT_VERIFY', 'true'
+        ).strip().lower() in ('1', 'true', 'yes', 'on')
+        try:
+            self.jwt_key_ttl = max(30, int(os.environ.get('SUPABASE_JWT_KEY_TTL', '600')))
+        except ValueError:
+            self.jwt_key_ttl = 600
+
+        # Signing key cache: shared secret + JWKS keyed by kid, refreshed on a TTL
+        self._key_lock = threading.Lock()
+        self._jwt_secret: Optional[str] = None
+        self._jwks: Dict[str, Any] = {}
+        self._keys_loaded_at = 0.0
+        self._jwks_last_attempt = 0.0
+
+        if not JWT_AVAILABLE:
+            print("[AuthService] PyJWT not installed - falling back to remote token verification")
+
+    def _load_signing_keys(self, force: bool = False) -> None:
         """
-        Verifies a Supabase JWT token and returns the user ID.
-        
+        Loads (or refreshes) the shared JWT secret and the project's JWKS.
+
+        Keys are kept for `jwt_key_ttl` seconds. A forced refresh (unknown kid) is
+        rate limited so a flood of bad tokens cannot hammer the JWKS endpoint.
+        """
+        now = time.time()
+        with self._key_lock:
+            if not force and self._keys_loaded_at and now - self._keys_loaded_at < self.jwt_key_ttl:
+                return
+            if force and now - self._jwks_last_attempt < 30:
+                return
+            self._jwks_last_attempt = now
+
+            # Re-read the secret so a rotated value is picked up without a restart
+            self._jwt_secret = os.environ.get('SUPABASE_JWT_SECRET') or None
+
+            if self.supabase_url:
+                try:
+                    response = requests.get(
+                        f"{self.supabase_url}/auth/v1/.well-known/jwks.json",
+                        timeout=5
+                    )
+                    if response.status_code == 200:
+                        keys = {}
+                        for jwk_data in response.json().get('keys', []):
+                            kid = jwk_data.get('kid')
+                            if not kid:
+                                continue
+                            try:
+                                keys[kid] = jwt.PyJWK(jwk_data).key
+                            except Exception as e:
+                                print(f"[AuthService] Skipping unusable JWK {kid}: {e}")
+                        self._jwks = keys
+                    else:
+                        print(f"[AuthService] JWKS fetch returned {response.status_code}")
+                except Exception as e:
+                    # Keep the previous keys - a transient outage should not force remote verification
+                    print(f"[AuthService] Failed to fetch JWKS: {e}")
+
+            self._keys_loaded_at = now
+
+    def _resolve_signing_key(self, token: str) -> Tuple[Optional[Any], Optional[str]]:
+        """
+        Picks the verification key for a token based on its header.
+
+        Returns:
+            Tuple[Optional[Any], Optional[str]]: (key, algorithm) or (None, None) when no local key matches
+        """
+        header = jwt.get_unverified_header(token)
+        algorithm = header.get('alg')
+
+        self._load_signing_keys()
+
+        if algorithm in _SYMMETRIC_ALGORITHMS:
+            return (self._jwt_secret, algorithm) if self._jwt_secret else (None, None)
+
+        if algorithm in _ASYMMETRIC_ALGORITHMS:
+            kid = header.get('kid')
+            if not kid:
+                return None, None
+            key = self._jwks.get(kid)
+            if key is None:
+                # Possibly a freshly rotated key - refresh once before giving up
+                self._load_signing_keys(force=True)
+                key = self._jwks.get(kid)
+            return (key, algorithm) if key is not None else (None, None)
+
+        return None, None
+
+    def decode_token_locally(self, token: str) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """
+        Verifies a Supabase JWT in-process (signature, expiry and audience).
+
         Args:
             token (str): Supabase JWT token
-            
+
         Returns:
-            Tuple[Optional[str], str]: (user_id, auth_type) or (None, '') if verification fails
+            Tuple[Optional[Dict[str, Any]], bool]: (claims, handled). `handled` is False when the
+            token could not be checked locally (no PyJWT, unknown kid, no secret) and the caller
+            should fall back to remote verification.
         """
+        if not self.local_verification_enabled:
+            return None, False
+
+        try:
+            key, algorithm = self._resolve_signing_key(token)
+        except Exception as e:
+            print(f"Invalid Supabase token header: {str(e)}")
+            return None, True
+
+        if key is None:
+            return None, False
+
+        try:
+            claims = jwt.decode(
+                token,
+                key,
+                algorithms=[algorithm],
+                audience=self.jwt_audience,
+                options={'require': ['exp', 'sub']}
+            )
+            return claims, True
+        except jwt.ExpiredSignatureError:
+            print("Supabase token expired")
+            return None, True
+        except jwt.InvalidTokenError as e:
+            print(f"Invalid Supabase token: {str(e)}")
+            return None, True
+
+    def _resolve_supabase_principal(self, token: str) -> Optional[Dict[str, Any]]:
+        """
+        Verifies a Supabase JWT token and resolves the user it belongs to.
+
+        Args:
+            token (str): Supabase JWT token
+
+        Returns:
+            Optional[Dict[str, Any]]: {'user_id', 'email', 'user_metadata'} or None if verification fails
+        """
+        # Fast path: verify signature/exp/aud locally. profiles.id mirrors auth.users.id,
+        # so the `sub` claim is the same id the remote path would return.
+        claims, handled = self.decode_token_locally(token)
+        if handled:
+            if claims and claims.get('sub'):
+                return {
+                    'user_id': claims['sub'],
+                    'email': claims.get('email'),
+                    'user_metadata': claims.get('user_metadata') or {},
+                    'exp': claims.get('exp'),
+                }
+            return None
+
         try:
             # Use Supabase admin client to verify the token
             # This will decode the JWT and verify it's valid
             user = self.supabase_admin.auth.get_user(token)
             if user and getattr(user, 'user', None):
+                user_id = user.user.id
                 # Prefer profiles.id if present, otherwise fall back to auth user ID
                 try:
                     profile_data = self.supabase_admin.table('profiles').select('id').eq('id', user.user.id).single().execute()
                     if profile_data.data and profile_data.data.get('id'):
-                        return profile_data.data['id'], 'supabase'
+                        user_id = profile_data.data['id']
                 except Exception:
                     pass
                 # Fallback: allow authentication with Supabase auth user ID even if profile row missing
-                return user.user.id, 'supabase'
+                return {
+                    'user_id': user_id,
+                    'email': getattr(user.user, 'email', None),
+                    'user_metadata': getattr(user.user, 'user_metadata', {}) or {},
+                    'exp': None,
+                }
             else:
                 print("Invalid Supabase token")
-                return None, ''
+                return None
         except Exception as e:
             print(f"Error verifying Supabase token: {str(e)}")
-            return None, ''
+            return None
+
+    def _verify_supabase_token(self, token: str) -> Tuple[Optional[str], str]:
+        """
+        Verifies a Supabase JWT token and returns the user ID.
+
+        Args:
+            token (str): Supabase JWT token
+
+        Returns:
+            Tuple[Optional[str], str]: (user_id, auth_type) or (None, '') if verification fails
+        """
+        principal = self._resolve_supabase_principal(token)
+        if principal:
+            return principal['user_id'], 'supabase'
+        return None, ''
+
+    def get_principal_from_token(self, token: str) -> Optional[Dict[str, Any]]:
+        """
+        Resolves the user behind a token, using the shared token cache.
+
+        Args:
+            token (str): Supabase JWT token (with or without 'Bearer ' prefix)
+
+        Returns:
+            Optional[Dict[str, Any]]: {'user_id', 'email', 'user_metadata'} or None if verification fails
+        """
+        if not token:
+            return None
+
+        # Remove 'Bearer ' prefix if present
+        if token.startswith('Bearer '):
+            token = token[7:]
+
+        principal = token_cache.get(token)
+        if principal:
+            return principal
+
+        principal = self._resolve_supabase_principal(token)
+        if not principal:
+            return None
+
+        exp = principal.pop('exp', None)
+        token_cache.set(token, principal, exp=exp)
+        return principal
 
     def get_supabase_user_id_from_token(self, token: str) -> Tuple[Optional[str], str]:
         """
         Verifies a Supabase token and returns the corresponding Supabase user ID.
-        
+
         Args:
             token (str): Supabase JWT token (with or without 'Bearer ' prefix)
-            
+
         Returns:
             Tuple[Optional[str], str]: (user_id, auth_type) or (None, '') if verification fails
         """
         if not token:
             return None, ''
-            
+
         # Remove 'Bearer ' prefix if present
         if token.startswith('Bearer '):
             token = token[7:]
-            
-        # Verify as Supabase token
-        user_id, auth_type = self._verify_supabase_token(token)
-        if user_id:
-            return user_id, auth_type
+
+        # Verify as Supabase token (cached per token until it expires)
+        principal = self.get_principal_from_token(token)
+        if principal:
+            return principal['user_id'], 'supabase'
 
         return None, ''
 
     # Backwards compatibility for old callers
     def verify_token(self, token: str) -> Tuple[Optional[str], str]:
-        return self.get_supabase_user_id_from_token(token)
\ No newline at end of file
+        return self.get_supabase_user_id_from_token(token)
@@ -0,0 +1,295 @@
+"""
+SQLite-backed durable job queue with a per-process worker pool
+
+Producers insert rows and return immediately; worker threads claim due rows
+one at a time (atomically, so every gunicorn worker on the host can share the
+same file), process them and retry failures with exponential backoff. Rows
+that keep failing, or fail with PermanentJobError, end in a terminal state for
+manual inspection. A row left in 'processing' by a crashed worker is picked up
+again once its lease expires.
+
+Subclasses set the table name and implement `_process`.
+"""
+
+import abc
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+STATUS_PENDING = 'pending'
+STATUS_PROCESSING = 'processing'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+INSTANCE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'instance'))
+
+
+class PermanentJobError(Exception):
+    """Raised by `_process` for failures a retry cannot fix; the job goes straight to the terminal status."""
+
+
+class DurableQueue(abc.ABC):
+    """Base class for durable queues; see the module docstring"""
+
+    table = ''
+    log_prefix = '[DurableQueue]'
+    # Status used when a job has exhausted its attempts
+    terminal_failure_status = STATUS_FAILED
+    # Status used for completed jobs
+    done_status = STATUS_DONE
+    # Status used while a worker holds the job
+    processing_status = STATUS_PROCESSING
+
+    def __init__(
+        self,
+        db_path: str,
+        workers: int = 2,
+        max_attempts: int = 5,
+        backoff_base: int = 30,
+        backoff_max: int = 1800,
+        lease_seconds: int = 600
+    ):
+        self.db_path = os.path.abspath(db_path)
+        self.worker_count = max(1, workers)
+        self.max_attempts = max(1, max_attempts)
+        self.backoff_base = max(1, backoff_base)
+        self.backoff_max = max(self.backoff_base, backoff_max)
+        # A 'processing' row older than this is assumed orphaned by a crashed worker
+        self.lease_seconds = max(60, lease_seconds)
+        self.poll_interval = 5.0
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._workers: List[threading.Thread] = []
+        self._workers_pid: Optional[int] = None
+        self._schema_ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA busy_timeout=30000')
+        return conn
+
+    def _ensure_schema(self) -> None:
+        if self._schema_ready:
+            return
+        with self._lock:
+            if self._schema_ready:
+                return
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            conn = self._connect()
+            try:
+                conn.execute(f'''
+                    CREATE TABLE IF NOT EXISTS {self.table} (
+                        id TEXT PRIMARY KEY,
+                        kind TEXT NOT NULL,
+                        payload TEXT NOT NULL,
+                        status TEXT NOT NULL,
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        next_attempt_at REAL NOT NULL,
+                        last_error TEXT,
+                        created_at REAL NOT NULL,
+                        updated_at REAL NOT NULL
+                    )
+                ''')
+                conn.execute(
+                    f'CREATE INDEX IF NOT EXISTS idx_{self.table}_due ON {self.table} (status, next_attempt_at)'
+                )
+            finally:
+                conn.close()
+            self._schema_ready = True
+
+    def _insert(self, jobs: Iterable[Tuple[str, str, Dict[str, Any]]], ignore_duplicates: bool = False) -> List[str]:
+        """
+        Insert (id, kind, payload) jobs in one transaction and wake the workers.
+
+        Returns:
+            Ids of the rows actually inserted (duplicates are skipped when
+            ignore_duplicates is True, and raise otherwise)
+        """
+        self._ensure_schema()
+        now = time.time()
+        verb = 'INSERT OR IGNORE' if ignore_duplicates else 'INSERT'
+        inserted = []
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN')
+            for job_id, kind, payload in jobs:
+                cursor = conn.execute(
+                    f'{verb} INTO {self.table} (id, kind, payload, status, attempts, next_attempt_at, created_at, updated_at) '
+                    'VALUES (?, ?, ?, ?, 0, ?, ?, ?)',
+                    (job_id, kind, json.dumps(payload), STATUS_PENDING, now, now, now)
+                )
+                if cursor.rowcount:
+                    inserted.append(job_id)
+            conn.execute('COMMIT')
+        except Exception:
+            try:
+                conn.execute('ROLLBACK')
+            except Exception:
+                pass
+            raise
+        finally:
+            conn.close()
+
+        if inserted:
+            self.start()
+            self._wakeup.set()
+        return inserted
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a job's status (without its payload)."""
+        self._ensure_schema()
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                f'SELECT id, kind, status, attempts, last_error, created_at, updated_at FROM {self.table} WHERE id = ?',
+                (job_id,)
+            ).fetchone()
+            return dict(row) if row else None
+        finally:
+            conn.close()
+
+    def _claimable_kinds(self) -> Optional[List[str]]:
+        """Kinds this process can handle (None means all)."""
+        return None
+
+    def _claim_next(self) -> Optional[sqlite3.Row]:
+        """Atomically move one due job to the processing status and return it."""
+        kinds = self._claimable_kinds()
+        if kinds is not None and not kinds:
+            return None
+
+        now = time.time()
+        kind_filter = ''
+        params: List[Any] = [STATUS_PENDING, now, self.processing_status, now - self.lease_seconds]
+        if kinds is not None:
+            kind_filter = f" AND kind IN ({', '.join('?' for _ in kinds)})"
+            params.extend(kinds)
+
+        conn = self._connect()
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            row = conn.execute(
+                f'SELECT * FROM {self.table} '
+                f'WHERE ((status = ? AND next_attempt_at <= ?) OR (status = ? AND updated_at <= ?)){kind_filter} '
+                'ORDER BY next_attempt_at LIMIT 1',
+                params
+            ).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            conn.execute(
+                f'UPDATE {self.table} SET status = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?',
+                (self.processing_status, now, row['id'])
+            )
+            conn.execute('COMMIT')
+            return row
+        except Exception:
+            try:
+                conn.execute('ROLLBACK')
+            except Exception:
+                pass
+            raise
+        finally:
+            conn.close()
+
+    def _finish(self, job_id: str, status: str, next_attempt_at: float, error: Optional[str]) -> None:
+        conn = self._connect()
+        try:
+            conn.execute(
+                f'UPDATE {self.table} SET status = ?, next_attempt_at = ?, last_error = ?, updated_at = ? WHERE id = ?',
+                (status, next_attempt_at, error, time.time(), job_id)
+            )
+        finally:
+            conn.close()
+
+    @abc.abstractmethod
+    def _process(self, kind: str, payload: Dict[str, Any]) -> Optional[str]:
+        """
+        Handle one job.
+
+        Returns:
+            None on success, otherwise an error message (the job is retried)
+
+        Raises:
+            PermanentJobError: To fail the job without further attempts
+        """
+
+    def _on_terminal_failure(self, row: sqlite3.Row, error: str) -> None:
+        """Called once a job reaches the terminal failure status."""
+
+    def _describe(self, row: sqlite3.Row) -> str:
+        return f"{row['kind']} job {row['id']}"
+
+    def _run_job(self, row: sqlite3.Row) -> None:
+        job_id = row['id']
+        attempts = row['attempts'] + 1
+        permanent = False
+        try:
+            error = self._process(row['kind'], json.loads(row['payload']))
+        except PermanentJobError as e:
+            error = str(e) or e.__class__.__name__
+            permanent = True
+        except Exception as e:
+            error = str(e) or e.__class__.__name__
+
+        if error is None:
+            self._finish(job_id, self.done_status, 0, None)
+            print(f"{self.log_prefix} ✅ Completed {self._describe(row)} (attempt {attempts})")
+            return
+
+        if permanent or attempts >= self.max_attempts:
+            self._finish(job_id, self.terminal_failure_status, 0, error)
+            if permanent:
+                print(f"{self.log_prefix} ❌ {self._describe(row)} failed permanently: {error}")
+            else:
+                print(f"{self.log_prefix} ❌ Giving up on {self._describe(row)} after {attempts} attempts: {error}")
+            try:
+                self._on_terminal_failure(row, error)
+            except Exception as e:
+                print(f"{self.log_prefix} Failed to record terminal failure for {job_id}: {e}")
+            return
+
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+        self._finish(job_id, STATUS_PENDING, time.time() + delay, error)
+        print(f"{self.log_prefix} ⚠️ {self._describe(row)} failed (attempt {attempts}), retrying in {delay}s: {error}")
+
+    def _worker_loop(self) -> None:
+        while True:
+            try:
+                self._ensure_schema()
+                row = self._claim_next()
+            except Exception as e:
+                print(f"{self.log_prefix} Failed to claim job: {e}")
+                row = None
+
+            if row is None:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
+                continue
+
+            try:
+                self._run_job(row)
+            except Exception as e:
+                # The lease expires and another attempt picks the job up again
+                print(f"{self.log_prefix} Failed to record result for {row['id']}: {e}")
+
+    def start(self) -> None:
+        """Start this process's worker pool (idempotent, fork-aware)."""
+        pid = os.getpid()
+        if self._workers_pid == pid and self._workers:
+            return
+        with self._lock:
+            if self._workers_pid == pid and self._workers:
+                return
+            self._workers = []
+            for index in range(self.worker_count):
+                worker = threading.Thread(target=self._worker_loop, name=f'{self.table}-{index}', daemon=True)
+                worker.start()
+                self._workers.append(worker)
+            self._workers_pid = pid
@@ -0,0 +1,107 @@
+"""
+Durable outbound email queue for EmailService
+
+API handlers enqueue a message and return immediately. A fixed-size pool of
+worker threads (per process) delivers queued messages through EmailService,
+retrying failures with exponential backoff. The queue lives in a local SQLite
+file, so messages survive restarts and are shared by all gunicorn workers on
+the host; claims are atomic, so each message is sent by one worker.
+"""
+
+import os
+import uuid
+from typing import Any, Dict, List, Optional
+from services.durable_queue import DurableQueue, INSTANCE_DIR
+from utils.env import int_env
+
+# Job kind -> EmailService method. Only these methods can be invoked from the queue.
+EMAIL_KINDS = {
+    'invitation': 'send_invitation_email',
+    'welcome': 'send_welcome_email',
+    'user_creation': 'send_user_creation_email',
+    'invitation_accepted': 'send_invitation_accepted_notification',
+}
+
+STATUS_SENDING = 'sending'
+STATUS_SENT = 'sent'
+STATUS_FAILED = 'failed'
+
+
+class EmailOutbox(DurableQueue):
+    """SQLite-backed email queue with a bounded worker pool and retry/backoff"""
+
+    table = 'email_outbox'
+    log_prefix = '[EmailOutbox]'
+    processing_status = STATUS_SENDING
+    done_status = STATUS_SENT
+    terminal_failure_status = STATUS_FAILED
+
+    def __init__(self, db_path: Optional[str] = None, email_service=None):
+        super().__init__(
+            db_path or os.environ.get('EMAIL_OUTBOX_PATH') or os.path.join(INSTANCE_DIR, 'email_outbox.sqlite3'),
+            workers=int_env('EMAIL_OUTBOX_WORKERS', 2),
+            max_attempts=int_env('EMAIL_OUTBOX_MAX_ATTEMPTS', 5),
+            backoff_base=int_env('EMAIL_OUTBOX_BACKOFF_SECONDS', 30),
+            backoff_max=int_env('EMAIL_OUTBOX_BACKOFF_MAX_SECONDS', 1800),
+            lease_seconds=int_env('EMAIL_OUTBOX_LEASE_SECONDS', 600)
+        )
+        self._email_service = email_service
+
+    @property
+    def email_service(self):
+        if self._email_service is None:
+            from services.email_service import email_service
+            self._email_service = email_service
+        return self._email_service
+
+    def enqueue(self, kind: str, **params: Any) -> str:
+        """
+        Queue an email for delivery.
+
+        Args:
+            kind: One of EMAIL_KINDS
+            **params: Keyword arguments for the matching EmailService method
+
+        Returns:
+            str: Job id
+        """
+        if kind not in EMAIL_KINDS:
+            raise ValueError(f"Unknown email kind: {kind}")
+
+        job_id = str(uuid.uuid4())
+        self._insert([(job_id, kind, params)])
+        print(f"[EmailOutbox] Queued {kind} email {job_id} to {params.get('to_email') or params.get('admin_email')}")
+        return job_id
+
+    def enqueue_many(self, kind: str, messages: List[Dict[str, Any]]) -> List[str]:
+        """
+        Queue a batch of emails of one kind in a single transaction.
+
+        Args:
+            kind: One of EMAIL_KINDS
+            messages: Keyword arguments for the matching EmailService method, one dict per email
+
+        Returns:
+            List[str]: Job ids, in the same order as messages
+        """
+        if kind not in EMAIL_KINDS:
+            raise ValueError(f"Unknown email kind: {kind}")
+        if not messages:
+            return []
+
+        job_ids = self._insert([(str(uuid.uuid4()), kind, params) for params in messages])
+        print(f"[EmailOutbox] Queued {len(job_ids)} {kind} emails")
+        return job_ids
+
+    def _process(self, kind: str, payload: Dict[str, Any]) -> Optional[str]:
+        method = getattr(self.email_service, EMAIL_KINDS[kind])
+        if method(**payload):
+            return None
+        return getattr(self.email_service, 'last_error_message', None) or 'Email service returned failure'
+
+    def _describe(self, row) -> str:
+        return f"{row['kind']} email {row['id']}"
+
+
+# Create a singleton instance
+email_outbox = EmailOutbox()
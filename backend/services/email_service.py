@@ -6,9 +6,10 @@ import os
 import smtplib
 import ssl
 import time
-from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from typing import Optional
+from typing import Any, Dict, List, Optional
+from services.smtp_pool import SMTPConnectionPool, smtp_port_health
+from services.email_templates import build_message, render_email
 
 class EmailService:
     """Service for sending emails"""
@@ -23,6 +24,8 @@ class EmailService:
         except:
             pass  # If dotenv fails, assume env vars are already loaded
         self._load_config()
+        # Authenticated SMTP sessions reused across messages (see services/smtp_pool.py)
+        self._smtp_pool = SMTPConnectionPool()
         self.last_error_message: Optional[str] = None
         self.last_error_port: Optional[int] = None
     
@@ -101,9 +104,30 @@ class EmailService:
         if not self.is_configured:
             print("Warning: Email service not configured. Set SMTP_USER and SMTP_PASSWORD environment variables.")
 
+    def _build_message(self, template_name: str, to_email: str, params: Dict[str, Any]) -> MIMEMultipart:
+        """Render a precompiled template into a text + HTML message."""
+        rendered = render_email(template_name, params)
+        return build_message(rendered, f'{self.from_name} <{self.from_email}>', to_email)
+
+    def _ordered_port_candidates(self) -> List[int]:
+        """Working ports first, known-bad ports skipped; empty while the SMTP circuit is open."""
+        return smtp_port_health.usable_ports(self.smtp_host, self.smtp_port_candidates)
+
+    @staticmethod
+    def _is_port_failure(exc: Exception) -> bool:
+        """True for errors that mean the port itself is unreachable (not auth/protocol errors)."""
+        if isinstance(exc, smtplib.SMTPConnectError):
+            return True
+        return isinstance(exc, OSError) and not isinstance(exc, (smtplib.SMTPException, ssl.SSLError))
+
     def _send_email_message(self, msg: MIMEMultipart, to_email: str) -> bool:
         """
         Send an email message with retry and timeout safeguards.
+        
+        Uses a pooled, already-authenticated SMTP session when one is available
+        and tries known-good ports first. Ports that cannot be reached are
+        cached as bad, and once every port has failed sends fail immediately
+        until the circuit closes (see SMTPPortHealth).
         """
         if not self.is_configured:
             return False
@@ -125,7 +149,18 @@ class EmailService:
             context.verify_mode = ssl.CERT_NONE
             print("[EmailService] ⚠️  WARNING: SSL certificate verification is DISABLED (development mode only)")
 
-        for port in self.smtp_port_candidates:
+        ports = self._ordered_port_candidates()
+        if not ports:
+            self.last_error_message = (
+                f"SMTP server {self.smtp_host} is unreachable on all ports "
+                f"({', '.join(str(p) for p in self.smtp_port_candidates)}); retrying later"
+            )
+            print(f"[EmailService] ❌ {self.last_error_message}")
+            return False
+
+        unreachable_ports = []
+        for port in ports:
+            port_unreachable = False
             # Use shorter timeout for port 25 since it's often blocked by ISPs
             # This prevents long waits when port 25 is unavailable
             port_timeout = 5 if port == 25 else self.smtp_timeout
@@ -133,6 +168,7 @@ class EmailService:
             max_attempts = 1 if port == 25 else self.smtp_retry_attempts
             
             for attempt in range(1, max_attempts + 1):
+                port_unreachable = False
                 try:
                     # Decide whether to use SSL for this port
                     port_use_ssl = self.smtp_use_ssl if self._smtp_use_ssl_explicit else (port == 465)
@@ -142,28 +178,9 @@ class EmailService:
                         # Some providers block STARTTLS on port 25; try plain first
                         should_attempt_starttls = False
 
-                    if port_use_ssl:
-                        with smtplib.SMTP_SSL(
-                            self.smtp_host,
-                            port,
-                            timeout=port_timeout,
-                            context=context
-                        ) as server:
-                            server.login(self.smtp_user, self.smtp_password)
-                            server.send_message(msg)
-                    else:
-                        with smtplib.SMTP(self.smtp_host, port, timeout=port_timeout) as server:
-                            server.ehlo()
-
-                            if should_attempt_starttls:
-                                if server.has_extn('starttls'):
-                                    server.starttls(context=context)
-                                    server.ehlo()
-                                else:
-                                    print(f"[EmailService] STARTTLS not supported on port {port}, sending without TLS.")
-
-                            server.login(self.smtp_user, self.smtp_password)
-                            server.send_message(msg)
+                    pool_key = (self.smtp_host, port, self.smtp_user, port_use_ssl, should_attempt_starttls)
+                    self._smtp_pool.send(pool_key, self.smtp_password, port_timeout, context, msg)
+                    smtp_port_health.record_success(self.smtp_host, port)
 
                     print(f"[EmailService] ✅ Email sent to {to_email} via port {port} (attempt {attempt})")
                     self.last_error_message = None
@@ -211,6 +228,7 @@ class EmailService:
                                         server.send_message(msg)
                                 print(f"[EmailService] ✅ Email sent to {to_email} via port {port} without SSL verification")
                                 print(f"[EmailService] ⚠️  WARNING: SSL verification is disabled. This should only be used in development!")
+                                smtp_port_health.record_success(self.smtp_host, port)
                                 self.last_error_message = None
                                 self.last_error_port = None
                                 return True
@@ -235,6 +253,7 @@ class EmailService:
                         self.last_error_message = f"Connection failed on port {port}: {error_msg}"
                     self.last_error_port = port
                     print(f"[EmailService] ❌ Connection timeout/error on port {port} (attempt {attempt}): {timeout_exc}")
+                    port_unreachable = self._is_port_failure(timeout_exc)
                     # For port 25, skip retries and move to next port immediately
                     if port == 25:
                         break
@@ -289,6 +308,7 @@ class EmailService:
                                         server.send_message(msg)
                                 print(f"[EmailService] ✅ Email sent to {to_email} via port {port} without SSL verification")
                                 print(f"[EmailService] ⚠️  WARNING: SSL verification is disabled. This should only be used in development!")
+                                smtp_port_health.record_success(self.smtp_host, port)
                                 self.last_error_message = None
                                 self.last_error_port = None
                                 return True
@@ -311,6 +331,13 @@ class EmailService:
                     if attempt < max_attempts:
                         time.sleep(min(2 * attempt, 5))
 
+            if port_unreachable:
+                smtp_port_health.record_failure(self.smtp_host, port)
+                unreachable_ports.append(port)
+
+        if len(unreachable_ports) == len(ports):
+            smtp_port_health.open_circuit(self.smtp_host)
+
         print(f"Failed to send email to {to_email}: {last_error}")
         return False
     
@@ -344,141 +371,13 @@ class EmailService:
             return False
         
         try:
-            # Create message
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = f'Invitation to join {enterprise_name} on MeallensAI'
-            msg['From'] = f'{self.from_name} <{self.from_email}>'
-            msg['To'] = to_email
-            
-            # Create HTML email body
-            html_body = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="UTF-8">
-                <meta name="viewport" content="width=device-width, initial-scale=1.0">
-                <style>
-                    body {{
-                        font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;
-                        line-height: 1.6;
-                        color: #333;
-                        max-width: 600px;
-                        margin: 0 auto;
-                        padding: 20px;
-                    }}
-                    .container {{
-                        background-color: #ffffff;
-                        border: 1px solid #e0e0e0;
-                        padding: 30px;
-                    }}
-                    .header {{
-                        text-align: center;
-                        margin-bottom: 30px;
-                    }}
-                    .logo {{
-                        font-size: 28px;
-                        font-weight: bold;
-                        color: #4CAF50;
-                    }}
-                    .content {{
-                        margin-bottom: 30px;
-                    }}
-                    .button {{
-                        display: inline-block;
-                        padding: 15px 30px;
-                        background-color: #4CAF50;
-                        color: white !important;
-                        text-decoration: none;
-                        font-weight: bold;
-                        text-align: center;
-                        margin: 20px 0;
-                    }}
-                    .button:hover {{
-                        background-color: #45a049;
-                    }}
-                    .custom-message {{
-                        background-color: #f5f5f5;
-                        border-left: 4px solid #4CAF50;
-                        padding: 15px;
-                        margin: 20px 0;
-                        font-style: italic;
-                    }}
-                    .footer {{
-                        margin-top: 30px;
-                        padding-top: 20px;
-                        border-top: 1px solid #e0e0e0;
-                        font-size: 12px;
-                        color: #666;
-                        text-align: center;
-                    }}
-                    .link {{
-                        color: #4CAF50;
-                        word-break: break-all;
-                    }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <div class="header">
-                        <div class="logo">MeallensAI</div>
-                    </div>
-                    
-                    <div class="content">
-                        <h2>You've been invited!</h2>
-                        
-                        <p>Hello,</p>
-                        
-                        <p><strong>{inviter_name}</strong> has invited you to join <strong>{enterprise_name}</strong> on MeallensAI.</p>
-                        
-                        {f'<div class="custom-message"><strong>Personal message:</strong><br>{custom_message}</div>' if custom_message else ''}
-                        
-                        <p>MeallensAI is an AI-powered nutrition and meal planning platform that helps you make healthier food choices and create personalized meal plans.</p>
-                        
-                        <p>Click the button below to accept the invitation and get started:</p>
-                        
-                        <div style="text-align: center;">
-                            <a href="{invitation_link}" class="button">Accept Invitation</a>
-                        </div>
-                        
-                        <p>Or copy and paste this link into your browser:</p>
-                        <p class="link">{invitation_link}</p>
-                        
-                        <p><small>This invitation will expire in 30 days.</small></p>
-                    </div>
-                    
-                    <div class="footer">
-                        <p>This email was sent to {to_email} because {inviter_name} invited you to join their organization on MeallensAI.</p>
-                        <p>&copy; 2025 MeallensAI. All rights reserved.</p>
-                    </div>
-                </div>
-            </body>
-            </html>
-            """
-            
-            # Create plain text version as fallback
-            text_body = f"""
-            You've been invited to join {enterprise_name} on MeallensAI!
-            
-            {inviter_name} has invited you to join their organization on MeallensAI.
-            
-            {f'Personal message: {custom_message}' if custom_message else ''}
-            
-            MeallensAI is an AI-powered nutrition and meal planning platform that helps you make healthier food choices and create personalized meal plans.
-            
-            Accept your invitation by visiting this link:
-            {invitation_link}
-            
-            This invitation will expire in 30 days.
-            
-            ---
-            This email was sent to {to_email} because {inviter_name} invited you to join their organization on MeallensAI.
-            © 2025 MeallensAI. All rights reserved.
-            """
-            
-            # Attach both versions
-            msg.attach(MIMEText(text_body, 'plain'))
-            msg.attach(MIMEText(html_body, 'html'))
-            
+            msg = self._build_message('invitation', to_email, {
+                'to_email': to_email,
+                'enterprise_name': enterprise_name,
+                'inviter_name': inviter_name,
+                'invitation_link': invitation_link,
+                'custom_message': custom_message,
+            })
             return self._send_email_message(msg, to_email)
             
         except Exception as e:
@@ -505,72 +404,7 @@ class EmailService:
             return False
         
         try:
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = f'Welcome to {enterprise_name} on MeallensAI!'
-            msg['From'] = f'{self.from_name} <{self.from_email}>'
-            msg['To'] = to_email
-            
-            html_body = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="UTF-8">
-                <style>
-                    body {{
-                        font-family: Arial, sans-serif;
-                        line-height: 1.6;
-                        color: #333;
-                        max-width: 600px;
-                        margin: 0 auto;
-                        padding: 20px;
-                    }}
-                    .container {{
-                        background-color: #ffffff;
-                        border: 1px solid #e0e0e0;
-                        padding: 30px;
-                    }}
-                    .header {{
-                        text-align: center;
-                        margin-bottom: 30px;
-                    }}
-                    .logo {{
-                        font-size: 28px;
-                        font-weight: bold;
-                        color: #4CAF50;
-                    }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <div class="header">
-                        <div class="logo">MeallensAI</div>
-                    </div>
-                    
-                    <h2>Welcome to MeallensAI! 🎉</h2>
-                    
-                    <p>Congratulations! You've successfully joined <strong>{enterprise_name}</strong> on MeallensAI.</p>
-                    
-                    <p>You now have access to:</p>
-                    <ul>
-                        <li>AI-powered food detection and analysis</li>
-                        <li>Personalized meal planning</li>
-                        <li>Nutritional guidance tailored to your needs</li>
-                        <li>Access to recipes and meal suggestions</li>
-                    </ul>
-                    
-                    <p>Get started by logging in to your account and exploring the features!</p>
-                    
-                    <p>If you have any questions, don't hesitate to reach out to your healthcare provider or our support team.</p>
-                    
-                    <p>Best regards,<br>
-                    The MeallensAI Team</p>
-                </div>
-            </body>
-            </html>
-            """
-            
-            msg.attach(MIMEText(html_body, 'html'))
-            
+            msg = self._build_message('welcome', to_email, {'enterprise_name': enterprise_name})
             return self._send_email_message(msg, to_email)
             
         except Exception as e:
@@ -615,116 +449,12 @@ class EmailService:
                 login_url = "https://www.meallensai.com/accept-invitation"
         
         try:
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = f'Your MeallensAI account has been created - {enterprise_name}'
-            msg['From'] = f'{self.from_name} <{self.from_email}>'
-            msg['To'] = to_email
-            
-            html_body = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="UTF-8">
-                <style>
-                    body {{
-                        font-family: Arial, sans-serif;
-                        line-height: 1.6;
-                        color: #333;
-                        max-width: 600px;
-                        margin: 0 auto;
-                        padding: 20px;
-                    }}
-                    .container {{
-                        background-color: #ffffff;
-                        border: 1px solid #e0e0e0;
-                        padding: 30px;
-                    }}
-                    .header {{
-                        text-align: center;
-                        margin-bottom: 30px;
-                    }}
-                    .logo {{
-                        font-size: 28px;
-                        font-weight: bold;
-                        color: #4CAF50;
-                    }}
-                    .button {{
-                        display: inline-block;
-                        background-color: #4CAF50;
-                        color: white;
-                        padding: 12px 24px;
-                        text-decoration: none;
-                        border-radius: 5px;
-                        font-weight: bold;
-                        margin: 20px 0;
-                    }}
-                    .credentials {{
-                        background-color: #f9f9f9;
-                        border: 1px solid #ddd;
-                        padding: 15px;
-                        border-radius: 5px;
-                        margin: 20px 0;
-                    }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <div class="header">
-                        <div class="logo">MeallensAI</div>
-                    </div>
-                    
-                    <h2>Your account has been created! 🎉</h2>
-                    
-                    <p>Hello,</p>
-                    
-                    <p><strong>{inviter_name}</strong> has created an account for you and added you to <strong>{enterprise_name}</strong> on MeallensAI.</p>
-                    
-                    <p>MeallensAI is an AI-powered nutrition and meal planning platform that helps you make healthier food choices and create personalized meal plans.</p>
-                    
-                    <div class="credentials">
-                        <h3>Your Login Information:</h3>
-                        <p><strong>Email:</strong> {to_email}</p>
-                        <p><strong>Password:</strong> [The password set by your organization admin]</p>
-                    </div>
-                    
-                    <p>Click the button below to log in and get started:</p>
-                    
-                    <div style="text-align: center;">
-                        <a href="{login_url}" class="button" target="_blank">Login to MeallensAI</a>
-                    </div>
-                    
-                    <p>Or copy and paste this link into your browser:</p>
-                    <p style="word-break: break-all; color: #666;">{login_url}</p>
-                    
-                    <p style="font-size: 12px; color: #666; margin-top: 20px;">
-                        <strong>Note:</strong> If you're already logged in as someone else, please log out first or open this link in a new browser tab/incognito window.
-                    </p>
-                    
-                    <p>Once logged in, you'll have access to:</p>
-                    <ul>
-                        <li>AI-powered food detection and analysis</li>
-                        <li>Personalized meal planning</li>
-                        <li>Nutritional guidance tailored to your needs</li>
-                        <li>Access to recipes and meal suggestions</li>
-                    </ul>
-                    
-                    <p>If you have any questions, please contact your organization administrator.</p>
-                    
-                    <hr style="margin: 30px 0; border: none; border-top: 1px solid #eee;">
-                    
-                    <p style="font-size: 12px; color: #666;">
-                        This email was sent to {to_email} because {inviter_name} created an account for you on MeallensAI.<br>
-                        © 2025 MeallensAI. All rights reserved.
-                    </p>
-                </div>
-            </body>
-            </html>
-            """
-            
-            # Create the HTML part
-            html_part = MIMEText(html_body, 'html')
-            msg.attach(html_part)
-            
+            msg = self._build_message('user_creation', to_email, {
+                'to_email': to_email,
+                'enterprise_name': enterprise_name,
+                'inviter_name': inviter_name,
+                'login_url': login_url,
+            })
             return self._send_email_message(msg, to_email)
             
         except Exception as e:
@@ -765,144 +495,15 @@ class EmailService:
             return False
         
         try:
-            # Create message
-            msg = MIMEMultipart('alternative')
-            msg['Subject'] = f'✅ {accepted_user_name or accepted_user_email} accepted your invitation to {enterprise_name}'
-            msg['From'] = f'{self.from_name} <{self.from_email}>'
-            msg['To'] = admin_email
-            
             dashboard_link = dashboard_url or (os.environ.get('FRONTEND_URL', 'https://www.meallensai.com') + '/enterprise')
-            
-            # Create HTML email body
-            html_body = f"""
-            <!DOCTYPE html>
-            <html>
-            <head>
-                <meta charset="UTF-8">
-                <meta name="viewport" content="width=device-width, initial-scale=1.0">
-                <style>
-                    body {{
-                        font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;
-                        line-height: 1.6;
-                        color: #333;
-                        max-width: 600px;
-                        margin: 0 auto;
-                        padding: 20px;
-                    }}
-                    .container {{
-                        background-color: #ffffff;
-                        border: 1px solid #e0e0e0;
-                        padding: 30px;
-                    }}
-                    .header {{
-                        text-align: center;
-                        margin-bottom: 30px;
-                    }}
-                    .logo {{
-                        font-size: 28px;
-                        font-weight: bold;
-                        color: #4CAF50;
-                    }}
-                    .success-badge {{
-                        background-color: #4CAF50;
-                        color: white;
-                        padding: 10px 20px;
-                        border-radius: 5px;
-                        display: inline-block;
-                        margin: 20px 0;
-                        font-weight: bold;
-                    }}
-                    .content {{
-                        margin-bottom: 30px;
-                    }}
-                    .user-info {{
-                        background-color: #f5f5f5;
-                        border-left: 4px solid #4CAF50;
-                        padding: 15px;
-                        margin: 20px 0;
-                    }}
-                    .button {{
-                        display: inline-block;
-                        padding: 15px 30px;
-                        background-color: #4CAF50;
-                        color: white !important;
-                        text-decoration: none;
-                        font-weight: bold;
-                        text-align: center;
-                        margin: 20px 0;
-                        border-radius: 5px;
-                    }}
-                    .footer {{
-                        margin-top: 30px;
-                        padding-top: 20px;
-                        border-top: 1px solid #e0e0e0;
-                        font-size: 12px;
-                        color: #666;
-                        text-align: center;
-                    }}
-                </style>
-            </head>
-            <body>
-                <div class="container">
-                    <div class="header">
-                        <div class="logo">MeallensAI</div>
-                    </div>
-                    
-                    <div class="content">
-                        <div class="success-badge">✓ Invitation Accepted</div>
-                        
-                        <h2>Great news, {admin_name}!</h2>
-                        
-                        <p>A user has accepted your invitation to join <strong>{enterprise_name}</strong>.</p>
-                        
-                        <div class="user-info">
-                            <p><strong>User Details:</strong></p>
-                            <p><strong>Name:</strong> {accepted_user_name or 'Not provided'}</p>
-                            <p><strong>Email:</strong> {accepted_user_email}</p>
-                            <p><strong>Role:</strong> {role}</p>
-                        </div>
-                        
-                        <p>You can now view and manage this user's settings from your enterprise dashboard.</p>
-                        
-                        <p style="text-align: center; margin-top: 30px;">
-                            <a href="{dashboard_link}" class="button">View in Dashboard</a>
-                        </p>
-                    </div>
-                    
-                    <div class="footer">
-                        <p>This is an automated notification from MeallensAI</p>
-                        <p>You received this email because you are an administrator of {enterprise_name}</p>
-                    </div>
-                </div>
-            </body>
-            </html>
-            """
-            
-            text_body = f"""
-            Invitation Accepted
-            
-            Great news, {admin_name}!
-            
-            A user has accepted your invitation to join {enterprise_name}.
-            
-            User Details:
-            Name: {accepted_user_name or 'Not provided'}
-            Email: {accepted_user_email}
-            Role: {role}
-            
-            You can now view and manage this user's settings from your enterprise dashboard.
-            
-            View Dashboard: {dashboard_link}
-            
-            ---
-            This is an automated notification from MeallensAI
-            You received this email because you are an administrator of {enterprise_name}
-            """
-            
-            # Attach both HTML and plain text versions
-            msg.attach(MIMEText(text_body, 'plain'))
-            msg.attach(MIMEText(html_body, 'html'))
-            
+            msg = self._build_message('invitation_accepted', admin_email, {
+                'admin_name': admin_name,
+                'accepted_user_email': accepted_user_email,
+                'accepted_user_name': accepted_user_name,
+                'enterprise_name': enterprise_name,
+                'role': role,
+                'dashboard_link': dashboard_link,
+            })
             return self._send_email_message(msg, admin_email)
             
         except Exception as e:
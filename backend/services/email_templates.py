@@ -0,0 +1,610 @@
+"""
+Precompiled email templates for EmailService
+
+Each template is parsed into string.Template objects once, when this module is
+imported at startup, and rendered from a parameter dict. Values are
+HTML-escaped for the HTML part and inserted as-is into the subject and text
+part. Templates may derive extra placeholders (e.g. optional blocks) from the
+parameters with a `prepare` hook instead of inline conditionals.
+"""
+
+import html
+import secrets
+from email import base64mime
+from email.message import Message
+from email.mime.multipart import MIMEMultipart
+from string import Template
+from typing import Any, Callable, Dict, FrozenSet, Iterable, NamedTuple, Optional
+
+
+class RenderedEmail(NamedTuple):
+    subject: str
+    text: Optional[str]
+    html: str
+
+
+class EmailTemplate:
+    """A subject/text/HTML template compiled once and rendered many times"""
+
+    def __init__(
+        self,
+        name: str,
+        subject: str,
+        html_body: str,
+        text_body: Optional[str] = None,
+        prepare: Optional[Callable[[Dict[str, Any]], Dict[str, Any]]] = None,
+        raw_html_fields: Iterable[str] = ()
+    ):
+        self.name = name
+        self.subject = Template(subject)
+        self.html = Template(html_body)
+        self.text = Template(text_body) if text_body is not None else None
+        self.prepare = prepare
+        # Fields produced by `prepare` that already contain escaped markup
+        self.raw_html_fields: FrozenSet[str] = frozenset(raw_html_fields)
+
+    def render(self, params: Dict[str, Any]) -> RenderedEmail:
+        """
+        Render all parts from a parameter dict.
+
+        Raises:
+            KeyError: If a placeholder has no value
+        """
+        values = {key: '' if value is None else str(value) for key, value in params.items()}
+        if self.prepare:
+            values.update(self.prepare(params))
+
+        html_values = {
+            key: value if key in self.raw_html_fields else html.escape(value)
+            for key, value in values.items()
+        }
+        return RenderedEmail(
+            subject=self.subject.substitute(values),
+            text=self.text.substitute(values) if self.text else None,
+            html=self.html.substitute(html_values)
+        )
+
+
+def _text_part(body: str, subtype: str) -> Message:
+    """
+    The text/<subtype> part MIMEText(body, subtype) builds: us-ascii / 7bit when
+    the body is ASCII, otherwise utf-8 / base64. The headers are written
+    directly instead of through set_charset / set_param, which cost more than
+    the encoding itself.
+    """
+    part = Message()
+    if body.isascii():
+        charset, encoding, payload = 'us-ascii', '7bit', body
+    else:
+        charset, encoding, payload = 'utf-8', 'base64', base64mime.body_encode(body.encode('utf-8'))
+    part['Content-Type'] = f'text/{subtype}; charset="{charset}"'
+    part['MIME-Version'] = '1.0'
+    part['Content-Transfer-Encoding'] = encoding
+    part.set_payload(payload)
+    return part
+
+
+def build_message(rendered: RenderedEmail, from_header: str, to_email: str) -> MIMEMultipart:
+    """Wrap a rendered email in a multipart/alternative message (text first, then HTML)."""
+    # A random boundary set up front spares the generator its search of the
+    # flattened parts for a free one (a fresh regex compiled per message)
+    msg = MIMEMultipart('alternative', boundary=f'==============={secrets.token_hex(16)}==')
+    msg['Subject'] = rendered.subject
+    msg['From'] = from_header
+    msg['To'] = to_email
+    if rendered.text is not None:
+        msg.attach(_text_part(rendered.text, 'plain'))
+    msg.attach(_text_part(rendered.html, 'html'))
+    return msg
+
+
+def _prepare_invitation(params: Dict[str, Any]) -> Dict[str, str]:
+    custom_message = params.get('custom_message')
+    if not custom_message:
+        return {'custom_message_html': '', 'custom_message_text': ''}
+    return {
+        'custom_message_html': (
+            '<div class="custom-message"><strong>Personal message:</strong><br>'
+            f'{html.escape(str(custom_message))}</div>'
+        ),
+        'custom_message_text': f'Personal message: {custom_message}',
+    }
+
+
+def _prepare_invitation_accepted(params: Dict[str, Any]) -> Dict[str, str]:
+    accepted_user_name = params.get('accepted_user_name')
+    return {
+        'accepted_user_display': str(accepted_user_name or 'Not provided'),
+        'accepted_user_label': str(accepted_user_name or params.get('accepted_user_email') or ''),
+    }
+
+
+_INVITATION_HTML = """\
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <style>
+        body {
+            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;
+            line-height: 1.6;
+            color: #333;
+            max-width: 600px;
+            margin: 0 auto;
+            padding: 20px;
+        }
+        .container {
+            background-color: #ffffff;
+            border: 1px solid #e0e0e0;
+            padding: 30px;
+        }
+        .header {
+            text-align: center;
+            margin-bottom: 30px;
+        }
+        .logo {
+            font-size: 28px;
+            font-weight: bold;
+            color: #4CAF50;
+        }
+        .content {
+            margin-bottom: 30px;
+        }
+        .button {
+            display: inline-block;
+            padding: 15px 30px;
+            background-color: #4CAF50;
+            color: white !important;
+            text-decoration: none;
+            font-weight: bold;
+            text-align: center;
+            margin: 20px 0;
+        }
+        .button:hover {
+            background-color: #45a049;
+        }
+        .custom-message {
+            background-color: #f5f5f5;
+            border-left: 4px solid #4CAF50;
+            padding: 15px;
+            margin: 20px 0;
+            font-style: italic;
+        }
+        .footer {
+            margin-top: 30px;
+            padding-top: 20px;
+            border-top: 1px solid #e0e0e0;
+            font-size: 12px;
+            color: #666;
+            text-align: center;
+        }
+        .link {
+            color: #4CAF50;
+            word-break: break-all;
+        }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <div class="logo">MeallensAI</div>
+        </div>
+
+        <div class="content">
+            <h2>You've been invited!</h2>
+
+            <p>Hello,</p>
+
+            <p><strong>${inviter_name}</strong> has invited you to join <strong>${enterprise_name}</strong> on MeallensAI.</p>
+
+            ${custom_message_html}
+
+            <p>MeallensAI is an AI-powered nutrition and meal planning platform that helps you make healthier food choices and create personalized meal plans.</p>
+
+            <p>Click the button below to accept the invitation and get started:</p>
+
+            <div style="text-align: center;">
+                <a href="${invitation_link}" class="button">Accept Invitation</a>
+            </div>
+
+            <p>Or copy and paste this link into your browser:</p>
+            <p class="link">${invitation_link}</p>
+
+            <p><small>This invitation will expire in 30 days.</small></p>
+        </div>
+
+        <div class="footer">
+            <p>This email was sent to ${to_email} because ${inviter_name} invited you to join their organization on MeallensAI.</p>
+            <p>&copy; 2025 MeallensAI. All rights reserved.</p>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+_INVITATION_TEXT = """\
+You've been invited to join ${enterprise_name} on MeallensAI!
+
+${inviter_name} has invited you to join their organization on MeallensAI.
+
+${custom_message_text}
+
+MeallensAI is an AI-powered nutrition and meal planning platform that helps you make healthier food choices and create personalized meal plans.
+
+Accept your invitation by visiting this link:
+${invitation_link}
+
+This invitation will expire in 30 days.
+
+---
+This email was sent to ${to_email} because ${inviter_name} invited you to join their organization on MeallensAI.
+© 2025 MeallensAI. All rights reserved.
+"""
+
+_WELCOME_HTML = """\
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <style>
+        body {
+            font-family: Arial, sans-serif;
+            line-height: 1.6;
+            color: #333;
+            max-width: 600px;
+            margin: 0 auto;
+            padding: 20px;
+        }
+        .container {
+            background-color: #ffffff;
+            border: 1px solid #e0e0e0;
+            padding: 30px;
+        }
+        .header {
+            text-align: center;
+            margin-bottom: 30px;
+        }
+        .logo {
+            font-size: 28px;
+            font-weight: bold;
+            color: #4CAF50;
+        }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <div class="logo">MeallensAI</div>
+        </div>
+
+        <h2>Welcome to MeallensAI! 🎉</h2>
+
+        <p>Congratulations! You've successfully joined <strong>${enterprise_name}</strong> on MeallensAI.</p>
+
+        <p>You now have access to:</p>
+        <ul>
+            <li>AI-powered food detection and analysis</li>
+            <li>Personalized meal planning</li>
+            <li>Nutritional guidance tailored to your needs</li>
+            <li>Access to recipes and meal suggestions</li>
+        </ul>
+
+        <p>Get started by logging in to your account and exploring the features!</p>
+
+        <p>If you have any questions, don't hesitate to reach out to your healthcare provider or our support team.</p>
+
+        <p>Best regards,<br>
+        The MeallensAI Team</p>
+    </div>
+</body>
+</html>
+"""
+
+_WELCOME_TEXT = """\
+Welcome to MeallensAI!
+
+Congratulations! You've successfully joined ${enterprise_name} on MeallensAI.
+
+You now have access to:
+- AI-powered food detection and analysis
+- Personalized meal planning
+- Nutritional guidance tailored to your needs
+- Access to recipes and meal suggestions
+
+Get started by logging in to your account and exploring the features!
+
+If you have any questions, don't hesitate to reach out to your healthcare provider or our support team.
+
+Best regards,
+The MeallensAI Team
+"""
+
+_USER_CREATION_HTML = """\
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <style>
+        body {
+            font-family: Arial, sans-serif;
+            line-height: 1.6;
+            color: #333;
+            max-width: 600px;
+            margin: 0 auto;
+            padding: 20px;
+        }
+        .container {
+            background-color: #ffffff;
+            border: 1px solid #e0e0e0;
+            padding: 30px;
+        }
+        .header {
+            text-align: center;
+            margin-bottom: 30px;
+        }
+        .logo {
+            font-size: 28px;
+            font-weight: bold;
+            color: #4CAF50;
+        }
+        .button {
+            display: inline-block;
+            background-color: #4CAF50;
+            color: white;
+            padding: 12px 24px;
+            text-decoration: none;
+            border-radius: 5px;
+            font-weight: bold;
+            margin: 20px 0;
+        }
+        .credentials {
+            background-color: #f9f9f9;
+            border: 1px solid #ddd;
+            padding: 15px;
+            border-radius: 5px;
+            margin: 20px 0;
+        }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <div class="logo">MeallensAI</div>
+        </div>
+
+        <h2>Your account has been created! 🎉</h2>
+
+        <p>Hello,</p>
+
+        <p><strong>${inviter_name}</strong> has created an account for you and added you to <strong>${enterprise_name}</strong> on MeallensAI.</p>
+
+        <p>MeallensAI is an AI-powered nutrition and meal planning platform that helps you make healthier food choices and create personalized meal plans.</p>
+
+        <div class="credentials">
+            <h3>Your Login Information:</h3>
+            <p><strong>Email:</strong> ${to_email}</p>
+            <p><strong>Password:</strong> [The password set by your organization admin]</p>
+        </div>
+
+        <p>Click the button below to log in and get started:</p>
+
+        <div style="text-align: center;">
+            <a href="${login_url}" class="button" target="_blank">Login to MeallensAI</a>
+        </div>
+
+        <p>Or copy and paste this link into your browser:</p>
+        <p style="word-break: break-all; color: #666;">${login_url}</p>
+
+        <p style="font-size: 12px; color: #666; margin-top: 20px;">
+            <strong>Note:</strong> If you're already logged in as someone else, please log out first or open this link in a new browser tab/incognito window.
+        </p>
+
+        <p>Once logged in, you'll have access to:</p>
+        <ul>
+            <li>AI-powered food detection and analysis</li>
+            <li>Personalized meal planning</li>
+            <li>Nutritional guidance tailored to your needs</li>
+            <li>Access to recipes and meal suggestions</li>
+        </ul>
+
+        <p>If you have any questions, please contact your organization administrator.</p>
+
+        <hr style="margin: 30px 0; border: none; border-top: 1px solid #eee;">
+
+        <p style="font-size: 12px; color: #666;">
+            This email was sent to ${to_email} because ${inviter_name} created an account for you on MeallensAI.<br>
+            © 2025 MeallensAI. All rights reserved.
+        </p>
+    </div>
+</body>
+</html>
+"""
+
+_USER_CREATION_TEXT = """\
+Your MeallensAI account has been created!
+
+Hello,
+
+${inviter_name} has created an account for you and added you to ${enterprise_name} on MeallensAI.
+
+Your Login Information:
+Email: ${to_email}
+Password: [The password set by your organization admin]
+
+Log in here:
+${login_url}
+
+Note: If you're already logged in as someone else, please log out first or open this link in a new browser tab/incognito window.
+
+If you have any questions, please contact your organization administrator.
+
+---
+This email was sent to ${to_email} because ${inviter_name} created an account for you on MeallensAI.
+© 2025 MeallensAI. All rights reserved.
+"""
+
+_INVITATION_ACCEPTED_HTML = """\
+<!DOCTYPE html>
+<html>
+<head>
+    <meta charset="UTF-8">
+    <meta name="viewport" content="width=device-width, initial-scale=1.0">
+    <style>
+        body {
+            font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, 'Helvetica Neue', Arial, sans-serif;
+            line-height: 1.6;
+            color: #333;
+            max-width: 600px;
+            margin: 0 auto;
+            padding: 20px;
+        }
+        .container {
+            background-color: #ffffff;
+            border: 1px solid #e0e0e0;
+            padding: 30px;
+        }
+        .header {
+            text-align: center;
+            margin-bottom: 30px;
+        }
+        .logo {
+            font-size: 28px;
+            font-weight: bold;
+            color: #4CAF50;
+        }
+        .success-badge {
+            background-color: #4CAF50;
+            color: white;
+            padding: 10px 20px;
+            border-radius: 5px;
+            display: inline-block;
+            margin: 20px 0;
+            font-weight: bold;
+        }
+        .content {
+            margin-bottom: 30px;
+        }
+        .user-info {
+            background-color: #f5f5f5;
+            border-left: 4px solid #4CAF50;
+            padding: 15px;
+            margin: 20px 0;
+        }
+        .button {
+            display: inline-block;
+            padding: 15px 30px;
+            background-color: #4CAF50;
+            color: white !important;
+            text-decoration: none;
+            font-weight: bold;
+            text-align: center;
+            margin: 20px 0;
+            border-radius: 5px;
+        }
+        .footer {
+            margin-top: 30px;
+            padding-top: 20px;
+            border-top: 1px solid #e0e0e0;
+            font-size: 12px;
+            color: #666;
+            text-align: center;
+        }
+    </style>
+</head>
+<body>
+    <div class="container">
+        <div class="header">
+            <div class="logo">MeallensAI</div>
+        </div>
+
+        <div class="content">
+            <div class="success-badge">✓ Invitation Accepted</div>
+
+            <h2>Great news, ${admin_name}!</h2>
+
+            <p>A user has accepted your invitation to join <strong>${enterprise_name}</strong>.</p>
+
+            <div class="user-info">
+                <p><strong>User Details:</strong></p>
+                <p><strong>Name:</strong> ${accepted_user_display}</p>
+                <p><strong>Email:</strong> ${accepted_user_email}</p>
+                <p><strong>Role:</strong> ${role}</p>
+            </div>
+
+            <p>You can now view and manage this user's settings from your enterprise dashboard.</p>
+
+            <p style="text-align: center; margin-top: 30px;">
+                <a href="${dashboard_link}" class="button">View in Dashboard</a>
+            </p>
+        </div>
+
+        <div class="footer">
+            <p>This is an automated notification from MeallensAI</p>
+            <p>You received this email because you are an administrator of ${enterprise_name}</p>
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+_INVITATION_ACCEPTED_TEXT = """\
+Invitation Accepted
+
+Great news, ${admin_name}!
+
+A user has accepted your invitation to join ${enterprise_name}.
+
+User Details:
+Name: ${accepted_user_display}
+Email: ${accepted_user_email}
+Role: ${role}
+
+You can now view and manage this user's settings from your enterprise dashboard.
+
+View Dashboard: ${dashboard_link}
+
+---
+This is an automated notification from MeallensAI
+You received this email because you are an administrator of ${enterprise_name}
+"""
+
+
+# Compiled once at import (startup); keyed by the names EmailService renders
+TEMPLATES: Dict[str, EmailTemplate] = {
+    template.name: template
+    for template in (
+        EmailTemplate(
+            'invitation',
+            subject='Invitation to join ${enterprise_name} on MeallensAI',
+            html_body=_INVITATION_HTML,
+            text_body=_INVITATION_TEXT,
+            prepare=_prepare_invitation,
+            raw_html_fields=('custom_message_html',)
+        ),
+        EmailTemplate(
+            'welcome',
+            subject='Welcome to ${enterprise_name} on MeallensAI!',
+            html_body=_WELCOME_HTML,
+            text_body=_WELCOME_TEXT
+        ),
+        EmailTemplate(
+            'user_creation',
+            subject='Your MeallensAI account has been created - ${enterprise_name}',
+            html_body=_USER_CREATION_HTML,
+            text_body=_USER_CREATION_TEXT
+        ),
+        EmailTemplate(
+            'invitation_accepted',
+            subject='✅ ${accepted_user_label} accepted your invitation to ${enterprise_name}',
+            html_body=_INVITATION_ACCEPTED_HTML,
+            text_body=_INVITATION_ACCEPTED_TEXT,
+            prepare=_prepare_invitation_accepted
+        ),
+    )
+}
+
+
+def render_email(name: str, params: Dict[str, Any]) -> RenderedEmail:
+    """Render a registered template by name."""
+    return TEMPLATES[name].render(params)
@@ -0,0 +1,92 @@
+"""
+Bounded fan-out executor for independent Supabase queries.
+
+Runs a handful of independent calls on a shared, fixed-size thread pool and
+joins their results, so handler latency becomes max(query) instead of
+sum(query).
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, Callable, Dict, Optional
+
+try:
+    DEFAULT_MAX_WORKERS = max(1, int(os.environ.get('FANOUT_MAX_WORKERS', '16')))
+except ValueError:
+    DEFAULT_MAX_WORKERS = 16
+
+try:
+    DEFAULT_TIMEOUT = float(os.environ.get('FANOUT_TIMEOUT', '15'))
+except ValueError:
+    DEFAULT_TIMEOUT = 15.0
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_pid: Optional[int] = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    """Return this process's pool (recreated after a fork)."""
+    global _executor, _executor_pid
+    pid = os.getpid()
+    if _executor is None or _executor_pid != pid:
+        with _executor_lock:
+            if _executor is None or _executor_pid != pid:
+                _executor = ThreadPoolExecutor(max_workers=DEFAULT_MAX_WORKERS, thread_name_prefix='fanout')
+                _executor_pid = pid
+    return _executor
+
+
+def fan_out(
+    calls: Dict[str, Callable[[], Any]],
+    timeout: Optional[float] = None,
+    return_exceptions: bool = False
+) -> Dict[str, Any]:
+    """
+    Run independent zero-argument callables concurrently and join the results.
+
+    Calls run on worker threads, so they must not rely on Flask's request or
+    app context - pass plain values in via closures instead. Do not call
+    fan_out from inside a fanned-out call (the pool is bounded).
+
+    Args:
+        calls: Mapping of name -> callable
+        timeout: Overall deadline in seconds for the whole batch (default FANOUT_TIMEOUT)
+        return_exceptions: If True, failures (including timeouts) are returned as
+            exception values instead of being raised
+
+    Returns:
+        Dict mapping each name to its callable's return value
+
+    Raises:
+        The first failing call's exception (in `calls` order) or TimeoutError,
+        unless return_exceptions is True.
+    """
+    if not calls:
+        return {}
+
+    deadline = time.monotonic() + (DEFAULT_TIMEOUT if timeout is None else timeout)
+    executor = _get_executor()
+    futures = {name: executor.submit(fn) for name, fn in calls.items()}
+
+    results: Dict[str, Any] = {}
+    for name, future in futures.items():
+        try:
+            results[name] = future.result(timeout=max(0.0, deadline - time.monotonic()))
+        except FutureTimeoutError:
+            future.cancel()
+            error = TimeoutError(f"Fan-out call '{name}' timed out")
+            if not return_exceptions:
+                for pending in futures.values():
+                    pending.cancel()
+                raise error
+            results[name] = error
+        except Exception as e:
+            if not return_exceptions:
+                for pending in futures.values():
+                    pending.cancel()
+                raise
+            results[name] = e
+    return results
@@ -0,0 +1,101 @@
+"""
+Idempotency store for payment activation endpoints
+
+Activation requests carry a Paystack reference. The first request for a
+reference claims it, runs, and stores its successful response; repeats
+(double-submits, client retries) get the stored response back without
+re-running the activation. While the first request is still running, repeats
+wait briefly and then get a 'still processing' answer instead of a second
+activation.
+
+Records are keyed by (reference, scope), so a stored response is only replayed
+to the endpoint that produced it. The claim also checks the reference's
+records under other scopes: a payment already activated through another
+endpoint comes back as ACTIVATED_ELSEWHERE rather than being run again.
+Records live in the Supabase payment_idempotency_keys table (migration 016),
+so all workers and hosts share them. The claim is a single atomic RPC and
+returns a claim id that complete() and release() must present, so a request
+whose stale claim was taken over cannot touch the new holder's record.
+Records expire after IDEMPOTENCY_TTL_SECONDS.
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Optional, Tuple
+from utils.env import int_env
+
+CLAIMED = 'claimed'
+IN_PROGRESS = 'in_progress'
+COMPLETED = 'completed'
+CONFLICT = 'conflict'
+ACTIVATED_ELSEWHERE = 'activated_elsewhere'
+
+TABLE = 'payment_idempotency_keys'
+
+
+class IdempotencyStore:
+    """Claim / complete / release records keyed by payment reference and scope"""
+
+    def __init__(self, supabase_client=None):
+        self._supabase = supabase_client
+        self.ttl = max(60, int_env('IDEMPOTENCY_TTL_SECONDS', 86400))
+        # A claim older than this is assumed abandoned (crashed worker) and can be taken over
+        self.claim_timeout = max(5, int_env('IDEMPOTENCY_CLAIM_TIMEOUT_SECONDS', 120))
+
+    @property
+    def supabase(self):
+        if self._supabase is None:
+            from services.supabase_clients import get_shared_client
+            self._supabase = get_shared_client()
+        return self._supabase
+
+    def begin(self, reference: str, owner: Optional[str], scope: str) -> Tuple[str, Optional[Dict[str, Any]]]:
+        """
+        Claim a reference for processing by the endpoint named by scope.
+
+        Returns:
+            (CLAIMED, {'claim_id'}): caller should run the operation, then
+                complete() or release() with the claim id
+            (COMPLETED, {'status_code', 'body', 'scope'}): this scope's stored response to return as-is
+            (ACTIVATED_ELSEWHERE, {'scope'}): another endpoint already activated the reference
+            (IN_PROGRESS, {'scope'}): another request holds the claim
+            (CONFLICT, None): the reference was used by a different owner
+        """
+        result = self.supabase.rpc('begin_payment_idempotency', {
+            'p_reference': reference,
+            'p_scope': scope,
+            'p_owner': owner,
+            'p_ttl_seconds': self.ttl,
+            'p_claim_timeout_seconds': self.claim_timeout
+        }).execute()
+        outcome = result.data or {}
+        state = outcome.get('state')
+        if state == COMPLETED:
+            return COMPLETED, {'status_code': outcome['status_code'], 'body': outcome['body'], 'scope': outcome.get('scope')}
+        if state == CLAIMED and outcome.get('claim_id'):
+            return CLAIMED, {'claim_id': outcome['claim_id']}
+        if state in (IN_PROGRESS, ACTIVATED_ELSEWHERE):
+            return state, {'scope': outcome.get('scope')}
+        if state == CONFLICT:
+            return CONFLICT, None
+        raise RuntimeError(f'Unexpected idempotency claim result: {outcome}')
+
+    def complete(self, reference: str, scope: str, claim_id: str, status_code: int, body: Any) -> None:
+        """Store the successful response for a claim this request still holds."""
+        now = datetime.now(timezone.utc)
+        self.supabase.table(TABLE).update({
+            'status': COMPLETED,
+            'status_code': status_code,
+            'body': body,
+            'updated_at': now.isoformat(),
+            'expires_at': (now + timedelta(seconds=self.ttl)).isoformat()
+        }).eq('reference', reference).eq('scope', scope).eq('claim_id', claim_id).eq('status', IN_PROGRESS).execute()
+
+    def release(self, reference: str, scope: str, claim_id: str) -> None:
+        """Drop a claim this request still holds after a failed attempt, so the client can retry."""
+        self.supabase.table(TABLE).delete() \
+            .eq('reference', reference).eq('scope', scope).eq('claim_id', claim_id).eq('status', IN_PROGRESS) \
+            .execute()
+
+
+# Create a singleton instance
+idempotency_store = IdempotencyStore()
@@ -1,9 +1,22 @@
 import os
 import json
-import requests
-from datetime import datetime, timedelta
+import time
+from datetime import datetime, timedelta, timezone
 from typing import Dict, List, Optional, Any
-from supabase import create_client, Client
+from supabase import Client
+from services.supabase_clients import get_shared_client
+from services.subscription_service import invalidates_subscription_status, subscription_status_cache
+from services.paystack_client import get_paystack_client
+
+try:
+    EXPIRY_SWEEP_CHUNK_SIZE = int(os.environ.get('EXPIRY_SWEEP_CHUNK_SIZE', '500'))
+except ValueError:
+    EXPIRY_SWEEP_CHUNK_SIZE = 500
+
+try:
+    EXPIRY_SWEEP_MAX_CHUNKS = int(os.environ.get('EXPIRY_SWEEP_MAX_CHUNKS', '200'))
+except ValueError:
+    EXPIRY_SWEEP_MAX_CHUNKS = 200
 
 class LifecycleSubscriptionService:
     """
@@ -11,14 +24,9 @@ class LifecycleSubscriptionService:
     Handles user states: new -> trial_used -> paid -> expired -> paid (renewal)
     """
     
-    def __init__(self):
-        # Initialize Supabase client
-        supabase_url = os.getenv('SUPABASE_URL')
-        supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
-        if not supabase_url or not supabase_key:
-            raise ValueError("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set")
-        
-        self.supabase: Client = create_client(supabase_url, supabase_key)
+    def __init__(self, supabase_client: Optional[Client] = None):
+        # Reuse the worker's shared Supabase client (one connection pool per process)
+        self.supabase: Client = supabase_client or get_shared_client()
         self.paystack_secret_key = os.getenv('PAYSTACK_SECRET_KEY')
         self.paystack_public_key = os.getenv('PAYSTACK_PUBLIC_KEY')
         
@@ -68,6 +76,7 @@ class LifecycleSubscriptionService:
                 'error': str(e)
             }
     
+    @invalidates_subscription_status
     def initialize_user_trial(self, user_id: str, duration_hours: int = 48) -> Dict[str, Any]:
         """
         Initialize trial for a new user
@@ -107,6 +116,7 @@ class LifecycleSubscriptionService:
                 'error': str(e)
             }
     
+    @invalidates_subscription_status
     def mark_trial_used(self, user_id: str) -> Dict[str, Any]:
         """
         Mark trial as used and update user state to trial_used
@@ -145,6 +155,7 @@ class LifecycleSubscriptionService:
                 'error': str(e)
             }
     
+    @invalidates_subscription_status
     def activate_subscription_for_days(self, user_id: str, duration_days: int, paystack_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Activate subscription for a specific number of days and update user state to paid
@@ -202,6 +213,7 @@ class LifecycleSubscriptionService:
                 'error': str(e)
             }
     
+    @invalidates_subscription_status
     def mark_subscription_expired(self, user_id: str) -> Dict[str, Any]:
         """
         Mark subscription as expired and update user state to expired
@@ -240,6 +252,7 @@ class LifecycleSubscriptionService:
                 'error': str(e)
             }
     
+    @invalidates_subscription_status
     def set_test_mode(self, user_id: str, test_mode: bool = True) -> Dict[str, Any]:
         """
         Enable/disable test mode with 1-minute durations
@@ -324,47 +337,110 @@ class LifecycleSubscriptionService:
                 'error': str(e)
             }
     
-    def check_and_update_expired_trials(self) -> Dict[str, Any]:
+    def _sweep_expired(self, label: str, rpc_name: str, table: str, due_column: str, due_filter: Dict[str, Any],
+                       mark_one, dry_run: bool = False, chunk_size: Optional[int] = None) -> Dict[str, Any]:
         """
-        Check for expired trials and mark them as used
+        Expire due rows in chunks through a batch RPC (see migration 008).
+
+        Each RPC call expires up to chunk_size due rows inside the database,
+        running the same mark_* function per row as the per-user path so the
+        user's lifecycle state is updated too, and returns their users; expired
+        rows stop matching, so the sweep repeats until a short chunk comes back.
+        Falls back to the old row-by-row path if the RPC is not deployed.
         """
-        try:
-            print("🔍 Checking for expired trials...")
-            
-            # Get all active trials that have expired
-            expired_trials = self.supabase.table('user_trials').select(
-                'user_id, id, end_date'
-            ).eq('is_used', False).lt('end_date', datetime.now().isoformat()).execute()
-            
-            if not expired_trials.data:
-                print("✅ No expired trials found")
-                return {
-                    'success': True,
-                    'data': {
-                        'expired_count': 0,
-                        'message': 'No expired trials found'
-                    }
-                }
-            
-            # Mark each expired trial as used
-            expired_count = 0
-            for trial in expired_trials.data:
-                result = self.mark_trial_used(trial['user_id'])
-                if result['success']:
-                    expired_count += 1
-                    print(f"✅ Marked trial as used for user: {trial['user_id']}")
-                else:
-                    print(f"❌ Failed to mark trial as used for user: {trial['user_id']}")
-            
-            print(f"✅ Processed {expired_count} expired trials")
+        chunk_size = max(1, min(chunk_size or EXPIRY_SWEEP_CHUNK_SIZE, 5000))
+        started = time.monotonic()
+        now_iso = datetime.now(timezone.utc).isoformat()
+
+        def due_query(columns: str, **kwargs):
+            query = self.supabase.table(table).select(columns, **kwargs).lte(due_column, now_iso)
+            for column, value in due_filter.items():
+                query = query.eq(column, value)
+            return query
+
+        if dry_run:
+            result = due_query('user_id', count='exact').limit(1).execute()
+            due_count = result.count if result.count is not None else len(result.data or [])
+            print(f"🔍 [ExpirySweep] Dry run: {due_count} {label} due for expiry")
             return {
                 'success': True,
                 'data': {
-                    'expired_count': expired_count,
-                    'message': f'Processed {expired_count} expired trials'
+                    'dry_run': True,
+                    'due_count': due_count,
+                    'expired_count': 0,
+                    'message': f'{due_count} {label} would be expired'
                 }
             }
-            
+
+        expired_ids: List[str] = []
+        failed: List[Dict[str, Any]] = []
+        chunks = 0
+        mode = 'batch'
+        try:
+            while chunks < EXPIRY_SWEEP_MAX_CHUNKS:
+                rows = self.supabase.rpc(rpc_name, {'p_limit': chunk_size}).execute().data or []
+                chunks += 1
+                if not rows:
+                    break
+                chunk_expired = list(dict.fromkeys(row['user_id'] for row in rows))
+                expired_ids.extend(chunk_expired)
+                subscription_status_cache.invalidate_many(chunk_expired)
+                if len(rows) < chunk_size:
+                    break
+            else:
+                print(f"⚠️ [ExpirySweep] Stopped after {chunks} chunks; remaining {label} are left for the next sweep")
+        except Exception as e:
+            if chunks or rpc_name not in str(e):
+                raise
+            # Migration 008 not applied yet: expire one user at a time as before
+            print(f"⚠️ [ExpirySweep] {rpc_name} unavailable ({e}), falling back to per-user updates")
+            mode = 'per_user'
+            rows = due_query('user_id').execute().data or []
+            for user_id in dict.fromkeys(row['user_id'] for row in rows):
+                result = mark_one(user_id)
+                if result.get('success'):
+                    expired_ids.append(user_id)
+                else:
+                    failed.append({'user_id': user_id, 'error': result.get('error')})
+            chunks = 1 if rows else 0
+
+        expired_count = len(set(expired_ids))
+        duration_ms = int((time.monotonic() - started) * 1000)
+        for failure in failed:
+            print(f"❌ [ExpirySweep] Failed to expire {label} for user {failure['user_id']}: {failure['error']}")
+        print(f"✅ [ExpirySweep] Expired {expired_count} {label} in {chunks} chunk(s), {duration_ms}ms ({mode})")
+        return {
+            'success': True,
+            'data': {
+                'dry_run': False,
+                'expired_count': expired_count,
+                'failed_count': len(failed),
+                'chunks': chunks,
+                'duration_ms': duration_ms,
+                'mode': mode,
+                'message': f'Processed {expired_count} expired {label}' if expired_count else f'No expired {label} found'
+            }
+        }
+
+    def _expire_subscription_rows(self, user_id: str) -> Dict[str, Any]:
+        """Per-user fallback: flip lapsed active rows to expired, then update the lifecycle state"""
+        now_iso = datetime.now(timezone.utc).isoformat()
+        self.supabase.table('user_subscriptions').update({
+            'status': 'expired',
+            'updated_at': now_iso
+        }).eq('user_id', user_id).eq('status', 'active').lte('current_period_end', now_iso).execute()
+        return self.mark_subscription_expired(user_id)
+
+    def check_and_update_expired_trials(self, dry_run: bool = False, chunk_size: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Check for expired trials and mark them as used
+        """
+        try:
+            print("🔍 Checking for expired trials...")
+            return self._sweep_expired(
+                'trials', 'expire_trials_batch', 'user_trials', 'end_date', {'is_used': False},
+                self.mark_trial_used, dry_run=dry_run, chunk_size=chunk_size
+            )
         except Exception as e:
             print(f"❌ Error checking expired trials: {str(e)}")
             return {
@@ -372,47 +448,16 @@ class LifecycleSubscriptionService:
                 'error': str(e)
             }
     
-    def check_and_update_expired_subscriptions(self) -> Dict[str, Any]:
+    def check_and_update_expired_subscriptions(self, dry_run: bool = False, chunk_size: Optional[int] = None) -> Dict[str, Any]:
         """
         Check for expired subscriptions and mark them as expired
         """
         try:
             print("🔍 Checking for expired subscriptions...")
-            
-            # Get all active subscriptions that have expired
-            expired_subscriptions = self.supabase.table('user_subscriptions').select(
-                'user_id, id, end_date'
-            ).eq('status', 'active').lt('end_date', datetime.now().isoformat()).execute()
-            
-            if not expired_subscriptions.data:
-                print("✅ No expired subscriptions found")
-                return {
-                    'success': True,
-                    'data': {
-                        'expired_count': 0,
-                        'message': 'No expired subscriptions found'
-                    }
-                }
-            
-            # Mark each expired subscription as expired
-            expired_count = 0
-            for subscription in expired_subscriptions.data:
-                result = self.mark_subscription_expired(subscription['user_id'])
-                if result['success']:
-                    expired_count += 1
-                    print(f"✅ Marked subscription as expired for user: {subscription['user_id']}")
-                else:
-                    print(f"❌ Failed to mark subscription as expired for user: {subscription['user_id']}")
-            
-            print(f"✅ Processed {expired_count} expired subscriptions")
-            return {
-                'success': True,
-                'data': {
-                    'expired_count': expired_count,
-                    'message': f'Processed {expired_count} expired subscriptions'
-                }
-            }
-            
+            return self._sweep_expired(
+                'subscriptions', 'expire_subscriptions_batch', 'user_subscriptions', 'current_period_end',
+                {'status': 'active'}, self._expire_subscription_rows, dry_run=dry_run, chunk_size=chunk_size
+            )
         except Exception as e:
             print(f"❌ Error checking expired subscriptions: {str(e)}")
             return {
@@ -456,15 +501,9 @@ class LifecycleSubscriptionService:
                     'error': 'Paystack secret key not configured'
                 }
             
-            # Verify payment with Paystack
-            headers = {
-                'Authorization': f'Bearer {self.paystack_secret_key}',
-                'Content-Type': 'application/json'
-            }
-            
-            response = requests.get(
-                f'https://api.paystack.co/transaction/verify/{reference}',
-                headers=headers
+            # Verify payment with Paystack (shared pooled client with timeouts)
+            response = get_paystack_client(self.paystack_secret_key).request(
+                'GET', f'/transaction/verify/{reference}'
             )
             
             if response.status_code == 200:
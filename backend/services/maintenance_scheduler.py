@@ -0,0 +1,177 @@
+"""
+In-process scheduler for periodic maintenance jobs
+
+Every gunicorn worker starts a scheduler thread, but only one of them on the
+host runs jobs: the leader is whichever process holds an exclusive lock on
+instance/maintenance_scheduler.lock. The lock is released by the OS when the
+leader exits, and another worker takes over on its next attempt.
+
+Last-run times are kept in a small JSON file next to the lock so a new leader
+(e.g. after a worker recycle) does not re-run every job immediately. Jobs must
+be safe to run more than once and on several hosts at the same time (each
+host elects its own leader).
+"""
+
+import json
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+from services.durable_queue import INSTANCE_DIR
+from utils.env import int_env
+
+try:
+    import fcntl
+except ImportError:  # Windows: no flock, every process runs jobs
+    fcntl = None
+
+# Set MAINTENANCE_SCHEDULER_ENABLED=false to run sweeps only through the HTTP endpoints
+SCHEDULER_ENABLED = os.environ.get('MAINTENANCE_SCHEDULER_ENABLED', 'true').strip().lower() in ('1', 'true', 'yes', 'on')
+
+
+class ScheduledJob:
+    """A named callable run every interval_seconds"""
+
+    def __init__(self, name: str, interval_seconds: int, func: Callable[[], object]):
+        self.name = name
+        self.interval_seconds = max(1, interval_seconds)
+        self.func = func
+        self.last_run = 0.0
+
+
+class MaintenanceScheduler:
+    """Single-leader periodic job runner; see the module docstring"""
+
+    def __init__(self, lock_path: Optional[str] = None):
+        self.lock_path = os.path.abspath(
+            lock_path or os.environ.get('MAINTENANCE_SCHEDULER_LOCK_PATH') or os.path.join(INSTANCE_DIR, 'maintenance_scheduler.lock')
+        )
+        self.state_path = f"{os.path.splitext(self.lock_path)[0]}.json"
+        # How often a follower retries the leader lock, and the leader checks for due jobs
+        self.tick_seconds = max(1, int_env('MAINTENANCE_SCHEDULER_TICK_SECONDS', 30))
+
+        self._jobs: Dict[str, ScheduledJob] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._thread_pid: Optional[int] = None
+        self._lock_file = None
+        self._stop = threading.Event()
+
+    def register_job(self, name: str, interval_seconds: int, func: Callable[[], object]) -> None:
+        """Add (or replace) a job; takes effect on the next tick."""
+        with self._lock:
+            self._jobs[name] = ScheduledJob(name, interval_seconds, func)
+
+    def jobs(self) -> List[str]:
+        return list(self._jobs)
+
+    @property
+    def is_leader(self) -> bool:
+        return self._lock_file is not None and self._thread_pid == os.getpid()
+
+    def _try_become_leader(self) -> bool:
+        if self._lock_file is not None:
+            return True
+        os.makedirs(os.path.dirname(self.lock_path), exist_ok=True)
+        lock_file = open(self.lock_path, 'a+')
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                return False
+        self._lock_file = lock_file
+        self._load_state()
+        print(f"[Scheduler] Process {os.getpid()} is the maintenance leader ({', '.join(self._jobs) or 'no jobs'})")
+        return True
+
+    def _load_state(self) -> None:
+        try:
+            with open(self.state_path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return
+        for name, job in self._jobs.items():
+            job.last_run = max(job.last_run, float(state.get(name, 0)))
+
+    def _save_state(self) -> None:
+        state = {name: job.last_run for name, job in self._jobs.items()}
+        tmp_path = f"{self.state_path}.tmp"
+        try:
+            with open(tmp_path, 'w') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            print(f"[Scheduler] ⚠️ Could not save job state: {e}")
+
+    def run_due_jobs(self) -> None:
+        """Run every job whose interval has elapsed (leader only)."""
+        with self._lock:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            if self._stop.is_set():
+                return
+            if time.time() - job.last_run < job.interval_seconds:
+                continue
+            started = time.monotonic()
+            try:
+                result = job.func()
+                if isinstance(result, dict) and not result.get('success', True):
+                    print(f"[Scheduler] ❌ {job.name} failed: {result.get('error')}")
+                else:
+                    print(f"[Scheduler] ✅ {job.name} finished in {int((time.monotonic() - started) * 1000)}ms")
+            except Exception as e:
+                print(f"[Scheduler] ❌ {job.name} raised: {e}")
+            # A failed run waits for the next interval too, so a broken job cannot spin
+            job.last_run = time.time()
+            self._save_state()
+
+    def _loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                if self._try_become_leader():
+                    self.run_due_jobs()
+            except Exception as e:
+                print(f"[Scheduler] ❌ Scheduler tick failed: {e}")
+            self._stop.wait(self.tick_seconds)
+
+    def start(self) -> None:
+        """Start this process's scheduler thread (idempotent, fork-aware)."""
+        if not SCHEDULER_ENABLED:
+            return
+        pid = os.getpid()
+        if self._thread_pid == pid and self._thread is not None:
+            return
+        with self._lock:
+            if self._thread_pid == pid and self._thread is not None:
+                return
+            # A lock inherited across fork belongs to the parent; never reuse it
+            self._lock_file = None
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name='maintenance-scheduler', daemon=True)
+            self._thread.start()
+            self._thread_pid = pid
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+# Create a singleton instance
+maintenance_scheduler = MaintenanceScheduler()
+
+
+def register_lifecycle_jobs(get_lifecycle_service: Callable[[], object]) -> None:
+    """Schedule the trial and subscription expiry sweeps and start the scheduler."""
+    interval = int_env('EXPIRY_SWEEP_INTERVAL_SECONDS', 300)
+
+    def sweep(method_name: str):
+        def run():
+            service = get_lifecycle_service()
+            if service is None:
+                return {'success': False, 'error': 'Lifecycle service not available'}
+            return getattr(service, method_name)()
+        return run
+
+    maintenance_scheduler.register_job('expire_trials', interval, sweep('check_and_update_expired_trials'))
+    maintenance_scheduler.register_job('expire_subscriptions', interval, sweep('check_and_update_expired_subscriptions'))
+    maintenance_scheduler.start()
@@ -0,0 +1,374 @@
+"""
+Canonical storage format for meal_plan_management rows
+
+Historically a row's meal_plan column held any of:
+    - a JSON string of one of the shapes below
+    - {"plan_data": {...}} or {"plan_data": [...]} (legacy envelope)
+    - {"mealPlan": [...], "name": ..., "startDate": ..., "endDate": ...}
+    - a bare list of day objects
+
+Format version 1 (MEAL_PLAN_FORMAT_VERSION) stores meal_plan as a bare list
+of day objects, with name / start_date / end_date in their own columns.
+Readers can use such rows as-is. format_version is set by a database trigger
+from the stored shape (migration 012): 1 for a day list, NULL otherwise. The
+background migration sets LEGACY_FORMAT_VERSION (0) on rows with no
+recognisable day list, or whose document holds keys the canonical columns
+cannot carry (so converting would drop them); NULL and 0 rows go through
+normalize_legacy_plan.
+
+migrate_meal_plan_batch converts existing rows a batch at a time; it runs as
+a maintenance_scheduler job until no unmigrated rows remain.
+
+Canonical rows also carry content_hash (migration 013, unique per user): a
+SHA-256 of the day list together with the plan's name, dates and sickness
+fields, so only plans identical in everything the user sees share a hash.
+Re-saving such a plan just bumps the existing row's updated_at instead of
+inserting a copy, and compact_meal_plan_batch hashes older rows and deletes
+exact copies. Empty plans are never hashed.
+"""
+
+import hashlib
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+from utils.env import int_env
+from services.fanout import fan_out
+
+MEAL_PLAN_FORMAT_VERSION = 1
+LEGACY_FORMAT_VERSION = 0
+
+
+def _decode(meal_plan: Any) -> Any:
+    if isinstance(meal_plan, str):
+        try:
+            return json.loads(meal_plan)
+        except Exception:
+            return {}
+    return meal_plan
+
+
+def split_plan_body(meal_plan: Any) -> Tuple[Optional[List[Any]], Dict[str, Any], Any]:
+    """
+    Take a stored meal_plan value of any historical shape apart.
+
+    Returns:
+        (days, meta, body): the day list (None if there is none), the
+        name/startDate/endDate found inside the document, and the decoded body
+        with any plan_data envelope removed (what older readers returned)
+    """
+    body = _decode(meal_plan)
+    if isinstance(body, dict) and body and 'plan_data' in body:
+        body = body['plan_data']
+    if isinstance(body, list):
+        return body, {}, body
+    if isinstance(body, dict):
+        meta = {key: body.get(key) for key in ('name', 'startDate', 'endDate') if body.get(key)}
+        days = body.get('mealPlan')
+        return (days if isinstance(days, list) else None), meta, body
+    return None, {}, body
+
+
+# Everything a legacy document may hold that the canonical columns carry
+_ENVELOPE_KEYS = frozenset(('mealPlan', 'name', 'startDate', 'endDate'))
+
+
+def _only_known_keys(meal_plan: Any) -> bool:
+    """True if converting the stored document to a day list + columns loses nothing."""
+    body = _decode(meal_plan)
+    if isinstance(body, dict) and body and 'plan_data' in body:
+        if len(body) > 1:
+            return False
+        body = body['plan_data']
+    return not isinstance(body, dict) or set(body) <= _ENVELOPE_KEYS
+
+
+def is_canonical(row: Dict[str, Any]) -> bool:
+    return row.get('format_version') == MEAL_PLAN_FORMAT_VERSION
+
+
+def canonical_columns(row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Column values that store `row` in the canonical format.
+
+    Top-level name/start_date/end_date win over values inside the document.
+    Rows without a day list, or whose document has other keys, are marked
+    LEGACY_FORMAT_VERSION and left unchanged; for the rest the trigger sets
+    format_version when meal_plan is written.
+    """
+    days, meta, _ = split_plan_body(row.get('meal_plan'))
+    if days is None or not _only_known_keys(row.get('meal_plan')):
+        return {'format_version': LEGACY_FORMAT_VERSION}
+    return {
+        'meal_plan': days,
+        'name': row.get('name') or meta.get('name'),
+        'start_date': row.get('start_date') or meta.get('startDate'),
+        'end_date': row.get('end_date') or meta.get('endDate')
+    }
+
+
+# Columns that, with the day list, make up a plan's identity for deduplication
+DEDUP_COLUMNS = ('name', 'start_date', 'end_date', 'has_sickness', 'sickness_type')
+
+_ISO_DATE = re.compile(r'^\d{4}-\d{2}-\d{2}')
+
+
+def _dedup_value(column: str, value: Any) -> Any:
+    if column == 'has_sickness':
+        return bool(value)
+    if value is None:
+        return ''
+    value = str(value)
+    if column in ('start_date', 'end_date') and _ISO_DATE.match(value):
+        # '2025-01-06' and '2025-01-06T00:00:00Z' are the same plan date
+        return value[:10]
+    return value
+
+
+def meal_plan_content_hash(days: List[Any], metadata: Dict[str, Any]) -> Optional[str]:
+    """
+    Stable hash of a canonical day list plus the plan's DEDUP_COLUMNS.
+
+    Key order and whitespace don't matter. Returns None for an empty plan,
+    which is never treated as a duplicate of another.
+    """
+    if not days:
+        return None
+    identity = {
+        'days': days,
+        'meta': {column: _dedup_value(column, metadata.get(column)) for column in DEDUP_COLUMNS}
+    }
+    canonical = json.dumps(identity, sort_keys=True, separators=(',', ':'), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def is_unique_violation(error: Exception) -> bool:
+    message = str(error)
+    return '23505' in message or 'duplicate key' in message
+
+
+def _fill_plan_fields(plan: Dict[str, Any], meta: Dict[str, Any]) -> None:
+    plan['name'] = plan.get('name') or meta.get('name')
+    plan['start_date'] = plan.get('start_date') or meta.get('startDate')
+    plan['end_date'] = plan.get('end_date') or meta.get('endDate')
+
+
+def fill_plan_fields(plan: Dict[str, Any], meal_plan: Any) -> Dict[str, Any]:
+    """Fill missing name/start_date/end_date of a plan row from its stored document (in place)."""
+    _, meta, _ = split_plan_body(meal_plan)
+    _fill_plan_fields(plan, meta)
+    return plan
+
+
+def normalize_legacy_plan(plan: Dict[str, Any]) -> Dict[str, Any]:
+    """Fill name/dates from the document and unwrap meal_plan for a non-canonical row (in place)."""
+    _, meta, body = split_plan_body(plan.get('meal_plan'))
+    if body and isinstance(body, dict):
+        _fill_plan_fields(plan, meta)
+        plan['meal_plan'] = body
+    else:
+        plan['meal_plan'] = body or []
+    return plan
+
+
+# Keyset position of the background migration in this process; rows that fail
+# are skipped until the next pass instead of blocking the ones after them
+_migration_after_id: Optional[str] = None
+
+
+def _match_updated_at(query, updated_at):
+    """Filter on a row's updated_at as read; PostgREST needs is.null for NULL."""
+    if updated_at is None:
+        return query.is_('updated_at', 'null')
+    return query.eq('updated_at', updated_at)
+
+
+def migrate_meal_plan_batch(supabase, batch_size: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Convert one batch of unmigrated rows to the canonical format.
+
+    Each update is conditional on the row's updated_at, so a plan saved while
+    the batch runs is never overwritten with stale content (it is picked up
+    again on the next pass). updated_at itself is not changed, so list
+    ordering is unaffected.
+    """
+    global _migration_after_id
+    batch_size = batch_size or max(1, int_env('MEAL_PLAN_MIGRATION_BATCH_SIZE', 200))
+    try:
+        query = supabase.table('meal_plan_management').select(
+            'id, name, start_date, end_date, meal_plan, updated_at'
+        ).is_('format_version', 'null')
+        if _migration_after_id is not None:
+            query = query.gt('id', _migration_after_id)
+        rows = query.order('id').limit(batch_size).execute().data or []
+    except Exception as e:
+        return {'success': False, 'error': str(e)}
+    # A short batch ends this pass; the next one starts over from the first id
+    _migration_after_id = str(rows[-1]['id']) if len(rows) == batch_size else None
+    if not rows:
+        return {'success': True, 'data': {'migrated': 0, 'failed': 0, 'remaining': False}}
+
+    def convert(row):
+        def run():
+            query = supabase.table('meal_plan_management').update(canonical_columns(row)).eq('id', row['id'])
+            query = query.is_('format_version', 'null')
+            return _match_updated_at(query, row.get('updated_at')).execute()
+        return run
+
+    results = fan_out({str(row['id']): convert(row) for row in rows}, return_exceptions=True)
+    failed = {plan_id: str(result) for plan_id, result in results.items() if isinstance(result, Exception)}
+    for plan_id, error in failed.items():
+        print(f"[MealPlanFormat] ❌ Could not migrate plan {plan_id}: {error}")
+    migrated = len(rows) - len(failed)
+    print(f"[MealPlanFormat] Migrated {migrated}/{len(rows)} meal plans to format v{MEAL_PLAN_FORMAT_VERSION}")
+    return {'success': True, 'data': {'migrated': migrated, 'failed': len(failed), 'remaining': _migration_after_id is not None}}
+
+
+def run_meal_plan_migration(supabase) -> Dict[str, Any]:
+    """Scheduler job: migrate batches until caught up or MEAL_PLAN_MIGRATION_MAX_BATCHES is reached."""
+    max_batches = max(1, int_env('MEAL_PLAN_MIGRATION_MAX_BATCHES', 10))
+    totals = {'migrated': 0, 'failed': 0, 'batches': 0}
+    for _ in range(max_batches):
+        result = migrate_meal_plan_batch(supabase)
+        if not result.get('success'):
+            return result
+        totals['batches'] += 1
+        totals['migrated'] += result['data']['migrated']
+        totals['failed'] += result['data']['failed']
+        if not result['data']['remaining']:
+            break
+    return {'success': True, 'data': totals}
+
+
+_compaction_after_id: Optional[str] = None
+
+
+def _collapse_duplicates(supabase, user_id: str, content_hash: str, rows: List[Dict[str, Any]]) -> Dict[str, int]:
+    """
+    Keep one row per (user, content_hash) and delete the rest of `rows`.
+
+    Rows sharing a hash are identical in days, name, dates and sickness
+    fields, so nothing the user sees is lost. The survivor is the user's
+    already-hashed row if there is one, otherwise the most recently updated
+    row in `rows`; it takes the group's latest updated_at.
+    """
+    table = supabase.table
+    rows = sorted(rows, key=lambda row: row.get('updated_at') or '', reverse=True)
+
+    def find_survivor():
+        found = table('meal_plan_management').select('id, updated_at').eq(
+            'user_id', user_id).eq('content_hash', content_hash).limit(1).execute().data
+        return found[0] if found else None
+
+    hashed = 0
+    survivor = find_survivor()
+    if survivor is None:
+        head = rows[0]
+        try:
+            claimed = _match_updated_at(
+                table('meal_plan_management').update({'content_hash': content_hash}).eq('id', head['id']).is_(
+                    'content_hash', 'null'),
+                head.get('updated_at')
+            ).execute().data
+        except Exception as e:
+            if not is_unique_violation(e):
+                raise
+            claimed = None
+            survivor = find_survivor()
+        if claimed:
+            survivor, rows, hashed = head, rows[1:], 1
+        elif survivor is None:
+            # The row changed under us; the next pass sees its new content
+            return {'hashed': 0, 'removed': 0}
+
+    duplicates = [row for row in rows if row['id'] != survivor['id']]
+    if duplicates and (duplicates[0].get('updated_at') or '') > (survivor.get('updated_at') or ''):
+        newest = duplicates[0]
+        table('meal_plan_management').update({'updated_at': newest['updated_at']}).eq('id', survivor['id']).execute()
+
+    removed = 0
+    for duplicate in duplicates:
+        # Only delete a copy that hasn't been edited since we read it (an edit clears
+        # content_hash or moves updated_at)
+        deleted = _match_updated_at(
+            table('meal_plan_management').delete().eq('id', duplicate['id']).is_('content_hash', 'null'),
+            duplicate.get('updated_at')
+        ).execute().data
+        removed += len(deleted or [])
+    return {'hashed': hashed, 'removed': removed}
+
+
+def compact_meal_plan_batch(supabase, batch_size: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Hash one batch of canonical rows that have no content_hash yet, deleting
+    exact copies of plans the same user already has.
+    """
+    global _compaction_after_id
+    batch_size = batch_size or max(1, int_env('MEAL_PLAN_MIGRATION_BATCH_SIZE', 200))
+    try:
+        query = supabase.table('meal_plan_management').select(
+            ', '.join(('id', 'user_id', 'meal_plan', 'updated_at') + DEDUP_COLUMNS)
+        ).is_('content_hash', 'null').eq('format_version', MEAL_PLAN_FORMAT_VERSION)
+        if _compaction_after_id is not None:
+            query = query.gt('id', _compaction_after_id)
+        rows = query.order('id').limit(batch_size).execute().data or []
+    except Exception as e:
+        return {'success': False, 'error': str(e)}
+    _compaction_after_id = str(rows[-1]['id']) if len(rows) == batch_size else None
+    if not rows:
+        return {'success': True, 'data': {'hashed': 0, 'removed': 0, 'failed': 0, 'remaining': False}}
+
+    groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+    for row in rows:
+        days = row.pop('meal_plan', None)
+        content_hash = meal_plan_content_hash(days, row) if isinstance(days, list) else None
+        if content_hash:
+            groups.setdefault((row['user_id'], content_hash), []).append(row)
+
+    # Groups are independent (distinct user/hash pairs), so they can run concurrently
+    results = fan_out({
+        f"{user_id}:{content_hash}": (lambda u=user_id, h=content_hash, g=group: _collapse_duplicates(supabase, u, h, g))
+        for (user_id, content_hash), group in groups.items()
+    }, return_exceptions=True)
+    failed = {key: str(result) for key, result in results.items() if isinstance(result, Exception)}
+    for key, error in failed.items():
+        print(f"[MealPlanFormat] ❌ Could not compact plans {key}: {error}")
+    done = [result for result in results.values() if not isinstance(result, Exception)]
+    totals = {
+        'hashed': sum(result['hashed'] for result in done),
+        'removed': sum(result['removed'] for result in done),
+        'failed': len(failed)
+    }
+    print(f"[MealPlanFormat] Compaction: hashed {totals['hashed']} plans, removed {totals['removed']} duplicates")
+    return {'success': True, 'data': {**totals, 'remaining': _compaction_after_id is not None}}
+
+
+def run_meal_plan_compaction(supabase) -> Dict[str, Any]:
+    """Scheduler job: compact batches until caught up or MEAL_PLAN_MIGRATION_MAX_BATCHES is reached."""
+    max_batches = max(1, int_env('MEAL_PLAN_MIGRATION_MAX_BATCHES', 10))
+    totals = {'hashed': 0, 'removed': 0, 'failed': 0, 'batches': 0}
+    for _ in range(max_batches):
+        result = compact_meal_plan_batch(supabase)
+        if not result.get('success'):
+            return result
+        totals['batches'] += 1
+        for key in ('hashed', 'removed', 'failed'):
+            totals[key] += result['data'][key]
+        if not result['data']['remaining']:
+            break
+    return {'success': True, 'data': totals}
+
+
+def register_meal_plan_jobs(get_supabase_client) -> None:
+    """Schedule the background format migration and duplicate compaction."""
+    from services.maintenance_scheduler import maintenance_scheduler
+    interval = int_env('MEAL_PLAN_MIGRATION_INTERVAL_SECONDS', 120)
+    maintenance_scheduler.register_job(
+        'migrate_meal_plan_format', interval,
+        lambda: run_meal_plan_migration(get_supabase_client())
+    )
+    # Registered after the migration so rows it converts are compacted in the same tick
+    maintenance_scheduler.register_job(
+        'compact_meal_plans', interval,
+        lambda: run_meal_plan_compaction(get_supabase_client())
+    )
+    maintenance_scheduler.start()
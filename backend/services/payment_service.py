@@ -2,8 +2,13 @@ import os
 import requests
 import json
 from typing import Dict, Optional, Tuple, Any
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 from supabase import Client
+from services.subscription_service import invalidates_subscription_status, subscription_status_cache
+from services.paystack_client import PAYSTACK_BASE_URL, get_paystack_client
+from services.webhook_inbox import (
+    mark_webhook_processed, record_webhook_event, webhook_already_handled, webhook_event_key
+)
 import hashlib
 import hmac
 
@@ -16,27 +21,16 @@ class PaymentService:
         self.supabase = supabase_client
         self.paystack_secret_key = os.environ.get('PAYSTACK_SECRET_KEY')
         self.paystack_public_key = os.environ.get('PAYSTACK_PUBLIC_KEY')
-        self.paystack_base_url = 'https://api.paystack.co'
+        self.paystack_base_url = PAYSTACK_BASE_URL
         
         if not self.paystack_secret_key:
             raise ValueError("PAYSTACK_SECRET_KEY environment variable is required")
+        self.paystack = get_paystack_client(self.paystack_secret_key)
     
     def _make_paystack_request(self, endpoint: str, method: str = 'GET', data: Dict = None) -> Dict:
-        """Make a request to Paystack API."""
-        url = f"{self.paystack_base_url}{endpoint}"
-        headers = {
-            'Authorization': f'Bearer {self.paystack_secret_key}',
-            'Content-Type': 'application/json'
-        }
-        
+        """Make a request to Paystack API (pooled session with timeouts, retries and a circuit breaker)."""
         try:
-            if method.upper() == 'GET':
-                response = requests.get(url, headers=headers)
-            elif method.upper() == 'POST':
-                response = requests.post(url, headers=headers, json=data)
-            else:
-                raise ValueError(f"Unsupported HTTP method: {method}")
-            
+            response = self.paystack.request(method, endpoint, json=data)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.RequestException as e:
@@ -131,6 +125,7 @@ class PaymentService:
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
+    @invalidates_subscription_status
     def create_user_subscription(self, user_id: str, plan_id: str, 
                                paystack_data: Dict = None) -> Dict:
         """Create a user subscription."""
@@ -168,6 +163,7 @@ class PaymentService:
         except Exception as e:
             return {'success': False, 'error': str(e)}
     
+    @invalidates_subscription_status
     def save_payment_transaction(self, user_id: str, transaction_data: Dict) -> Dict:
         """Save a payment transaction."""
         try:
@@ -204,31 +200,31 @@ class PaymentService:
             
             return False
 
-    def process_webhook(self, event_data: Dict) -> Dict:
-        """Process Paystack webhook events."""
+    def process_webhook(self, event_data: Dict, event_key: Optional[str] = None) -> Dict:
+        """Process Paystack webhook events (idempotent on event_key)."""
         try:
-            # Save webhook event
-            webhook_data = {
-                'event_type': event_data.get('event'),
-                'paystack_event_id': event_data.get('id'),
-                'paystack_reference': event_data.get('data', {}).get('reference'),
-                'event_data': event_data
-            }
-            
-            self.supabase.table('paystack_webhooks').insert(webhook_data).execute()
+            # Save webhook event once; redeliveries and inbox retries reuse the row
+            event_key = event_key or webhook_event_key('payment', event_data)
+            webhook_row, _ = record_webhook_event(self.supabase, 'payment', event_key, event_data)
+            if webhook_already_handled(webhook_row):
+                return {'success': True, 'message': 'Webhook already processed', 'duplicate': True}
             
             # Process based on event type
             event_type = event_data.get('event')
             data = event_data.get('data', {})
             
             if event_type == 'charge.success':
-                return self._handle_successful_charge(data)
+                result = self._handle_successful_charge(data)
             elif event_type == 'subscription.create':
-                return self._handle_subscription_created(data)
+                result = self._handle_subscription_created(data)
             elif event_type == 'subscription.disable':
-                return self._handle_subscription_disabled(data)
+                result = self._handle_subscription_disabled(data)
             else:
-                return {'success': True, 'message': f'Event {event_type} processed'}
+                result = {'success': True, 'message': f'Event {event_type} processed'}
+            
+            if result.get('success'):
+                mark_webhook_processed(self.supabase, webhook_row['id'])
+            return result
                 
         except Exception as e:
             return {'success': False, 'error': str(e)}
@@ -239,10 +235,11 @@ class PaymentService:
             # Update transaction status
             reference = data.get('reference')
             if reference:
-                self.supabase.table('payment_transactions').update({
+                result = self.supabase.table('payment_transactions').update({
                     'status': 'success',
                     'updated_at': datetime.now(timezone.utc).isoformat()
                 }).eq('paystack_reference', reference).execute()
+                subscription_status_cache.invalidate_many(row.get('user_id') for row in result.data or [])
             
             return {'success': True, 'message': 'Charge processed successfully'}
         except Exception as e:
@@ -254,10 +251,11 @@ class PaymentService:
             # Update subscription status
             subscription_id = data.get('id')
             if subscription_id:
-                self.supabase.table('user_subscriptions').update({
+                result = self.supabase.table('user_subscriptions').update({
                     'status': 'active',
                     'updated_at': datetime.now(timezone.utc).isoformat()
                 }).eq('paystack_subscription_id', subscription_id).execute()
+                subscription_status_cache.invalidate_many(row.get('user_id') for row in result.data or [])
             
             return {'success': True, 'message': 'Subscription activated'}
         except Exception as e:
@@ -269,10 +267,11 @@ class PaymentService:
             # Update subscription status
             subscription_id = data.get('id')
             if subscription_id:
-                self.supabase.table('user_subscriptions').update({
+                result = self.supabase.table('user_subscriptions').update({
                     'status': 'cancelled',
                     'updated_at': datetime.now(timezone.utc).isoformat()
                 }).eq('paystack_subscription_id', subscription_id).execute()
+                subscription_status_cache.invalidate_many(row.get('user_id') for row in result.data or [])
             
             return {'success': True, 'message': 'Subscription cancelled'}
         except Exception as e:
@@ -0,0 +1,173 @@
+"""
+Shared Paystack HTTP client.
+
+All Paystack calls go through one pooled requests.Session per process, so
+they reuse keep-alive connections instead of opening a new TLS connection per
+call. Every request has connect/read timeouts, idempotent reads are retried a
+bounded number of times, and a circuit breaker stops calling Paystack for a
+short while after repeated failures so a Paystack outage fails requests fast
+instead of pinning worker threads.
+"""
+
+import hashlib
+import hmac
+import os
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+PAYSTACK_BASE_URL = 'https://api.paystack.co'
+
+
+def _float_env(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, str(default)))
+    except ValueError:
+        return default
+
+
+class PaystackUnavailableError(requests.exceptions.RequestException):
+    """Raised without calling Paystack while the circuit breaker is open."""
+
+
+class PaystackClient:
+    """Pooled, time-bounded Paystack API client with a circuit breaker"""
+
+    def __init__(self, secret_key: str, base_url: str = PAYSTACK_BASE_URL):
+        self.secret_key = secret_key
+        self.base_url = base_url.rstrip('/')
+        self.timeout: Tuple[float, float] = (
+            _float_env('PAYSTACK_CONNECT_TIMEOUT', 3.05),
+            _float_env('PAYSTACK_READ_TIMEOUT', 10)
+        )
+        self.max_retries = max(0, int(_float_env('PAYSTACK_MAX_RETRIES', 2)))
+        self.pool_size = max(1, int(_float_env('PAYSTACK_POOL_SIZE', 10)))
+        # Consecutive failures before the circuit opens, and how long it stays open
+        self.failure_threshold = max(1, int(_float_env('PAYSTACK_CIRCUIT_THRESHOLD', 5)))
+        self.open_seconds = _float_env('PAYSTACK_CIRCUIT_OPEN_SECONDS', 30)
+
+        self._lock = threading.Lock()
+        self._session: Optional[requests.Session] = None
+        self._session_pid: Optional[int] = None
+        self._consecutive_failures = 0
+        self._open_until = 0.0
+
+    def _build_session(self) -> requests.Session:
+        retry = Retry(
+            total=self.max_retries,
+            connect=self.max_retries,
+            read=self.max_retries,
+            status=self.max_retries,
+            backoff_factor=0.3,
+            status_forcelist=(429, 502, 503, 504),
+            # Connection failures are retried for any method (nothing was sent);
+            # read/status retries only for GET so a charge is never submitted twice
+            allowed_methods=frozenset(['GET']),
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        session.headers.update({
+            'Authorization': f'Bearer {self.secret_key}',
+            'Content-Type': 'application/json'
+        })
+        return session
+
+    @property
+    def session(self) -> requests.Session:
+        """This process's session (rebuilt after a fork)."""
+        pid = os.getpid()
+        if self._session is None or self._session_pid != pid:
+            with self._lock:
+                if self._session is None or self._session_pid != pid:
+                    self._session = self._build_session()
+                    self._session_pid = pid
+        return self._session
+
+    def _before_call(self) -> None:
+        # After the open window, calls go through again; the failure count is
+        # kept until a success, so one more failure reopens the circuit at once
+        if self._open_until > time.monotonic():
+            raise PaystackUnavailableError('Paystack is temporarily unavailable (circuit open), please retry shortly')
+
+    def _record(self, success: bool) -> None:
+        with self._lock:
+            if success:
+                self._consecutive_failures = 0
+                self._open_until = 0.0
+                return
+            self._consecutive_failures += 1
+            if self._consecutive_failures >= self.failure_threshold:
+                self._open_until = time.monotonic() + self.open_seconds
+                print(f"[Paystack] ⚠️ {self._consecutive_failures} consecutive failures, "
+                      f"pausing Paystack calls for {self.open_seconds:.0f}s")
+
+    def request(self, method: str, endpoint: str, json: Optional[Dict[str, Any]] = None) -> requests.Response:
+        """
+        Call the Paystack API.
+
+        Args:
+            method: 'GET' or 'POST'
+            endpoint: Path such as '/transaction/verify/<reference>'
+            json: Request body for POST
+
+        Returns:
+            requests.Response: The response (non-2xx responses are returned, not raised)
+
+        Raises:
+            PaystackUnavailableError: If the circuit breaker is open
+            requests.exceptions.RequestException: On timeouts or connection errors
+        """
+        method = method.upper()
+        if method not in ('GET', 'POST'):
+            raise ValueError(f"Unsupported HTTP method: {method}")
+
+        self._before_call()
+        try:
+            response = self.session.request(method, f"{self.base_url}{endpoint}", json=json, timeout=self.timeout)
+        except requests.exceptions.RequestException:
+            self._record(False)
+            raise
+        # 4xx means Paystack answered (bad reference, validation); only 5xx counts against it
+        self._record(response.status_code < 500)
+        return response
+
+
+def verify_webhook_signature(raw_payload: bytes, signature: Optional[str], secret_key: Optional[str] = None) -> bool:
+    """Check a webhook body against its X-Paystack-Signature (HMAC-SHA512 of the raw body)."""
+    key = secret_key or os.environ.get('PAYSTACK_SECRET_KEY')
+    if not key or not signature:
+        return False
+    expected = hmac.new(key.encode('utf-8'), raw_payload, hashlib.sha512).hexdigest()
+    return hmac.compare_digest(expected, signature)
+
+
+_clients: Dict[str, PaystackClient] = {}
+_clients_lock = threading.Lock()
+
+
+def get_paystack_client(secret_key: Optional[str] = None) -> PaystackClient:
+    """
+    Get the shared client for a secret key (defaults to PAYSTACK_SECRET_KEY).
+
+    Raises:
+        ValueError: If no secret key is configured
+    """
+    key = secret_key or os.environ.get('PAYSTACK_SECRET_KEY')
+    if not key:
+        raise ValueError("PAYSTACK_SECRET_KEY environment variable is required")
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = PaystackClient(key)
+                _clients[key] = client
+    return client
@@ -0,0 +1,307 @@
+"""
+Pooled SMTP sessions for EmailService.
+
+Opening an SMTP session costs a TCP connect, a TLS handshake (SSL or
+STARTTLS) and an AUTH round trip. The pool keeps authenticated sessions open
+between messages, hands each one to a single sender at a time, and revalidates
+idle sessions with NOOP before reuse.
+
+SMTPPortHealth tracks which candidate ports work. Unknown ports are probed
+concurrently with a short TCP connect; the working port is cached for a TTL,
+known-bad ports are skipped, and when every port fails the host's circuit
+opens so senders fail in milliseconds instead of walking timeouts.
+
+Sessions are per process; a forked worker starts with an empty pool instead
+of sharing its parent's sockets.
+"""
+
+import os
+import smtplib
+import socket
+import ssl
+import threading
+import time
+from functools import partial
+from typing import Dict, Iterable, List, Optional, Tuple
+from services.fanout import fan_out
+from utils.env import int_env
+
+
+# (host, port, user, use_ssl, starttls) - a session is only reused for identical settings
+PoolKey = Tuple[str, int, str, bool, bool]
+
+
+class _PooledSession:
+    __slots__ = ('server', 'key', 'created_at', 'last_used', 'messages_sent')
+
+    def __init__(self, server: smtplib.SMTP, key: PoolKey):
+        now = time.monotonic()
+        self.server = server
+        self.key = key
+        self.created_at = now
+        self.last_used = now
+        self.messages_sent = 0
+
+
+class SMTPConnectionPool:
+    """Keeps authenticated SMTP sessions open and reuses them across messages"""
+
+    def __init__(self):
+        self.max_idle = max(0, int_env('SMTP_POOL_SIZE', 4))
+        # Servers drop idle sessions after a while; close ours before they do
+        self.idle_timeout = max(1, int_env('SMTP_POOL_IDLE_SECONDS', 60))
+        # Sessions idle for longer than this are checked with NOOP before reuse
+        self.noop_after = max(0, int_env('SMTP_POOL_NOOP_AFTER_SECONDS', 5))
+        # Some providers cap messages per session
+        self.max_messages = max(1, int_env('SMTP_POOL_MAX_MESSAGES', 100))
+
+        self._lock = threading.Lock()
+        self._idle: List[_PooledSession] = []
+        self._pid = os.getpid()
+
+    def _check_fork(self) -> None:
+        # Caller holds the lock. Never touch sockets inherited from the parent.
+        if self._pid != os.getpid():
+            self._idle = []
+            self._pid = os.getpid()
+
+    @staticmethod
+    def _close(server: smtplib.SMTP) -> None:
+        try:
+            server.quit()
+        except Exception:
+            try:
+                server.close()
+            except Exception:
+                pass
+
+    @staticmethod
+    def _is_alive(server: smtplib.SMTP) -> bool:
+        try:
+            code, _ = server.noop()
+            return code == 250
+        except Exception:
+            return False
+
+    def _open(
+        self,
+        key: PoolKey,
+        password: str,
+        timeout: float,
+        context: ssl.SSLContext
+    ) -> smtplib.SMTP:
+        host, port, user, use_ssl, starttls = key
+        if use_ssl:
+            server = smtplib.SMTP_SSL(host, port, timeout=timeout, context=context)
+        else:
+            server = smtplib.SMTP(host, port, timeout=timeout)
+        try:
+            if not use_ssl:
+                server.ehlo()
+                if starttls:
+                    if server.has_extn('starttls'):
+                        server.starttls(context=context)
+                        server.ehlo()
+                    else:
+                        print(f"[SMTPPool] STARTTLS not supported on port {port}, sending without TLS.")
+            server.login(user, password)
+        except Exception:
+            self._close(server)
+            raise
+        print(f"[SMTPPool] Opened SMTP session to {host}:{port} (pid {os.getpid()})")
+        return server
+
+    def acquire(
+        self,
+        key: PoolKey,
+        password: str,
+        timeout: float,
+        context: ssl.SSLContext
+    ) -> Tuple[_PooledSession, bool]:
+        """
+        Check out a session for exclusive use.
+
+        Returns:
+            (session, reused): reused is True if the session came from the pool
+        """
+        now = time.monotonic()
+        stale: List[_PooledSession] = []
+        candidate: Optional[_PooledSession] = None
+        with self._lock:
+            self._check_fork()
+            fresh = []
+            for session in self._idle:
+                if now - session.last_used > self.idle_timeout:
+                    stale.append(session)
+                elif candidate is None and session.key == key:
+                    candidate = session
+                else:
+                    fresh.append(session)
+            self._idle = fresh
+
+        for session in stale:
+            self._close(session.server)
+
+        if candidate is not None:
+            if now - candidate.last_used <= self.noop_after or self._is_alive(candidate.server):
+                return candidate, True
+            self._close(candidate.server)
+
+        return _PooledSession(self._open(key, password, timeout, context), key), False
+
+    def release(self, session: _PooledSession) -> None:
+        """Return a healthy session after a successful send."""
+        session.messages_sent += 1
+        session.last_used = time.monotonic()
+        if session.messages_sent >= self.max_messages:
+            self._close(session.server)
+            return
+        with self._lock:
+            self._check_fork()
+            if len(self._idle) < self.max_idle:
+                self._idle.append(session)
+                return
+        self._close(session.server)
+
+    def discard(self, session: _PooledSession) -> None:
+        """Close a session whose state is unknown (after an error)."""
+        self._close(session.server)
+
+    def send(
+        self,
+        key: PoolKey,
+        password: str,
+        timeout: float,
+        context: ssl.SSLContext,
+        msg
+    ) -> None:
+        """
+        Send a message on a pooled session.
+
+        A reused session the server has silently dropped is replaced by a new
+        one once; every other error propagates to the caller.
+        """
+        session, reused = self.acquire(key, password, timeout, context)
+        try:
+            session.server.send_message(msg)
+        except smtplib.SMTPServerDisconnected:
+            self.discard(session)
+            if not reused:
+                raise
+            session, _ = self.acquire(key, password, timeout, context)
+            try:
+                session.server.send_message(msg)
+            except Exception:
+                self.discard(session)
+                raise
+        except Exception:
+            self.discard(session)
+            raise
+        self.release(session)
+
+    def close_all(self) -> None:
+        """Close every idle session (e.g. at shutdown or after a credential change)."""
+        with self._lock:
+            self._check_fork()
+            idle, self._idle = self._idle, []
+        for session in idle:
+            self._close(session.server)
+
+
+class SMTPPortHealth:
+    """Per-host cache of working/failing SMTP ports with a circuit breaker"""
+
+    def __init__(self):
+        # How long a port that delivered (or answered a probe) is trusted
+        self.good_ttl = max(1, int_env('SMTP_PORT_GOOD_TTL', 3600))
+        # How long a port that failed to connect is skipped
+        self.bad_ttl = max(1, int_env('SMTP_PORT_BAD_TTL', 300))
+        # How long every send fails fast once all ports have failed
+        self.circuit_open_seconds = max(1, int_env('SMTP_CIRCUIT_OPEN_SECONDS', 60))
+        self.probe_timeout = max(1, int_env('SMTP_PROBE_TIMEOUT', 5))
+
+        self._lock = threading.Lock()
+        self._probe_locks: Dict[str, threading.Lock] = {}
+        # host -> port -> (healthy, expires_at)
+        self._ports: Dict[str, Dict[int, Tuple[bool, float]]] = {}
+        # host -> time the circuit closes again
+        self._circuit_open_until: Dict[str, float] = {}
+
+    def _state(self, host: str, port: int, now: float) -> Optional[bool]:
+        entry = self._ports.get(host, {}).get(port)
+        if entry and entry[1] > now:
+            return entry[0]
+        return None
+
+    def _set(self, host: str, port: int, healthy: bool) -> None:
+        ttl = self.good_ttl if healthy else self.bad_ttl
+        with self._lock:
+            self._ports.setdefault(host, {})[port] = (healthy, time.monotonic() + ttl)
+
+    def circuit_open(self, host: str) -> bool:
+        return self._circuit_open_until.get(host, 0) > time.monotonic()
+
+    def open_circuit(self, host: str) -> None:
+        with self._lock:
+            self._circuit_open_until[host] = time.monotonic() + self.circuit_open_seconds
+        print(f"[SMTPPool] ⚠️ All SMTP ports failed for {host}; failing fast for {self.circuit_open_seconds}s")
+
+    def record_success(self, host: str, port: int) -> None:
+        self._set(host, port, True)
+        with self._lock:
+            self._circuit_open_until.pop(host, None)
+
+    def record_failure(self, host: str, port: int) -> None:
+        self._set(host, port, False)
+
+    def _probe(self, host: str, port: int) -> bool:
+        try:
+            with socket.create_connection((host, port), timeout=self.probe_timeout):
+                return True
+        except OSError:
+            return False
+
+    def usable_ports(self, host: str, candidates: Iterable[int]) -> List[int]:
+        """
+        Order candidate ports for a send, probing unknown ports if needed.
+
+        Returns:
+            Known-good ports first, then untested ones, in candidate order;
+            known-bad ports are left out. Empty if the circuit is open or
+            every port is unreachable.
+        """
+        candidates = list(candidates)
+        if self.circuit_open(host):
+            return []
+
+        now = time.monotonic()
+        states = {port: self._state(host, port, now) for port in candidates}
+        if not any(states.values()):
+            # No trusted port yet: probe the unknown ones once, concurrently.
+            # Other senders wait for the probe instead of starting their own.
+            with self._lock:
+                probe_lock = self._probe_locks.setdefault(host, threading.Lock())
+            with probe_lock:
+                now = time.monotonic()
+                states = {port: self._state(host, port, now) for port in candidates}
+                unknown = [port for port, state in states.items() if state is None]
+                if unknown and not any(states.values()):
+                    results = fan_out(
+                        {str(port): partial(self._probe, host, port) for port in unknown},
+                        timeout=self.probe_timeout + 1,
+                        return_exceptions=True
+                    )
+                    for port in unknown:
+                        healthy = results.get(str(port)) is True
+                        self._set(host, port, healthy)
+                        states[port] = healthy
+
+        ports = [port for port in candidates if states[port]] + \
+                [port for port in candidates if states[port] is None]
+        if not ports:
+            self.open_circuit(host)
+        return ports
+
+
+# Shared by every EmailService instance in this process
+smtp_port_health = SMTPPortHealth()
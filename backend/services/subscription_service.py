@@ -1,19 +1,123 @@
 import os
+import copy
 import json
-import requests
-from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
-from supabase import create_client, Client
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from functools import wraps
+from typing import Dict, Iterable, List, Optional, Any
+from supabase import Client
+from services.supabase_clients import get_shared_client
+from services.fanout import fan_out
+from services.paystack_client import get_paystack_client
+from services.webhook_inbox import (
+    mark_webhook_processed, record_webhook_event, webhook_already_handled, webhook_event_key
+)
+
+
+class SubscriptionStatusCache:
+    """
+    Short-TTL, per-process cache of computed subscription status keyed by user_id.
+
+    Each entry is tagged with the user's row in subscription_status_versions
+    (migration 014), which database triggers bump on every change to the
+    user's subscriptions, trials, payments or organization time restrictions.
+    An entry is only served while the caller's freshly read version matches,
+    so a write made by any worker or host invalidates every worker's copy.
+    Entries also never outlive the TTL or the nearest subscription/trial end
+    date. invalidate() still drops the local copy immediately.
+    """
+
+    def __init__(self, ttl_seconds: int = 30, max_size: int = 10000):
+        self.ttl_seconds = max(0, ttl_seconds)
+        self.max_size = max(1, max_size)
+        self._entries: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str, version: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(user_id)
+            if not entry:
+                return None
+            expires_at, cached_version, value = entry
+            if expires_at <= time.time() or cached_version != version:
+                del self._entries[user_id]
+                return None
+        return copy.deepcopy(value)
+
+    def set(self, user_id: str, value: Dict[str, Any], version: int, valid_until: Optional[float] = None) -> None:
+        if not self.ttl_seconds:
+            return
+        now = time.time()
+        expires_at = now + self.ttl_seconds
+        if valid_until is not None:
+            expires_at = min(expires_at, valid_until)
+        if expires_at <= now:
+            return
+        with self._lock:
+            if len(self._entries) >= self.max_size and user_id not in self._entries:
+                # Drop expired entries first, then the oldest insertions
+                self._entries = {k: v for k, v in self._entries.items() if v[0] > now}
+                while len(self._entries) >= self.max_size:
+                    self._entries.pop(next(iter(self._entries)))
+            self._entries[user_id] = (expires_at, version, copy.deepcopy(value))
+
+    def invalidate(self, user_id: Optional[str]) -> None:
+        if not user_id:
+            return
+        with self._lock:
+            self._entries.pop(user_id, None)
+
+    def invalidate_many(self, user_ids: Iterable[str]) -> None:
+        with self._lock:
+            for user_id in user_ids:
+                self._entries.pop(user_id, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+try:
+    _status_cache_ttl = int(os.getenv('SUBSCRIPTION_STATUS_CACHE_TTL', '30'))
+except ValueError:
+    _status_cache_ttl = 30
+
+# After a failed version read, skip the cache (and the version lookup) for this long
+STATUS_VERSION_RETRY_SECONDS = 60
+
+# Process-wide instance shared by every SubscriptionService
+subscription_status_cache = SubscriptionStatusCache(ttl_seconds=_status_cache_ttl)
+
+
+def invalidates_subscription_status(method):
+    """Drop the cached status for the method's user_id argument once the method returns."""
+    @wraps(method)
+    def wrapper(self, user_id, *args, **kwargs):
+        try:
+            return method(self, user_id, *args, **kwargs)
+        finally:
+            subscription_status_cache.invalidate(user_id)
+    return wrapper
+
+
+def _parse_timestamp(value: Any) -> Optional[float]:
+    """Parse an ISO timestamp from Supabase into epoch seconds."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+    except (TypeError, ValueError):
+        return None
+
 
 class SubscriptionService:
-    def __init__(self):
-        # Initialize Supabase client
-        supabase_url = os.getenv('SUPABASE_URL')
-        supabase_key = os.getenv('SUPABASE_SERVICE_ROLE_KEY')
-        if not supabase_url or not supabase_key:
-            raise ValueError("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set")
-        
-        self.supabase: Client = create_client(supabase_url, supabase_key)
+    def __init__(self, supabase_client: Optional[Client] = None):
+        # Reuse the worker's shared Supabase client (one connection pool per process)
+        self.supabase: Client = supabase_client or get_shared_client()
         self.paystack_secret_key = os.getenv('PAYSTACK_SECRET_KEY')
         self.paystack_public_key = os.getenv('PAYSTACK_PUBLIC_KEY')
         # Time unit override for testing: set SUB_TIME_UNIT=minutes to make 1 day == 1 minute
@@ -36,9 +140,62 @@ class SubscriptionService:
         # default: days
         return start_date + timedelta(days=duration_days)
         
-    def get_user_subscription_status(self, user_id: str) -> Dict[str, Any]:
+    def get_user_subscription_status(self, user_id: str, use_cache: bool = True) -> Dict[str, Any]:
         """
         Get comprehensive subscription status for a user
+
+        Results are cached briefly per user and validated against the shared
+        status version on every read (see SubscriptionStatusCache); pass
+        use_cache=False to force a fresh read. If the version cannot be read
+        the status is computed fresh and not cached.
+        """
+        version = None
+        if use_cache and user_id and user_id != 'anon' and subscription_status_cache.ttl_seconds:
+            # Read the version before the status: a write landing in between
+            # bumps it again, so a stale result can never be stored as current
+            version = self._get_status_version(user_id)
+            if version is not None:
+                cached = subscription_status_cache.get(user_id, version)
+                if cached is not None:
+                    return cached
+
+        result = self._compute_user_subscription_status(user_id)
+
+        if version is not None and result.get('success'):
+            # Never serve a cached status past the moment it would flip
+            data = result.get('data') or {}
+            boundaries = []
+            if data.get('subscription'):
+                boundaries.append(_parse_timestamp(data['subscription'].get('end_date')))
+            if data.get('trial'):
+                boundaries.append(_parse_timestamp(data['trial'].get('end_date')))
+            now = time.time()
+            upcoming = [b for b in boundaries if b is not None and b > now]
+            subscription_status_cache.set(user_id, result, version, valid_until=min(upcoming) if upcoming else None)
+
+        return result
+
+    _status_version_unavailable_until = 0.0
+
+    def _get_status_version(self, user_id: str) -> Optional[int]:
+        """
+        Current subscription_status_versions.version for the user (0 if no row yet),
+        or None when the version table cannot be read.
+        """
+        if time.time() < SubscriptionService._status_version_unavailable_until:
+            return None
+        try:
+            result = self.supabase.table('subscription_status_versions').select('version').eq('user_id', user_id).limit(1).execute()
+            return int(result.data[0]['version']) if result.data else 0
+        except Exception as e:
+            # e.g. migration 014 not applied yet: run uncached rather than risk a stale status
+            SubscriptionService._status_version_unavailable_until = time.time() + STATUS_VERSION_RETRY_SECONDS
+            print(f"⚠️ Subscription status version unavailable, caching disabled for {STATUS_VERSION_RETRY_SECONDS}s: {e}")
+            return None
+
+    def _compute_user_subscription_status(self, user_id: str) -> Dict[str, Any]:
+        """
+        Compute subscription status for a user directly from the database
         """
         try:
             supabase_user_id = None
@@ -59,15 +216,24 @@ class SubscriptionService:
                     }
                 }
             
-            # Get ALL subscriptions for user (not just active ones) to check for expiry
-            subscription_result = self.supabase.table('user_subscriptions').select(
-                'id, plan_id, status, current_period_start, current_period_end, created_at, updated_at'
-            ).eq('user_id', supabase_user_id).execute()
+            # Independent lookups run concurrently: latency is max(query), not sum(query).
+            # Time restrictions are fetched speculatively and only used if the user has access.
+            results = fan_out({
+                # Get ALL subscriptions for user (not just active ones) to check for expiry
+                'subscriptions': lambda: self.supabase.table('user_subscriptions').select(
+                    'id, plan_id, status, current_period_start, current_period_end, created_at, updated_at'
+                ).eq('user_id', supabase_user_id).execute(),
+                # Check if user has ever made any payments (completed transactions)
+                'payments': lambda: self.supabase.table('payment_transactions').select('id').eq('user_id', supabase_user_id).eq('status', 'completed').execute(),
+                'trials': lambda: self.supabase.table('user_trials').select('*').eq('user_id', supabase_user_id).order('created_at', desc=True).limit(1).execute(),
+                'time_restrictions': lambda: self._check_time_restrictions(supabase_user_id),
+            })
+            subscription_result = results['subscriptions']
+            payment_result = results['payments']
+            trial_result = results['trials']
             
             subscription = None
             has_active_subscription = False
-            # Check if user has ever made any payments (completed transactions)
-            payment_result = self.supabase.table('payment_transactions').select('id').eq('user_id', supabase_user_id).eq('status', 'completed').execute()
             has_ever_paid = len(payment_result.data) > 0
             
             # Also check if user has ever had a subscription (fallback for users who paid before payment transactions were working)
@@ -83,16 +249,9 @@ class SubscriptionService:
                     if end_date_str:
                         end_date = datetime.fromisoformat(end_date_str.replace('Z', '+00:00'))
                         
-                        # If subscription is marked as active but expired, auto-expire it
+                        # Lapsed but still marked active: treat as expired here; the
+                        # scheduled expiry sweep (maintenance_scheduler) writes the status
                         if sub['status'] == 'active' and end_date <= now:
-                            try:
-                                self.supabase.table('user_subscriptions').update({
-                                    'status': 'expired',
-                                    'updated_at': now.isoformat()
-                                }).eq('id', sub['id']).execute()
-                            except Exception as e:
-                                pass  # Silent fail, not critical
-                            # Don't consider this subscription as active
                             continue
                         
                         # Only consider subscription active if it's marked as active AND not expired
@@ -110,9 +269,7 @@ class SubscriptionService:
                             has_active_subscription = True
                             break
             
-            # Get trial info
-            trial_result = self.supabase.table('user_trials').select('*').eq('user_id', supabase_user_id).order('created_at', desc=True).limit(1).execute()
-            
+            # Trial info (fetched above)
             trial = None
             trial_active = False
             if trial_result.data:
@@ -143,7 +300,7 @@ class SubscriptionService:
             # Check organization time restrictions if user is in an organization
             time_restriction_info = None
             if can_access_app:
-                time_restriction_info = self._check_time_restrictions(supabase_user_id)
+                time_restriction_info = results['time_restrictions']
                 if time_restriction_info and not time_restriction_info.get('can_access_now', True):
                     # User has access but is outside allowed time window
                     can_access_app = False
@@ -253,6 +410,7 @@ class SubscriptionService:
                 'error': str(e)
             }
     
+    @invalidates_subscription_status
     def create_user_trial(self, user_id: str, duration_days: int = 30) -> Dict[str, Any]:
         """
         Create a trial for a new user
@@ -286,6 +444,7 @@ class SubscriptionService:
                 'error': str(e)
             }
     
+    @invalidates_subscription_status
     def activate_subscription(self, user_id: str, plan_name: str, paystack_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Activate a subscription for a user and mark trial as used
@@ -374,6 +533,7 @@ class SubscriptionService:
                 'error': str(e)
             }
     
+    @invalidates_subscription_status
     def activate_subscription_for_days(self, user_id: str, duration_days: int, paystack_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Activate a subscription for a specific number of days and mark trial as used
@@ -517,6 +677,7 @@ class SubscriptionService:
                 'error': str(e)
             }
     
+    @invalidates_subscription_status
     def activate_subscription_for_minutes(self, user_id: str, duration_minutes: int, paystack_data: Dict[str, Any]) -> Dict[str, Any]:
         """
         Activate a subscription for a specific number of minutes and mark trial as used
@@ -619,11 +780,24 @@ class SubscriptionService:
                 'error': str(e)
             }
     
+    @invalidates_subscription_status
     def save_payment_transaction(self, user_id: str, paystack_data: Dict[str, Any], plan_id: str = None) -> Dict[str, Any]:
         """
         Save payment transaction details
         """
         try:
+            # One transaction per Paystack reference (webhook retries, verify + webhook)
+            reference = paystack_data.get('reference')
+            if reference:
+                existing = self.supabase.table('payment_transactions').select('id').eq('paystack_reference', reference).limit(1).execute()
+                if existing.data:
+                    return {
+                        'success': True,
+                        'transaction_id': existing.data[0]['id'],
+                        'message': 'Payment transaction already recorded',
+                        'duplicate': True
+                    }
+            
             # Get plan_id if not provided
             if not plan_id:
                 plan_name = paystack_data.get('plan', 'Custom Plan')
@@ -705,15 +879,9 @@ class SubscriptionService:
                     'error': 'Paystack secret key not configured'
                 }
             
-            # Verify payment with Paystack
-            headers = {
-                'Authorization': f'Bearer {self.paystack_secret_key}',
-                'Content-Type': 'application/json'
-            }
-            
-            response = requests.get(
-                f'https://api.paystack.co/transaction/verify/{reference}',
-                headers=headers
+            # Verify payment with Paystack (shared pooled client with timeouts)
+            response = get_paystack_client(self.paystack_secret_key).request(
+                'GET', f'/transaction/verify/{reference}'
             )
             
             if response.status_code == 200:
@@ -745,29 +913,25 @@ class SubscriptionService:
                 'error': str(e)
             }
     
-    def process_paystack_webhook(self, webhook_data: Dict[str, Any]) -> Dict[str, Any]:
+    def process_paystack_webhook(self, webhook_data: Dict[str, Any], event_key: Optional[str] = None) -> Dict[str, Any]:
         """
         Process Paystack webhook events
+
+        Idempotent on event_key: the paystack_webhooks row is created once
+        (or reused when the inbox already stored it) and events that are
+        already processed or dead-lettered are skipped.
         """
         try:
-            # Save webhook data
-            webhook_record = {
-                'event_type': webhook_data.get('event'),
-                'paystack_event_id': webhook_data.get('id'),
-                'paystack_reference': webhook_data.get('data', {}).get('reference'),
-                'event_data': webhook_data,
-                'processed': False
-            }
-            
-            result = self.supabase.table('paystack_webhooks').insert(webhook_record).execute()
-            
-            if not result.data:
+            event_key = event_key or webhook_event_key('subscription', webhook_data)
+            webhook_row, _ = record_webhook_event(self.supabase, 'subscription', event_key, webhook_data)
+            if webhook_already_handled(webhook_row):
                 return {
-                    'success': False,
-                    'error': 'Failed to save webhook data'
+                    'success': True,
+                    'message': 'Webhook already processed',
+                    'duplicate': True
                 }
             
-            webhook_id = result.data[0]['id']
+            webhook_id = webhook_row['id']
             
             # Process different event types
             event_type = webhook_data.get('event')
@@ -780,7 +944,7 @@ class SubscriptionService:
                 return self._process_subscription_disabled(webhook_data, webhook_id)
             else:
                 # Mark as processed for other event types
-                self.supabase.table('paystack_webhooks').update({'processed': True}).eq('id', webhook_id).execute()
+                mark_webhook_processed(self.supabase, webhook_id)
                 return {
                     'success': True,
                     'message': f'Webhook processed: {event_type}'
@@ -793,6 +957,21 @@ class SubscriptionService:
                 'error': str(e)
             }
     
+    def _dead_letter_webhook(self, webhook_id: str, error: str) -> Dict[str, Any]:
+        """Mark a webhook as permanently failed so neither the inbox nor a redelivery retries it."""
+        try:
+            self.supabase.table('paystack_webhooks').update({
+                'status': 'dead',
+                'last_error': error
+            }).eq('id', webhook_id).execute()
+        except Exception as e:
+            print(f"⚠️ Could not dead-letter webhook {webhook_id}: {e}")
+        return {
+            'success': False,
+            'error': error,
+            'retryable': False
+        }
+    
     def _process_successful_payment(self, webhook_data: Dict[str, Any], webhook_id: str) -> Dict[str, Any]:
         """
         Process successful payment webhook
@@ -813,7 +992,7 @@ class SubscriptionService:
                     transaction_result = self.save_payment_transaction(user_id, data)
                     
                     # Mark webhook as processed
-                    self.supabase.table('paystack_webhooks').update({'processed': True}).eq('id', webhook_id).execute()
+                    mark_webhook_processed(self.supabase, webhook_id)
                     
                     return {
                         'success': True,
@@ -821,10 +1000,8 @@ class SubscriptionService:
                         'transaction': transaction_result
                     }
             
-            return {
-                'success': False,
-                'error': 'User not found for email'
-            }
+            # A retry cannot create the user: dead-letter instead of retrying
+            return self._dead_letter_webhook(webhook_id, 'User not found for email')
             
         except Exception as e:
             print(f"Error processing successful payment: {str(e)}")
@@ -858,11 +1035,25 @@ class SubscriptionService:
                 if profile_result.data:
                     user_id = profile_result.data[0]['id']
                     
+                    # A retry after a partial failure must not activate a second time
+                    subscription_code = data.get('subscription_code')
+                    if subscription_code:
+                        existing = self.supabase.table('payment_transactions').select('id').eq(
+                            'user_id', user_id
+                        ).eq('metadata->>subscription_code', subscription_code).limit(1).execute()
+                        if existing.data:
+                            mark_webhook_processed(self.supabase, webhook_id)
+                            return {
+                                'success': True,
+                                'message': 'Subscription already activated',
+                                'duplicate': True
+                            }
+                    
                     # Activate subscription
                     subscription_result = self.activate_subscription(user_id, plan_name, data)
                     
                     # Mark webhook as processed
-                    self.supabase.table('paystack_webhooks').update({'processed': True}).eq('id', webhook_id).execute()
+                    mark_webhook_processed(self.supabase, webhook_id)
                     
                     return {
                         'success': True,
@@ -870,10 +1061,8 @@ class SubscriptionService:
                         'subscription': subscription_result
                     }
             
-            return {
-                'success': False,
-                'error': 'User not found for email'
-            }
+            # A retry cannot create the user: dead-letter instead of retrying
+            return self._dead_letter_webhook(webhook_id, 'User not found for email')
             
         except Exception as e:
             print(f"Error processing subscription created: {str(e)}")
@@ -901,19 +1090,18 @@ class SubscriptionService:
                         'status': 'cancelled',
                         'updated_at': datetime.now().isoformat()
                     }).eq('user_id', user_id).eq('status', 'active').execute()
+                    subscription_status_cache.invalidate(user_id)
                     
                     # Mark webhook as processed
-                    self.supabase.table('paystack_webhooks').update({'processed': True}).eq('id', webhook_id).execute()
+                    mark_webhook_processed(self.supabase, webhook_id)
                     
                     return {
                         'success': True,
                         'message': 'Subscription disabled successfully'
                     }
             
-            return {
-                'success': False,
-                'error': 'User not found for email'
-            }
+            # A retry cannot create the user: dead-letter instead of retrying
+            return self._dead_letter_webhook(webhook_id, 'User not found for email')
             
         except Exception as e:
             print(f"Error processing subscription disabled: {str(e)}")
@@ -0,0 +1,101 @@
+"""
+Process-wide registry of Supabase clients.
+
+Each gunicorn worker keeps one long-lived admin (service role) client and one
+anon client, so requests reuse the same HTTP connection pools instead of
+building a fresh client (and TLS handshake) per call.
+
+Clients are keyed by process id as well as credentials, so a forked worker
+never inherits a parent's sockets.
+"""
+
+import os
+import threading
+from typing import Dict, Optional, Tuple
+from supabase import create_client, Client
+
+_clients: Dict[Tuple[int, str, str], Client] = {}
+_lock = threading.Lock()
+
+
+def _get_or_create(url: str, key: str) -> Client:
+    cache_key = (os.getpid(), url, key)
+    client = _clients.get(cache_key)
+    if client is not None:
+        return client
+    with _lock:
+        client = _clients.get(cache_key)
+        if client is None:
+            client = create_client(url, key)
+            _clients[cache_key] = client
+            print(f"[SupabaseClients] Created shared client for pid {os.getpid()}")
+        return client
+
+
+def get_admin_client(supabase_url: str = None, service_role_key: str = None) -> Client:
+    """
+    Get the shared service-role client (bypasses RLS).
+
+    Args:
+        supabase_url: Project URL (defaults to SUPABASE_URL)
+        service_role_key: Service role key (defaults to SUPABASE_SERVICE_ROLE_KEY)
+
+    Returns:
+        Client: Long-lived admin client for this worker
+    """
+    url = supabase_url or os.environ.get('SUPABASE_URL')
+    key = service_role_key or os.environ.get('SUPABASE_SERVICE_ROLE_KEY')
+    if not url or not key:
+        raise ValueError("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY are required for the admin client")
+    return _get_or_create(url, key)
+
+
+def get_anon_client(supabase_url: str = None, anon_key: str = None) -> Optional[Client]:
+    """
+    Get the shared anon-key client, or None if SUPABASE_ANON_KEY is not set.
+
+    Only use it for auth calls that store no session (e.g. reset emails).
+    Sign in/up and refresh store the user's session on the client, so they
+    must use create_isolated_client() instead; on a shared client concurrent
+    logins would overwrite each other's session.
+    """
+    url = supabase_url or os.environ.get('SUPABASE_URL')
+    key = anon_key or os.environ.get('SUPABASE_ANON_KEY')
+    if not url or not key:
+        return None
+    return _get_or_create(url, key)
+
+
+def create_isolated_client(supabase_url: str = None, key: str = None) -> Client:
+    """
+    Build a throwaway client that is not cached or shared.
+
+    For session-bearing auth calls (sign in/up, refresh): the session they
+    store stays on this client instead of leaking into a shared one.
+    Defaults to the service role key.
+    """
+    url = supabase_url or os.environ.get('SUPABASE_URL')
+    key = key or os.environ.get('SUPABASE_SERVICE_ROLE_KEY')
+    if not url or not key:
+        raise ValueError("SUPABASE_URL and a key are required to create a client")
+    return create_client(url, key)
+
+
+def get_shared_client() -> Client:
+    """
+    Get the client every service should use by default.
+
+    Prefers the 'supabase_client' registered in the service container at
+    startup and falls back to this worker's shared admin client.
+    """
+    from core.container import get_container
+    client = get_container().get('supabase_client')
+    if client is not None:
+        return client
+    return get_admin_client()
+
+
+def reset_clients() -> None:
+    """Drop all cached clients (e.g. after credential rotation)."""
+    with _lock:
+        _clients.clear()
@@ -1,8 +1,30 @@
 import os
 import json
-from supabase import create_client, Client
+import re
+import time
+import uuid
+from supabase import Client
+from services.supabase_clients import get_admin_client
 from werkzeug.datastructures import FileStorage
 from datetime import datetime
+from utils.pagination import decode_keyset_cursor, keyset_filter, split_page
+from services.meal_plan_format import (
+    split_plan_body, canonical_columns, fill_plan_fields, is_canonical, meal_plan_content_hash, is_unique_violation
+)
+
+# Columns returned by the meal plan summary view (no meal_plan document)
+MEAL_PLAN_SUMMARY_COLUMNS = 'id, name, start_date, end_date, has_sickness, sickness_type, created_at, updated_at'
+
+# JSON keys that may be spliced into a PostgREST select path (meal_plan->key->...)
+JSON_PATH_KEY = re.compile(r'^[A-Za-z0-9_]+$')
+
+def _is_uuid(value) -> bool:
+    try:
+        uuid.UUID(str(value))
+        return True
+    except ValueError:
+        return False
+
 class SupabaseService:
     def __init__(self, supabase_url: str, supabase_key: str = None):
         """
@@ -42,8 +64,8 @@ class SupabaseService:
         try:
             print("[DEBUG] Creating Supabase client...")
             
-            # Create the client (service role key provides full access)
-            self.supabase: Client = create_client(supabase_url, supabase_key)
+            # Use the worker's shared client (service role key provides full access)
+            self.supabase: Client = get_admin_client(supabase_url, supabase_key)
             
             # Store the key for verification
             self._service_role_key = supabase_key
@@ -385,21 +407,13 @@ class SupabaseService:
 
         # If already normalized (has mealPlan at top level), use it directly
         if 'mealPlan' in raw_plan:
-            meal_plan_obj = raw_plan
+            meal_plan, meta = raw_plan.get('mealPlan'), {}
         else:
-            meal_plan_obj = raw_plan.get('meal_plan')
-            if isinstance(meal_plan_obj, str):
-                try:
-                    meal_plan_obj = json.loads(meal_plan_obj)
-                except Exception:
-                    meal_plan_obj = {}
-            if isinstance(meal_plan_obj, dict) and 'plan_data' in meal_plan_obj:
-                meal_plan_obj = meal_plan_obj['plan_data']
+            meal_plan, meta, _ = split_plan_body(raw_plan.get('meal_plan'))
 
-        name = raw_plan.get('name') or (meal_plan_obj.get('name') if meal_plan_obj else None)
-        start_date = raw_plan.get('start_date') or raw_plan.get('startDate') or (meal_plan_obj.get('startDate') if meal_plan_obj else None)
-        end_date = raw_plan.get('end_date') or raw_plan.get('endDate') or (meal_plan_obj.get('endDate') if meal_plan_obj else None)
-        meal_plan = raw_plan.get('mealPlan') or (meal_plan_obj.get('mealPlan') if isinstance(meal_plan_obj, dict) else meal_plan_obj)
+        name = raw_plan.get('name') or meta.get('name')
+        start_date = raw_plan.get('start_date') or raw_plan.get('startDate') or meta.get('startDate')
+        end_date = raw_plan.get('end_date') or raw_plan.get('endDate') or meta.get('endDate')
 
         if not user_id:
             user_id = raw_plan.get('user_id')
@@ -423,6 +437,10 @@ class SupabaseService:
         """
         Saves a user's meal plan using direct table insertion to match React code structure.
         Returns the inserted meal plan data.
+
+        If the user already has an identical plan (same days, name, dates and
+        sickness fields; see content_hash), only its updated_at is bumped and
+        it is returned with deduplicated=True.
         """
         try:
             print(f"[DEBUG] Saving meal plan for user: {user_id}, plan_data: {plan_data}")
@@ -440,42 +458,69 @@ class SupabaseService:
             print(f"[DEBUG] meal_plan data: {meal_plan}")
             print(f"[DEBUG] meal_plan type: {type(meal_plan)}")
 
-            # Create insert data matching React structure
-            insert_data = {
-                'user_id': user_id,
+            # Store the canonical format (bare day list, metadata in columns) so reads skip shape detection
+            canonical = canonical_columns({'meal_plan': meal_plan, 'name': name, 'start_date': start_date, 'end_date': end_date})
+            content_hash = None
+            if 'meal_plan' in canonical:
+                meal_plan, name, start_date, end_date = (canonical[key] for key in ('meal_plan', 'name', 'start_date', 'end_date'))
+                content_hash = meal_plan_content_hash(meal_plan, {
+                    'name': name,
+                    'start_date': start_date,
+                    'end_date': end_date,
+                    'has_sickness': has_sickness,
+                    'sickness_type': sickness_type
+                })
+
+            now = datetime.utcnow().isoformat() + 'Z'
+            metadata = {
                 'name': name,
                 'start_date': start_date,
                 'end_date': end_date,
-                'meal_plan': meal_plan,
                 'has_sickness': has_sickness,
                 'sickness_type': sickness_type,
-                'created_at': plan_data.get('created_at') or datetime.utcnow().isoformat() + 'Z',
-                'updated_at': plan_data.get('updated_at') or datetime.utcnow().isoformat() + 'Z'
+                'updated_at': plan_data.get('updated_at') or now
             }
 
+            # Re-saving a plan the user already has (same days, name, dates and sickness
+            # fields) just bumps that row instead of adding a copy
+            if content_hash:
+                existing = self._refresh_duplicate_meal_plan(user_id, content_hash, metadata['updated_at'])
+                if existing is not None:
+                    return self._format_saved_meal_plan(existing, deduplicated=True)
+
+            # Create insert data matching React structure
+            insert_data = {
+                'user_id': user_id,
+                'meal_plan': meal_plan,
+                **metadata,
+                'created_at': plan_data.get('created_at') or now
+            }
+            if content_hash:
+                insert_data['content_hash'] = content_hash
+
             # Insert directly into table using Python client syntax
-            result = self.supabase.table('meal_plan_management').insert(insert_data).execute()
+            try:
+                result = self.supabase.table('meal_plan_management').insert(insert_data).execute()
+            except Exception as e:
+                if not content_hash:
+                    raise
+                if is_unique_violation(e):
+                    # An identical plan was saved concurrently
+                    existing = self._refresh_duplicate_meal_plan(user_id, content_hash, metadata['updated_at'])
+                    if existing is not None:
+                        return self._format_saved_meal_plan(existing, deduplicated=True)
+                    raise
+                if 'content_hash' not in str(e):
+                    raise
+                # Migration 013 not applied yet: save without deduplication
+                insert_data.pop('content_hash')
+                result = self.supabase.table('meal_plan_management').insert(insert_data).execute()
 
-            print(f"[DEBUG] Supabase insert result: data={result.data}")
+            print(f"[DEBUG] Supabase insert result: id={result.data[0].get('id') if result.data else None}")
 
             if result.data and len(result.data) > 0:
-                # Get the inserted record (first item in the array)
-                inserted_data = result.data[0]
-                
-                print(f"[DEBUG] inserted_data = {inserted_data}")
-                
                 # Return data in the format expected by frontend
-                return {
-                    'id': inserted_data['id'],
-                    'name': inserted_data['name'],
-                    'startDate': inserted_data['start_date'],
-                    'endDate': inserted_data['end_date'],
-                    'mealPlan': inserted_data['meal_plan'],
-                    'createdAt': inserted_data['created_at'],
-                    'updatedAt': inserted_data['updated_at'],
-                    'hasSickness': inserted_data.get('has_sickness', False),
-                    'sicknessType': inserted_data.get('sickness_type', '')
-                }
+                return self._format_saved_meal_plan(result.data[0])
             else:
                 print(f"[ERROR] Supabase insert error: No data returned")
                 return None, 'Failed to save meal plan'
@@ -483,6 +528,44 @@ class SupabaseService:
         except Exception as e:
             print(f"[ERROR] Exception in save_meal_plan: {e}")
             return None, str(e)
+
+    def _refresh_duplicate_meal_plan(self, user_id: str, content_hash: str, updated_at: str) -> dict | None:
+        """
+        Bump updated_at on the user's existing plan with this content hash, if any.
+
+        The hash covers the days and every user-visible field, so nothing else
+        about the existing plan changes.
+
+        Returns:
+            dict | None: The refreshed row, or None if there is no such plan
+                         (or content_hash isn't available yet)
+        """
+        try:
+            result = self.supabase.table('meal_plan_management').update({'updated_at': updated_at}).eq('user_id', user_id).eq('content_hash', content_hash).execute()
+        except Exception as e:
+            print(f"[DEBUG] Meal plan deduplication unavailable: {e}")
+            return None
+        if result.data:
+            print(f"[DEBUG] Meal plan already saved for user {user_id}, refreshed plan {result.data[0].get('id')}")
+            return result.data[0]
+        return None
+
+    @staticmethod
+    def _format_saved_meal_plan(row: dict, deduplicated: bool = False) -> dict:
+        """Saved row in the format expected by the frontend"""
+        return {
+            'id': row['id'],
+            'name': row['name'],
+            'startDate': row['start_date'],
+            'endDate': row['end_date'],
+            'mealPlan': row['meal_plan'],
+            'createdAt': row['created_at'],
+            'updatedAt': row['updated_at'],
+            'hasSickness': row.get('has_sickness', False),
+            'sicknessType': row.get('sickness_type', ''),
+            'deduplicated': deduplicated
+        }
+
     # def save_meal_plan(self, user_id: str, plan_data: dict) -> tuple[bool, str | None]:
     #     """
     #     Saves a user's meal plan using RPC.
@@ -546,6 +629,204 @@ class SupabaseService:
             print(f"[ERROR] Exception in get_meal_plans: {e}")
             return None, str(e)
 
+    def get_meal_plans_page(self, user_id: str, limit: int | None = None, cursor: str | None = None,
+                            summary: bool = False) -> tuple[dict | None, str | None]:
+        """
+        Retrieves a page of a user's meal plans, newest first.
+
+        Pages are keyed on (updated_at, id), so rows saved while a client is
+        paging don't shift or repeat entries the way OFFSET would.
+
+        Args:
+            user_id (str): The Supabase user ID.
+            limit (int | None): Page size; None returns every remaining plan.
+            cursor (str | None): next_cursor from the previous page.
+            summary (bool): Return metadata and day_count instead of the meal_plan document.
+
+        Returns:
+            tuple[dict | None, str | None]: ({'meal_plans': [...], 'next_cursor': str | None}, None)
+                                          on success, (None, error_message) on failure.
+
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        after = decode_keyset_cursor(cursor) if cursor else None
+
+        def run(columns: str):
+            query = self.supabase.table('meal_plan_management').select(columns).eq('user_id', user_id)
+            if after:
+                query = query.or_(keyset_filter(after))
+            query = query.order('updated_at', desc=True).order('id', desc=True)
+            if limit:
+                # One extra row tells us whether another page exists
+                query = query.limit(limit + 1)
+            return query.execute().data or []
+
+        try:
+            if summary:
+                try:
+                    rows = run(f'{MEAL_PLAN_SUMMARY_COLUMNS}, day_count, format_version')
+                    self._fill_legacy_summary_fields(user_id, rows)
+                except Exception as e:
+                    # Migrations 011/012 not applied yet: read the documents instead
+                    print(f"[DEBUG] day_count unavailable ({e}), counting days from meal_plan")
+                    rows = run(f'{MEAL_PLAN_SUMMARY_COLUMNS}, meal_plan')
+                    for row in rows:
+                        meal_plan = row.pop('meal_plan', None)
+                        row['day_count'] = self._count_plan_days(meal_plan)
+                        fill_plan_fields(row, meal_plan)
+            else:
+                rows = run('*')
+                for row in rows:
+                    row.pop('day_index', None)
+
+            rows, next_cursor = split_page(rows, limit)
+            return {'meal_plans': rows, 'next_cursor': next_cursor}, None
+        except Exception as e:
+            print(f"[ERROR] Exception in get_meal_plans_page: {e}")
+            return None, str(e)
+
+    def _fill_legacy_summary_fields(self, user_id: str, rows: list) -> None:
+        """
+        Fill name/start_date/end_date of non-canonical summary rows from their documents.
+
+        Legacy rows may keep these only inside meal_plan (the full view fills
+        them the same way); one extra query reads just those rows' documents.
+        """
+        legacy_ids = [
+            row['id'] for row in rows
+            if not is_canonical(row) and not (row.get('name') and row.get('start_date') and row.get('end_date'))
+        ]
+        documents = {}
+        if legacy_ids:
+            result = self.supabase.table('meal_plan_management').select('id, meal_plan').eq(
+                'user_id', user_id).in_('id', legacy_ids).execute()
+            documents = {doc['id']: doc.get('meal_plan') for doc in result.data or []}
+        for row in rows:
+            row.pop('format_version', None)
+            if row['id'] in documents:
+                fill_plan_fields(row, documents[row['id']])
+
+    @staticmethod
+    def _count_plan_days(meal_plan) -> int | None:
+        """Length of the day list in a meal_plan document, for any of the stored shapes."""
+        days, _, _ = split_plan_body(meal_plan)
+        return len(days) if days is not None else None
+
+    def get_meal_plan_by_id(self, user_id: str, plan_id: str) -> tuple[dict | None, str | None]:
+        """
+        Retrieves one of a user's meal plans by id (single-row lookup).
+
+        Args:
+            user_id (str): The Supabase user ID.
+            plan_id (str): The meal plan ID.
+
+        Returns:
+            tuple[dict | None, str | None]: (meal plan, None) on success,
+                                          (None, None) if the user has no such plan,
+                                          (None, error_message) on failure.
+        """
+        try:
+            result = self.supabase.table('meal_plan_management').select('*').eq('user_id', user_id).eq('id', plan_id).limit(1).execute()
+            return (result.data[0] if result.data else None), None
+        except Exception as e:
+            # A malformed id can't match any plan; don't report it as a server error
+            if 'invalid input syntax' in str(e):
+                return None, None
+            print(f"[ERROR] Exception in get_meal_plan_by_id: {e}")
+            return None, str(e)
+
+    # After a failed get_meal_plan_day RPC call, use the two-query projection for this long
+    _day_rpc_unavailable_until = 0.0
+
+    def get_meal_plan_day(self, user_id: str, plan_id: str, day: str, fields: list | None = None) -> tuple[dict | None, str | None]:
+        """
+        Retrieves one day of a meal plan via JSON path projection.
+
+        The get_meal_plan_day RPC (migration 017) resolves the day's offset in
+        the plan's day_index and projects meal_plan-><path>-><offset> (or just
+        the given fields of that element) in a single round trip. Until that
+        migration is applied, falls back to _project_meal_plan_day.
+
+        Args:
+            user_id (str): The Supabase user ID.
+            plan_id (str): The meal plan ID.
+            day (str): Day name as stored in the plan (e.g. 'Monday').
+            fields (list | None): Keys of the day object to return; None for the whole day.
+
+        Returns:
+            tuple[dict | None, str | None]:
+                ({'plan_found': False}, None) if the user has no such plan,
+                ({'plan_found': True, 'day_plan': dict | None}, None) otherwise,
+                (None, reason) if the plan can't be projected (no day index,
+                unsupported shape, query error); callers fall back to get_meal_plan_by_id.
+        """
+        # The RPC takes UUIDs; anything else would fail it (and switch it off), not just miss
+        if _is_uuid(plan_id) and _is_uuid(user_id) and time.time() >= SupabaseService._day_rpc_unavailable_until:
+            try:
+                result = self.supabase.rpc('get_meal_plan_day', {
+                    'p_user_id': user_id,
+                    'p_plan_id': plan_id,
+                    'p_day': day,
+                    'p_fields': list(fields) if fields else None
+                }).execute()
+                outcome = result.data
+                if not isinstance(outcome, dict) or not isinstance(outcome.get('plan_found'), bool):
+                    # Never turn an unexpected payload into a 404; the caller reads the full plan
+                    return None, f'Unexpected get_meal_plan_day result: {type(outcome).__name__}'
+                if not outcome['plan_found']:
+                    return {'plan_found': False}, None
+                if not outcome.get('indexed'):
+                    return None, 'Plan has no usable day index'
+                day_plan = outcome.get('day_plan')
+                return {'plan_found': True, 'day_plan': day_plan if isinstance(day_plan, dict) else None}, None
+            except Exception as e:
+                SupabaseService._day_rpc_unavailable_until = time.time() + 300
+                print(f"[MealPlan] get_meal_plan_day RPC unavailable, using two-step projection: {e}")
+        return self._project_meal_plan_day(user_id, plan_id, day, fields)
+
+    def _project_meal_plan_day(self, user_id: str, plan_id: str, day: str, fields: list | None = None) -> tuple[dict | None, str | None]:
+        """Two-query form of get_meal_plan_day: read day_index, then select the element."""
+        try:
+            if fields and not all(JSON_PATH_KEY.match(field) for field in fields):
+                return None, 'Field names not projectable'
+
+            index_result = self.supabase.table('meal_plan_management').select('id, day_index').eq('user_id', user_id).eq('id', plan_id).limit(1).execute()
+            if not index_result.data:
+                return {'plan_found': False}, None
+            day_index = index_result.data[0].get('day_index')
+            if not isinstance(day_index, dict) or not isinstance(day_index.get('days'), dict):
+                return None, 'Plan has no day index'
+
+            path = day_index.get('path') or []
+            if not all(isinstance(key, str) and JSON_PATH_KEY.match(key) for key in path):
+                return None, 'Day index path not projectable'
+            offset = day_index['days'].get(day)
+            if offset is None:
+                return {'plan_found': True, 'day_plan': None}, None
+
+            element = '->'.join(['meal_plan', *path, str(int(offset))])
+            if fields:
+                # Also fetch 'day' to confirm the index still matches the document
+                columns = ', '.join(f"f{i}:{element}->{field}" for i, field in enumerate(['day', *fields]))
+            else:
+                columns = f"day_plan:{element}"
+            result = self.supabase.table('meal_plan_management').select(columns).eq('user_id', user_id).eq('id', plan_id).limit(1).execute()
+            if not result.data:
+                return {'plan_found': False}, None
+            row = result.data[0]
+
+            if fields:
+                day_plan = {field: row.get(f"f{i}") for i, field in enumerate(['day', *fields])}
+            else:
+                day_plan = row.get('day_plan')
+            if not isinstance(day_plan, dict) or day_plan.get('day') != day:
+                return None, 'Day index out of date'
+            return {'plan_found': True, 'day_plan': day_plan}, None
+        except Exception as e:
+            # e.g. migration 010 not applied yet (no day_index column)
+            return None, str(e)
+
     def save_session(self, user_id: str, session_id: str, session_data: dict, created_at: str) -> tuple[bool, str | None]:
         """
         Saves a new session record using RPC.
@@ -735,6 +1016,11 @@ class SupabaseService:
             tuple[bool, str | None]: (True, None) on success, (False, error_message) on failure.
         """
         try:
+            if 'meal_plan' in plan_data:
+                # Write the canonical format (see services/meal_plan_format.py)
+                canonical = canonical_columns(plan_data)
+                if 'meal_plan' in canonical:
+                    plan_data = {**plan_data, **{key: value for key, value in canonical.items() if value is not None}}
             result = self.supabase.rpc('update_meal_plan', {
                 'p_user_id': user_id,
                 'p_plan_id': plan_id,
@@ -967,12 +1253,7 @@ class SupabaseService:
             
             try:
                 # Use admin client to bypass RLS for history insert
-                from supabase import create_client
-                import os
-                admin_client = create_client(
-                    os.getenv('SUPABASE_URL'),
-                    os.getenv('SUPABASE_SERVICE_ROLE_KEY')
-                )
+                admin_client = get_admin_client()
                 
                 # Get settings_data from persisted record
                 settings_data_for_history = persisted_record.get('settings_data', normalized_settings)
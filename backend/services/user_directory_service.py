@@ -0,0 +1,254 @@
+"""
+User Directory Service for resolving user details in bulk
+"""
+
+import os
+import threading
+import time
+from functools import partial
+from typing import Any, Dict, Iterable, List, Optional
+from supabase import Client
+from services.supabase_clients import get_shared_client
+from services.fanout import fan_out
+
+# PostgREST puts in_() filters in the URL, so keep id lists to a safe length
+PROFILE_BATCH_SIZE = 200
+# Emails per ilike or() filter in the profiles fallback (keeps the URL short)
+PROFILE_ILIKE_BATCH_SIZE = 50
+
+try:
+    EMAIL_CACHE_TTL = int(os.environ.get('EMAIL_LOOKUP_CACHE_TTL', '300'))
+except ValueError:
+    EMAIL_CACHE_TTL = 300
+# Misses are cached briefly so failed-login bursts don't turn into lookup storms
+try:
+    EMAIL_NEGATIVE_CACHE_TTL = int(os.environ.get('EMAIL_LOOKUP_NEGATIVE_TTL', '30'))
+except ValueError:
+    EMAIL_NEGATIVE_CACHE_TTL = 30
+EMAIL_CACHE_MAX_SIZE = 10000
+
+
+def normalize_email(email: Optional[str]) -> str:
+    return (email or '').strip().lower()
+
+
+def _escape_like(value: str) -> str:
+    """Escape LIKE wildcards so ilike() does an exact case-insensitive match."""
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _ilike_any_filter(column: str, values: Iterable[str]) -> str:
+    """
+    PostgREST or() filter matching column case-insensitively against any value.
+
+    PostgREST treats '*' in a pattern as '%', so it is sent as the single-char
+    wildcard '_'; callers re-check matches exactly.
+    """
+    conditions = []
+    for value in values:
+        pattern = _escape_like(value).replace('*', '_')
+        quoted = pattern.replace('\\', '\\\\').replace('"', '\\"')
+        conditions.append(f'{column}.ilike."{quoted}"')
+    return ','.join(conditions)
+
+
+class UserDirectoryService:
+    """Resolves user names/emails from profiles with an auth admin fallback"""
+
+    def __init__(self, supabase_client: Optional[Client] = None):
+        self._supabase = supabase_client
+        # email (lowercased) -> (expires_at, user_id or None for a cached miss)
+        self._email_cache: Dict[str, tuple] = {}
+        self._email_lock = threading.Lock()
+
+    @property
+    def supabase(self) -> Client:
+        if self._supabase is None:
+            self._supabase = get_shared_client()
+        return self._supabase
+
+    def _fetch_profiles(self, user_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Load profiles rows for the given ids in a few batched queries."""
+        profiles = {}
+        for start in range(0, len(user_ids), PROFILE_BATCH_SIZE):
+            chunk = user_ids[start:start + PROFILE_BATCH_SIZE]
+            result = self.supabase.table('profiles').select('id, email, first_name, last_name').in_('id', chunk).execute()
+            for row in result.data or []:
+                profiles[row['id']] = row
+        return profiles
+
+    def _fetch_auth_user(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Load a single user from the auth admin API."""
+        try:
+            user_details = self.supabase.auth.admin.get_user_by_id(user_id)
+            if user_details and user_details.user:
+                user_metadata = user_details.user.user_metadata or {}
+                return {
+                    'email': user_details.user.email,
+                    'first_name': user_metadata.get('first_name', ''),
+                    'last_name': user_metadata.get('last_name', ''),
+                }
+        except Exception as e:
+            print(f"[UserDirectory] Auth lookup failed for {user_id}: {e}")
+        return None
+
+    def get_user_details(self, user_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Resolve email and names for many users with a constant number of round trips.
+
+        Args:
+            user_ids: User ids (duplicates and empty values are ignored)
+
+        Returns:
+            Dict mapping user_id -> {'email', 'first_name', 'last_name'}; ids that
+            cannot be resolved are omitted.
+        """
+        unique_ids = list(dict.fromkeys(uid for uid in user_ids if uid))
+        if not unique_ids:
+            return {}
+
+        details: Dict[str, Dict[str, Any]] = {}
+        try:
+            for user_id, row in self._fetch_profiles(unique_ids).items():
+                if row.get('email'):
+                    details[user_id] = {
+                        'email': row['email'],
+                        'first_name': row.get('first_name') or '',
+                        'last_name': row.get('last_name') or '',
+                    }
+        except Exception as e:
+            print(f"[UserDirectory] Batched profiles lookup failed: {e}")
+
+        # Users without a usable profile row fall back to auth on the shared fan-out pool
+        missing = [uid for uid in unique_ids if uid not in details]
+        if missing:
+            results = fan_out(
+                {uid: partial(self._fetch_auth_user, uid) for uid in missing},
+                return_exceptions=True
+            )
+            for user_id, auth_details in results.items():
+                if auth_details and not isinstance(auth_details, Exception):
+                    details[user_id] = auth_details
+
+        return details
+
+    def _lookup_user_id_by_email(self, email: str) -> Optional[str]:
+        """Single indexed lookup (RPC), falling back to a profiles query."""
+        try:
+            result = self.supabase.rpc('find_user_id_by_email', {'p_email': email}).execute()
+            return result.data or None
+        except Exception as e:
+            # RPC not deployed yet (migration 006) - use the profiles table directly
+            print(f"[UserDirectory] find_user_id_by_email RPC unavailable, using profiles query: {e}")
+        result = self.supabase.table('profiles').select('id').ilike('email', _escape_like(email)).limit(1).execute()
+        return result.data[0]['id'] if result.data else None
+
+    def find_user_id_by_email(self, email: str, use_cache: bool = True) -> Optional[str]:
+        """
+        Resolve an email address to a user id (case-insensitive).
+
+        Args:
+            email: Email address to look up
+            use_cache: Serve from the local cache when possible
+
+        Returns:
+            The user id, or None if no account uses this email
+        """
+        normalized = normalize_email(email)
+        if not normalized:
+            return None
+
+        now = time.time()
+        if use_cache:
+            with self._email_lock:
+                entry = self._email_cache.get(normalized)
+                if entry and entry[0] > now:
+                    return entry[1]
+
+        user_id = self._lookup_user_id_by_email(normalized)
+        if user_id:
+            self.remember_email(normalized, user_id)
+        else:
+            self._cache_email(normalized, None, EMAIL_NEGATIVE_CACHE_TTL)
+        return user_id
+
+    def find_user_ids_by_emails(self, emails: Iterable[str]) -> Dict[str, str]:
+        """
+        Resolve many email addresses to user ids in one round trip.
+
+        Args:
+            emails: Email addresses (normalized and deduplicated internally)
+
+        Returns:
+            Dict mapping normalized email -> user id for emails that have an account
+        """
+        pending = list(dict.fromkeys(normalize_email(e) for e in emails if normalize_email(e)))
+        found: Dict[str, str] = {}
+
+        now = time.time()
+        with self._email_lock:
+            uncached = []
+            for email in pending:
+                entry = self._email_cache.get(email)
+                if entry and entry[0] > now:
+                    if entry[1]:
+                        found[email] = entry[1]
+                else:
+                    uncached.append(email)
+        if not uncached:
+            return found
+
+        resolved: Dict[str, str] = {}
+        try:
+            result = self.supabase.rpc('find_user_ids_by_emails', {'p_emails': uncached}).execute()
+            for row in result.data or []:
+                resolved[normalize_email(row.get('email'))] = row['user_id']
+        except Exception as e:
+            # RPC not deployed yet (migration 007) - batched profiles query instead
+            print(f"[UserDirectory] find_user_ids_by_emails RPC unavailable, using profiles query: {e}")
+            # Case-insensitive like the RPC: stored emails are not guaranteed to be lower-case
+            for start in range(0, len(uncached), PROFILE_ILIKE_BATCH_SIZE):
+                chunk = uncached[start:start + PROFILE_ILIKE_BATCH_SIZE]
+                result = self.supabase.table('profiles').select('id, email').or_(
+                    _ilike_any_filter('email', chunk)
+                ).execute()
+                wanted = set(chunk)
+                for row in result.data or []:
+                    email = normalize_email(row.get('email'))
+                    if email in wanted and email not in resolved:
+                        resolved[email] = row['id']
+
+        for email in uncached:
+            if email in resolved:
+                self.remember_email(email, resolved[email])
+                found[email] = resolved[email]
+            else:
+                self._cache_email(email, None, EMAIL_NEGATIVE_CACHE_TTL)
+        return found
+
+    def user_exists(self, email: str) -> bool:
+        """Return True if an account uses this email (positive and negative results are cached)."""
+        return self.find_user_id_by_email(email) is not None
+
+    def _cache_email(self, normalized: str, user_id: Optional[str], ttl: int) -> None:
+        if not normalized or ttl <= 0:
+            return
+        with self._email_lock:
+            if len(self._email_cache) >= EMAIL_CACHE_MAX_SIZE and normalized not in self._email_cache:
+                self._email_cache.pop(next(iter(self._email_cache)))
+            self._email_cache[normalized] = (time.time() + ttl, user_id)
+
+    def remember_email(self, email: str, user_id: str) -> None:
+        """Cache a known email -> user id mapping (e.g. right after creating the user)."""
+        if not user_id:
+            return
+        self._cache_email(normalize_email(email), user_id, EMAIL_CACHE_TTL)
+
+    def forget_email(self, email: str) -> None:
+        """Drop a cached mapping or miss (e.g. after the user is deleted or signs up)."""
+        with self._email_lock:
+            self._email_cache.pop(normalize_email(email), None)
+
+
+# Create a singleton instance
+user_directory = UserDirectoryService()
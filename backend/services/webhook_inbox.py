@@ -0,0 +1,222 @@
+"""
+Durable inbox for Paystack webhook events
+
+Webhook routes verify the signature, then write the event to the Supabase
+paystack_webhooks table (keyed by a stable event_key, see migration 015)
+before answering Paystack. That row is the durable, shared record: if the
+write fails the route returns 500 and Paystack redelivers.
+
+The event is also queued in this host's SQLite work queue so worker threads
+can hand it to the handler registered for its source (the existing
+PaymentService / SubscriptionService processing), retrying failures with
+backoff. The queue is only a fast path: a maintenance job re-queues events
+still 'received' in Supabase after PAYSTACK_WEBHOOK_RECOVERY_AFTER_SECONDS,
+so events survive the loss of a host or its instance directory.
+
+Events Paystack redelivers map to the same key and are ignored on insert.
+Handlers are idempotent on the key as well (they skip rows already processed
+or dead), since recovery can hand an event to a second host. Events that keep
+failing, or fail permanently, are parked as 'dead' in both stores.
+"""
+
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from services.durable_queue import DurableQueue, INSTANCE_DIR, PermanentJobError
+from utils.env import int_env
+
+STATUS_RECEIVED = 'received'
+STATUS_PROCESSED = 'processed'
+STATUS_DEAD = 'dead'
+
+WEBHOOK_TABLE = 'paystack_webhooks'
+
+# Set PAYSTACK_WEBHOOK_ASYNC=false to process webhooks inside the request again
+ASYNC_WEBHOOKS_ENABLED = os.environ.get('PAYSTACK_WEBHOOK_ASYNC', 'true').strip().lower() in ('1', 'true', 'yes', 'on')
+
+# Handlers take (event_data, event_key=...) and return {'success': bool, ...}.
+# A failed result with 'retryable': False is dead-lettered without retries.
+WebhookHandler = Callable[..., Dict[str, Any]]
+
+
+def webhook_event_key(source: str, event_data: Dict[str, Any], raw_payload: Optional[bytes] = None) -> str:
+    """
+    Stable identity for a Paystack event.
+
+    Uses the event type plus the object id (or reference) from `data`, and
+    falls back to a hash of the raw body (or of the canonical JSON when the
+    raw body is not available) when neither is present.
+    """
+    data = event_data.get('data') or {}
+    object_id = event_data.get('id') or data.get('id') or data.get('reference')
+    if object_id:
+        return f"{source}:{event_data.get('event')}:{object_id}"
+    if raw_payload is None:
+        raw_payload = json.dumps(event_data, sort_keys=True, separators=(',', ':')).encode('utf-8')
+    return f"{source}:sha256:{hashlib.sha256(raw_payload).hexdigest()}"
+
+
+def record_webhook_event(client, source: str, event_key: str, event_data: Dict[str, Any]) -> Tuple[Dict[str, Any], bool]:
+    """
+    Store an event in paystack_webhooks unless its key is already there.
+
+    Returns:
+        (row, is_new): the stored row (at least id, status, processed)
+
+    Raises:
+        Exception: If the event could not be stored; callers must not ack it
+    """
+    data = event_data.get('data') or {}
+    record = {
+        'event_key': event_key,
+        'source': source,
+        'event_type': event_data.get('event'),
+        'paystack_event_id': event_data.get('id'),
+        'paystack_reference': data.get('reference'),
+        'event_data': event_data,
+        'processed': False,
+        'status': STATUS_RECEIVED
+    }
+    result = client.table(WEBHOOK_TABLE).upsert(record, on_conflict='event_key', ignore_duplicates=True).execute()
+    if result.data:
+        return result.data[0], True
+
+    existing = client.table(WEBHOOK_TABLE).select('id, status, processed').eq('event_key', event_key).limit(1).execute()
+    if not existing.data:
+        raise RuntimeError(f'Webhook event {event_key} was not stored')
+    return existing.data[0], False
+
+
+def webhook_already_handled(row: Dict[str, Any]) -> bool:
+    """True once an event has been processed or dead-lettered."""
+    return bool(row.get('processed')) or row.get('status') in (STATUS_PROCESSED, STATUS_DEAD)
+
+
+def mark_webhook_processed(client, webhook_id: Any) -> None:
+    client.table(WEBHOOK_TABLE).update({
+        'processed': True,
+        'status': STATUS_PROCESSED,
+        'processed_at': datetime.now(timezone.utc).isoformat(),
+        'last_error': None
+    }).eq('id', webhook_id).execute()
+
+
+def mark_webhook_dead(client, event_key: str, error: str) -> None:
+    client.table(WEBHOOK_TABLE).update({
+        'status': STATUS_DEAD,
+        'last_error': error
+    }).eq('event_key', event_key).neq('status', STATUS_PROCESSED).execute()
+
+
+class WebhookInbox(DurableQueue):
+    """Dedupe-on-insert webhook queue backed by paystack_webhooks, with retry and a dead-letter state"""
+
+    table = 'paystack_webhook_inbox'
+    log_prefix = '[WebhookInbox]'
+    terminal_failure_status = STATUS_DEAD
+
+    def __init__(self, db_path: Optional[str] = None, supabase_client=None):
+        super().__init__(
+            db_path or os.environ.get('PAYSTACK_WEBHOOK_INBOX_PATH') or os.path.join(INSTANCE_DIR, 'paystack_webhooks.sqlite3'),
+            workers=int_env('PAYSTACK_WEBHOOK_WORKERS', 2),
+            max_attempts=int_env('PAYSTACK_WEBHOOK_MAX_ATTEMPTS', 8),
+            backoff_base=int_env('PAYSTACK_WEBHOOK_BACKOFF_SECONDS', 15),
+            backoff_max=int_env('PAYSTACK_WEBHOOK_BACKOFF_MAX_SECONDS', 3600),
+            lease_seconds=int_env('PAYSTACK_WEBHOOK_LEASE_SECONDS', 300)
+        )
+        self._supabase = supabase_client
+        self._handlers: Dict[str, WebhookHandler] = {}
+        # Events still 'received' in Supabase this long after arrival are re-queued
+        self.recovery_after_seconds = max(60, int_env('PAYSTACK_WEBHOOK_RECOVERY_AFTER_SECONDS', 900))
+
+    @property
+    def supabase(self):
+        if self._supabase is None:
+            from services.supabase_clients import get_shared_client
+            self._supabase = get_shared_client()
+        return self._supabase
+
+    def register_handler(self, source: str, handler: WebhookHandler) -> None:
+        """
+        Register the processor for events from one webhook route.
+
+        Workers in this process only claim events whose source has a handler.
+        Also schedules the recovery job that re-queues stranded events.
+        """
+        self._handlers[source] = handler
+        self.start()
+        self._wakeup.set()
+
+        from services.maintenance_scheduler import maintenance_scheduler
+        maintenance_scheduler.register_job(
+            'requeue_stale_webhooks',
+            int_env('PAYSTACK_WEBHOOK_RECOVERY_INTERVAL_SECONDS', 300),
+            self.requeue_stale_events
+        )
+        maintenance_scheduler.start()
+
+    def ingest(self, source: str, event_data: Dict[str, Any], raw_payload: bytes) -> Tuple[str, bool]:
+        """
+        Durably store a verified webhook event and queue it for processing.
+
+        Returns:
+            (event_key, is_new): is_new is False for a duplicate delivery
+
+        Raises:
+            Exception: If the event could not be written to Supabase
+        """
+        event_key = webhook_event_key(source, event_data, raw_payload)
+        _, is_new = record_webhook_event(self.supabase, source, event_key, event_data)
+        if is_new:
+            try:
+                self._insert([(event_key, source, {'event_key': event_key, 'event': event_data})], ignore_duplicates=True)
+            except Exception as e:
+                # Already durable in Supabase; the recovery job queues it later
+                print(f"[WebhookInbox] ⚠️ Could not queue {event_key} locally, leaving it for recovery: {e}")
+        print(f"[WebhookInbox] {'Queued' if is_new else 'Ignored duplicate'} {event_data.get('event')} event {event_key}")
+        return event_key, is_new
+
+    def requeue_stale_events(self, limit: int = 200) -> Dict[str, Any]:
+        """Queue events left 'received' in Supabase (e.g. by a lost host) on this host."""
+        sources = list(self._handlers)
+        if not sources:
+            return {'success': True, 'requeued': 0}
+        try:
+            cutoff = (datetime.now(timezone.utc) - timedelta(seconds=self.recovery_after_seconds)).isoformat()
+            result = self.supabase.table(WEBHOOK_TABLE).select('event_key, source, event_data').eq(
+                'status', STATUS_RECEIVED
+            ).in_('source', sources).lt('received_at', cutoff).order('received_at').limit(limit).execute()
+            jobs = [
+                (row['event_key'], row['source'], {'event_key': row['event_key'], 'event': row['event_data']})
+                for row in result.data or [] if row.get('event_key')
+            ]
+            requeued = self._insert(jobs, ignore_duplicates=True) if jobs else []
+            if requeued:
+                print(f"[WebhookInbox] Re-queued {len(requeued)} stranded webhook events")
+            return {'success': True, 'requeued': len(requeued)}
+        except Exception as e:
+            return {'success': False, 'error': str(e)}
+
+    def _claimable_kinds(self) -> Optional[List[str]]:
+        return list(self._handlers)
+
+    def _process(self, kind: str, payload: Dict[str, Any]) -> Optional[str]:
+        result = self._handlers[kind](payload['event'], event_key=payload['event_key']) or {}
+        if result.get('success'):
+            return None
+        error = result.get('error') or result.get('message') or 'Webhook handler failed'
+        if result.get('retryable') is False:
+            raise PermanentJobError(error)
+        return error
+
+    def _on_terminal_failure(self, row, error: str) -> None:
+        mark_webhook_dead(self.supabase, row['id'], error)
+
+    def _describe(self, row) -> str:
+        return f"{row['kind']} webhook {row['id']}"
+
+
+# Create a singleton instance
+webhook_inbox = WebhookInbox()
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# Tests import modules the way the app does (services.x, utils.x) from the backend directory
+BACKEND_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+if BACKEND_DIR not in sys.path:
+    sys.path.insert(0, BACKEND_DIR)
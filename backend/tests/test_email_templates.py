@@ -0,0 +1,61 @@
+from email import message_from_bytes
+from email.mime.text import MIMEText
+
+import pytest
+
+from services.email_templates import TEMPLATES, _text_part, build_message, render_email
+
+PARAMS = {
+    'invitation': {
+        'to_email': 'new.member@example.com',
+        'enterprise_name': 'Green Valley Clinic',
+        'inviter_name': 'admin@example.com',
+        'invitation_link': 'https://www.meallensai.com/accept-invitation?token=abc',
+        'custom_message': 'Looking forward to working with you & your team!',
+    },
+    'welcome': {'enterprise_name': 'Green Valley Clinic'},
+    'user_creation': {
+        'to_email': 'new.member@example.com',
+        'enterprise_name': 'Green Valley Clinic',
+        'inviter_name': 'admin@example.com',
+        'login_url': 'https://www.meallensai.com/accept-invitation',
+    },
+    'invitation_accepted': {
+        'admin_name': 'Clinic Admin',
+        'accepted_user_email': 'new.member@example.com',
+        'accepted_user_name': 'Nnamdi Ọkafor',
+        'enterprise_name': 'Green Valley Clinic',
+        'role': 'patient',
+        'dashboard_link': 'https://www.meallensai.com/enterprise',
+    },
+}
+
+
+@pytest.mark.parametrize('body', ['plain ascii\nsecond line\n', 'café \U0001F389\n', ''], ids=['ascii', 'utf-8', 'empty'])
+@pytest.mark.parametrize('subtype', ['plain', 'html'])
+def test_text_part_matches_mimetext(body, subtype):
+    assert _text_part(body, subtype).as_bytes() == MIMEText(body, subtype).as_bytes()
+
+
+def test_templates_cover_sample_params():
+    assert set(TEMPLATES) == set(PARAMS)
+
+
+@pytest.mark.parametrize('name', sorted(PARAMS))
+def test_built_message_round_trips(name):
+    rendered = render_email(name, PARAMS[name])
+    raw = build_message(rendered, 'MeallensAI <noreply@example.com>', 'to@example.com').as_bytes()
+    parsed = message_from_bytes(raw)
+
+    assert parsed.get_content_type() == 'multipart/alternative'
+    parts = parsed.get_payload()
+    expected = ([('text/plain', rendered.text)] if rendered.text is not None else []) + [('text/html', rendered.html)]
+    assert [part.get_content_type() for part in parts] == [content_type for content_type, _ in expected]
+    for part, (_, body) in zip(parts, expected):
+        assert part.get_payload(decode=True).decode(part.get_content_charset()) == body
+
+
+def test_each_message_gets_its_own_boundary():
+    rendered = render_email('welcome', PARAMS['welcome'])
+    boundaries = {build_message(rendered, 'a@example.com', 'b@example.com').get_boundary() for _ in range(50)}
+    assert len(boundaries) == 50
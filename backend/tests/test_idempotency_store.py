@@ -0,0 +1,96 @@
+import pytest
+
+from services.idempotency_store import (
+    ACTIVATED_ELSEWHERE,
+    CLAIMED,
+    COMPLETED,
+    CONFLICT,
+    IN_PROGRESS,
+    IdempotencyStore,
+)
+
+
+class _Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Query:
+    """Records the chained PostgREST calls of one query."""
+
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.calls = []
+
+    def __getattr__(self, name):
+        def call(*args):
+            self.calls.append((name,) + args)
+            return self
+        return call
+
+    def execute(self):
+        self.client.executed.append(self)
+        return _Result(self.client.rpc_result)
+
+
+class FakeSupabase:
+    def __init__(self, rpc_result=None):
+        self.rpc_result = rpc_result
+        self.rpc_calls = []
+        self.executed = []
+
+    def rpc(self, name, params):
+        self.rpc_calls.append((name, params))
+        return _Query(self, None)
+
+    def table(self, name):
+        return _Query(self, name)
+
+
+def test_begin_sends_reference_scope_and_owner():
+    client = FakeSupabase({'state': 'claimed', 'claim_id': 'c-1'})
+    state, stored = IdempotencyStore(client).begin('ref-1', 'user-1', 'payment.success')
+    assert (state, stored) == (CLAIMED, {'claim_id': 'c-1'})
+    name, params = client.rpc_calls[0]
+    assert name == 'begin_payment_idempotency'
+    assert (params['p_reference'], params['p_scope'], params['p_owner']) == ('ref-1', 'payment.success', 'user-1')
+
+
+@pytest.mark.parametrize('outcome, expected', [
+    ({'state': 'completed', 'status_code': 200, 'body': {'success': True}, 'scope': 's'},
+     (COMPLETED, {'status_code': 200, 'body': {'success': True}, 'scope': 's'})),
+    ({'state': 'activated_elsewhere', 'scope': 'subscription.activate'},
+     (ACTIVATED_ELSEWHERE, {'scope': 'subscription.activate'})),
+    ({'state': 'in_progress', 'scope': 's'}, (IN_PROGRESS, {'scope': 's'})),
+    ({'state': 'conflict'}, (CONFLICT, None)),
+])
+def test_begin_outcomes(outcome, expected):
+    assert IdempotencyStore(FakeSupabase(outcome)).begin('ref-1', None, 's') == expected
+
+
+@pytest.mark.parametrize('outcome', [None, {}, {'state': 'claimed'}, {'state': 'bogus'}])
+def test_begin_rejects_unexpected_results(outcome):
+    # A claim without a claim id could never be completed or released
+    with pytest.raises(RuntimeError):
+        IdempotencyStore(FakeSupabase(outcome)).begin('ref-1', None, 's')
+
+
+def test_complete_and_release_are_fenced_by_claim_id():
+    client = FakeSupabase()
+    store = IdempotencyStore(client)
+    store.complete('ref-1', 'payment.success', 'c-1', 200, {'success': True})
+    store.release('ref-1', 'payment.success', 'c-2')
+
+    update, delete = client.executed
+    assert update.table == delete.table == 'payment_idempotency_keys'
+    assert update.calls[0][0] == 'update'
+    assert delete.calls[0][0] == 'delete'
+    for query, claim_id in ((update, 'c-1'), (delete, 'c-2')):
+        filters = {call[1]: call[2] for call in query.calls if call[0] == 'eq'}
+        assert filters == {
+            'reference': 'ref-1',
+            'scope': 'payment.success',
+            'claim_id': claim_id,
+            'status': IN_PROGRESS,
+        }
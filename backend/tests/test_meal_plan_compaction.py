@@ -0,0 +1,202 @@
+import copy
+import threading
+
+import pytest
+
+import services.meal_plan_format as meal_plan_format
+from services.meal_plan_format import (
+    MEAL_PLAN_FORMAT_VERSION,
+    _collapse_duplicates,
+    compact_meal_plan_batch,
+    meal_plan_content_hash,
+)
+
+DAYS = [
+    {'day': 'Monday', 'breakfast': 'Oats', 'lunch': 'Jollof rice'},
+    {'day': 'Tuesday', 'breakfast': 'Akara', 'lunch': 'Egusi soup'},
+]
+META = {'name': 'Week 1', 'start_date': '2025-01-06', 'end_date': '2025-01-12', 'has_sickness': False, 'sickness_type': None}
+HASH = meal_plan_content_hash(DAYS, META)
+
+
+class _Result:
+    def __init__(self, data):
+        self.data = data
+
+
+class _Query:
+    def __init__(self, table, action, values=None):
+        self.table = table
+        self.action = action
+        self.values = values
+        self.filters = []
+        self.limit_to = None
+
+    def eq(self, column, value):
+        # Like SQL, NULL never equals anything
+        self.filters.append(lambda row: value is not None and row.get(column) == value)
+        return self
+
+    def is_(self, column, value):
+        assert value == 'null'
+        self.filters.append(lambda row: row.get(column) is None)
+        return self
+
+    def gt(self, column, value):
+        self.filters.append(lambda row: str(row.get(column)) > value)
+        return self
+
+    def order(self, column):
+        return self
+
+    def limit(self, count):
+        self.limit_to = count
+        return self
+
+    def execute(self):
+        return self.table.execute(self)
+
+
+class FakeMealPlanTable:
+    """In-memory meal_plan_management with the (user_id, content_hash) unique index."""
+
+    def __init__(self, rows):
+        self.rows = {row['id']: dict(row) for row in rows}
+        self.lock = threading.Lock()
+        # Called with (action, values) before a query runs, to stage a concurrent change
+        self.before = None
+
+    def table(self, name):
+        assert name == 'meal_plan_management'
+        return self
+
+    def select(self, columns, **kwargs):
+        return _Query(self, 'select')
+
+    def update(self, values):
+        return _Query(self, 'update', values)
+
+    def delete(self):
+        return _Query(self, 'delete')
+
+    def execute(self, query):
+        if self.before:
+            self.before(query.action, query.values)
+        with self.lock:
+            matched = [row for row in sorted(self.rows.values(), key=lambda r: r['id'])
+                       if all(f(row) for f in query.filters)]
+            if query.limit_to is not None:
+                matched = matched[:query.limit_to]
+            if query.action == 'update':
+                for row in matched:
+                    self._check_unique(row, query.values)
+                    row.update(query.values)
+            elif query.action == 'delete':
+                for row in matched:
+                    del self.rows[row['id']]
+            return _Result(copy.deepcopy(matched))
+
+    def _check_unique(self, row, values):
+        content_hash = values.get('content_hash')
+        if content_hash is None:
+            return
+        for other in self.rows.values():
+            if other['id'] != row['id'] and other['user_id'] == row['user_id'] and other.get('content_hash') == content_hash:
+                raise Exception("{'code': '23505', 'message': 'duplicate key value violates unique constraint'}")
+
+
+def plan(plan_id, updated_at, user_id='u1', content_hash=None, days=DAYS, **meta):
+    return dict(META, id=plan_id, user_id=user_id, meal_plan=days, updated_at=updated_at,
+                content_hash=content_hash, format_version=MEAL_PLAN_FORMAT_VERSION, **meta)
+
+
+def group(client, *plan_ids):
+    return [{k: v for k, v in client.rows[plan_id].items() if k != 'meal_plan'} for plan_id in plan_ids]
+
+
+@pytest.fixture(autouse=True)
+def reset_compaction_cursor(monkeypatch):
+    monkeypatch.setattr(meal_plan_format, '_compaction_after_id', None)
+
+
+def test_newest_copy_survives_and_others_are_deleted():
+    client = FakeMealPlanTable([plan('a', '2025-01-01'), plan('b', '2025-01-03'), plan('c', '2025-01-02')])
+    result = _collapse_duplicates(client, 'u1', HASH, group(client, 'a', 'b', 'c'))
+    assert result == {'hashed': 1, 'removed': 2}
+    assert list(client.rows) == ['b']
+    assert client.rows['b']['content_hash'] == HASH
+
+
+def test_existing_hashed_row_survives_and_takes_latest_updated_at():
+    client = FakeMealPlanTable([
+        plan('old', '2025-01-01', content_hash=HASH), plan('a', '2025-01-05'), plan('b', '2025-01-03')
+    ])
+    result = _collapse_duplicates(client, 'u1', HASH, group(client, 'a', 'b'))
+    assert result == {'hashed': 0, 'removed': 2}
+    assert list(client.rows) == ['old']
+    assert client.rows['old']['updated_at'] == '2025-01-05'
+
+
+def test_unique_violation_falls_back_to_the_concurrently_hashed_row():
+    client = FakeMealPlanTable([plan('a', '2025-01-02'), plan('b', '2025-01-01')])
+
+    def concurrent_save(action, values):
+        # A save of the same plan hashes its row between our lookup and our claim
+        if action == 'update' and values.get('content_hash') and 'saved' not in client.rows:
+            client.rows['saved'] = plan('saved', '2025-01-04', content_hash=HASH)
+
+    client.before = concurrent_save
+    result = _collapse_duplicates(client, 'u1', HASH, group(client, 'a', 'b'))
+    assert result == {'hashed': 0, 'removed': 2}
+    assert list(client.rows) == ['saved']
+
+
+def test_lost_claim_race_leaves_the_group_alone():
+    client = FakeMealPlanTable([plan('a', '2025-01-02'), plan('b', '2025-01-01')])
+    rows = group(client, 'a', 'b')
+    # The head row was edited after the batch read it
+    client.rows['a']['updated_at'] = '2025-01-09'
+    assert _collapse_duplicates(client, 'u1', HASH, rows) == {'hashed': 0, 'removed': 0}
+    assert sorted(client.rows) == ['a', 'b']
+    assert client.rows['a']['content_hash'] is None
+
+
+def test_edited_copy_is_not_deleted():
+    client = FakeMealPlanTable([plan('a', '2025-01-03'), plan('b', '2025-01-02'), plan('c', '2025-01-01')])
+    rows = group(client, 'a', 'b', 'c')
+
+    def edit_copy(action, values):
+        if action == 'delete' and client.rows['b']['updated_at'] == '2025-01-02':
+            client.rows['b'].update(updated_at='2025-01-08', meal_plan=[{'day': 'Monday', 'lunch': 'Fried rice'}])
+
+    client.before = edit_copy
+    assert _collapse_duplicates(client, 'u1', HASH, rows) == {'hashed': 1, 'removed': 1}
+    assert sorted(client.rows) == ['a', 'b']
+    assert client.rows['b']['updated_at'] == '2025-01-08'
+
+
+def test_rows_without_updated_at_are_matched_with_is_null():
+    client = FakeMealPlanTable([plan('a', None), plan('b', None)])
+    assert _collapse_duplicates(client, 'u1', HASH, group(client, 'a', 'b')) == {'hashed': 1, 'removed': 1}
+    assert len(client.rows) == 1
+
+
+def test_compact_batch_groups_by_user_and_content():
+    other_days = [{'day': 'Monday', 'breakfast': 'Pap'}]
+    client = FakeMealPlanTable([
+        plan('1', '2025-01-01'),
+        plan('2', '2025-01-02'),
+        plan('3', '2025-01-03', user_id='u2'),
+        plan('4', '2025-01-04', days=other_days),
+        plan('5', '2025-01-05', days=[]),
+        dict(plan('6', '2025-01-06'), format_version=None),
+    ])
+    result = compact_meal_plan_batch(client, batch_size=50)
+    assert result['success']
+    assert result['data'] == {'hashed': 3, 'removed': 1, 'failed': 0, 'remaining': False}
+    # u1's copy is gone; another user's identical plan, a different plan, an empty
+    # plan and an unmigrated row are left
+    assert sorted(client.rows) == ['2', '3', '4', '5', '6']
+    assert client.rows['3']['content_hash'] == HASH
+    assert client.rows['5']['content_hash'] is None
+    assert client.rows['6']['content_hash'] is None
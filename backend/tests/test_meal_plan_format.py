@@ -0,0 +1,250 @@
+import json
+
+import pytest
+
+from services.meal_plan_format import (
+    LEGACY_FORMAT_VERSION,
+    MEAL_PLAN_FORMAT_VERSION,
+    canonical_columns,
+    fill_plan_fields,
+    is_canonical,
+    is_unique_violation,
+    meal_plan_content_hash,
+    normalize_legacy_plan,
+    split_plan_body,
+)
+
+DAYS = [
+    {'day': 'Monday', 'breakfast': 'Oats', 'lunch': 'Jollof rice'},
+    {'day': 'Tuesday', 'breakfast': 'Akara', 'lunch': 'Egusi soup'},
+]
+META = {'name': 'Week 1', 'startDate': '2025-01-06', 'endDate': '2025-01-12'}
+ENVELOPE = dict(META, mealPlan=DAYS)
+
+
+# --- split_plan_body: every historical shape ---------------------------------
+
+@pytest.mark.parametrize('stored', [DAYS, json.dumps(DAYS)], ids=['list', 'json-string'])
+def test_split_bare_day_list(stored):
+    assert split_plan_body(stored) == (DAYS, {}, DAYS)
+
+
+@pytest.mark.parametrize('stored', [ENVELOPE, json.dumps(ENVELOPE)], ids=['dict', 'json-string'])
+def test_split_meal_plan_envelope(stored):
+    days, meta, body = split_plan_body(stored)
+    assert days == DAYS
+    assert meta == META
+    assert body == ENVELOPE
+
+
+@pytest.mark.parametrize('stored', [
+    {'plan_data': ENVELOPE},
+    json.dumps({'plan_data': ENVELOPE}),
+], ids=['dict', 'json-string'])
+def test_split_plan_data_envelope_around_meal_plan(stored):
+    days, meta, body = split_plan_body(stored)
+    assert days == DAYS
+    assert meta == META
+    # Older readers returned the document with plan_data unwrapped
+    assert body == ENVELOPE
+
+
+def test_split_plan_data_envelope_around_day_list():
+    assert split_plan_body({'plan_data': DAYS}) == (DAYS, {}, DAYS)
+
+
+def test_split_drops_empty_metadata_values():
+    _, meta, _ = split_plan_body({'mealPlan': DAYS, 'name': '', 'startDate': None, 'endDate': '2025-01-12'})
+    assert meta == {'endDate': '2025-01-12'}
+
+
+@pytest.mark.parametrize('stored', [
+    {'mealPlan': 'not a list', 'name': 'Week 1'},
+    {'name': 'Week 1'},
+    {'plan_data': {'notes': 'no days'}},
+])
+def test_split_dict_without_day_list(stored):
+    days, _, body = split_plan_body(stored)
+    assert days is None
+    assert isinstance(body, dict)
+
+
+@pytest.mark.parametrize('stored, body', [
+    (None, None),
+    ('{not json', {}),
+    ('', {}),
+    (42, 42),
+    ({}, {}),
+])
+def test_split_unrecognised_values(stored, body):
+    assert split_plan_body(stored) == (None, {}, body)
+
+
+# --- canonical_columns ---------------------------------------------------------
+
+def test_canonical_columns_from_envelope_uses_document_metadata():
+    row = {'id': 'p1', 'meal_plan': {'plan_data': ENVELOPE}}
+    assert canonical_columns(row) == {
+        'meal_plan': DAYS,
+        'name': 'Week 1',
+        'start_date': '2025-01-06',
+        'end_date': '2025-01-12',
+    }
+
+
+def test_canonical_columns_top_level_columns_win():
+    row = {'meal_plan': json.dumps(ENVELOPE), 'name': 'Renamed', 'start_date': '2025-02-03', 'end_date': None}
+    columns = canonical_columns(row)
+    assert columns['name'] == 'Renamed'
+    assert columns['start_date'] == '2025-02-03'
+    assert columns['end_date'] == '2025-01-12'
+
+
+def test_canonical_columns_bare_list_keeps_columns():
+    row = {'meal_plan': DAYS, 'name': 'Week 1', 'start_date': None, 'end_date': None}
+    assert canonical_columns(row) == {'meal_plan': DAYS, 'name': 'Week 1', 'start_date': None, 'end_date': None}
+
+
+@pytest.mark.parametrize('meal_plan', [None, '{not json', {'name': 'no days'}, {'plan_data': {}}])
+def test_canonical_columns_marks_rows_without_days_as_legacy(meal_plan):
+    assert canonical_columns({'meal_plan': meal_plan}) == {'format_version': LEGACY_FORMAT_VERSION}
+
+
+@pytest.mark.parametrize('meal_plan', [
+    dict(ENVELOPE, notes='Drink more water'),
+    json.dumps(dict(ENVELOPE, shoppingList=['rice', 'beans'])),
+    {'plan_data': ENVELOPE, 'generatedBy': 'nutritionist'},
+    {'plan_data': dict(ENVELOPE, version=2)},
+], ids=['extra-key', 'json-string', 'outer-envelope-key', 'inner-envelope-key'])
+def test_canonical_columns_keeps_documents_with_extra_keys_as_legacy(meal_plan):
+    # Converting would keep only the day list and drop the other keys
+    assert canonical_columns({'meal_plan': meal_plan}) == {'format_version': LEGACY_FORMAT_VERSION}
+
+
+def test_extra_keys_survive_the_legacy_read_path():
+    plan = normalize_legacy_plan({'meal_plan': dict(ENVELOPE, notes='Drink more water')})
+    assert plan['meal_plan']['notes'] == 'Drink more water'
+    assert plan['meal_plan']['mealPlan'] == DAYS
+
+
+def test_is_canonical():
+    assert is_canonical({'format_version': MEAL_PLAN_FORMAT_VERSION})
+    assert not is_canonical({'format_version': LEGACY_FORMAT_VERSION})
+    assert not is_canonical({'format_version': None})
+    assert not is_canonical({})
+
+
+# --- normalize_legacy_plan -----------------------------------------------------
+
+def test_normalize_legacy_envelope_fills_missing_columns():
+    plan = {'id': 'p1', 'meal_plan': json.dumps({'plan_data': ENVELOPE}), 'name': None}
+    result = normalize_legacy_plan(plan)
+    assert result is plan
+    assert plan['meal_plan'] == ENVELOPE
+    assert (plan['name'], plan['start_date'], plan['end_date']) == ('Week 1', '2025-01-06', '2025-01-12')
+
+
+def test_normalize_legacy_keeps_existing_columns():
+    plan = {'meal_plan': ENVELOPE, 'name': 'Kept', 'start_date': '2025-03-03', 'end_date': '2025-03-09'}
+    normalize_legacy_plan(plan)
+    assert (plan['name'], plan['start_date'], plan['end_date']) == ('Kept', '2025-03-03', '2025-03-09')
+
+
+def test_normalize_legacy_day_list_is_left_as_list():
+    plan = normalize_legacy_plan({'meal_plan': json.dumps(DAYS)})
+    assert plan['meal_plan'] == DAYS
+
+
+@pytest.mark.parametrize('meal_plan', [None, '{not json', {}])
+def test_normalize_legacy_unreadable_becomes_empty_list(meal_plan):
+    assert normalize_legacy_plan({'meal_plan': meal_plan})['meal_plan'] == []
+
+
+def test_fill_plan_fields_for_summary_rows():
+    row = {'id': 'p1', 'name': None, 'start_date': '2025-03-03'}
+    assert fill_plan_fields(row, json.dumps({'plan_data': ENVELOPE})) == {
+        'id': 'p1', 'name': 'Week 1', 'start_date': '2025-03-03', 'end_date': '2025-01-12'
+    }
+    assert fill_plan_fields({'name': 'Kept'}, DAYS) == {'name': 'Kept', 'start_date': None, 'end_date': None}
+
+
+# --- meal_plan_content_hash ----------------------------------------------------
+
+ROW_META = {
+    'name': 'Week 1',
+    'start_date': '2025-01-06',
+    'end_date': '2025-01-12',
+    'has_sickness': False,
+    'sickness_type': None,
+}
+
+
+def test_hash_is_stable_and_hex():
+    digest = meal_plan_content_hash(DAYS, ROW_META)
+    assert digest == meal_plan_content_hash(DAYS, dict(ROW_META))
+    assert len(digest) == 64 and int(digest, 16) >= 0
+
+
+def test_hash_ignores_key_order_and_whitespace_of_the_source():
+    reordered = [dict(reversed(list(day.items()))) for day in DAYS]
+    round_tripped = json.loads(json.dumps(DAYS, indent=4))
+    assert meal_plan_content_hash(reordered, ROW_META) == meal_plan_content_hash(DAYS, ROW_META)
+    assert meal_plan_content_hash(round_tripped, ROW_META) == meal_plan_content_hash(DAYS, ROW_META)
+
+
+def test_hash_normalizes_equivalent_metadata():
+    base = meal_plan_content_hash(DAYS, ROW_META)
+    # Timestamps and dates of the same day, None / '' / missing, falsy sickness flags
+    assert meal_plan_content_hash(DAYS, dict(ROW_META, start_date='2025-01-06T00:00:00Z')) == base
+    assert meal_plan_content_hash(DAYS, dict(ROW_META, sickness_type='')) == base
+    assert meal_plan_content_hash(DAYS, {k: v for k, v in ROW_META.items() if k != 'sickness_type'}) == base
+    assert meal_plan_content_hash(DAYS, dict(ROW_META, has_sickness=None)) == base
+
+
+@pytest.mark.parametrize('change', [
+    {'name': 'Week 2'},
+    {'start_date': '2025-01-13'},
+    {'end_date': '2025-01-19'},
+    {'has_sickness': True},
+    {'sickness_type': 'diabetes'},
+])
+def test_hash_changes_with_any_metadata_column(change):
+    assert meal_plan_content_hash(DAYS, dict(ROW_META, **change)) != meal_plan_content_hash(DAYS, ROW_META)
+
+
+def test_hash_changes_with_day_order_and_content():
+    assert meal_plan_content_hash(list(reversed(DAYS)), ROW_META) != meal_plan_content_hash(DAYS, ROW_META)
+    edited = [dict(DAYS[0], lunch='Fried rice'), DAYS[1]]
+    assert meal_plan_content_hash(edited, ROW_META) != meal_plan_content_hash(DAYS, ROW_META)
+
+
+def test_hash_handles_non_ascii_content():
+    days = [{'day': 'Lundi', 'breakfast': 'Crêpes, café'}]
+    assert meal_plan_content_hash(days, ROW_META) == meal_plan_content_hash(json.loads(json.dumps(days)), ROW_META)
+
+
+@pytest.mark.parametrize('days', [[], None])
+def test_empty_plans_are_never_hashed(days):
+    assert meal_plan_content_hash(days, ROW_META) is None
+
+
+def test_hash_of_each_legacy_shape_matches_canonical_row():
+    # The compaction job hashes canonical_columns() output; every stored shape of
+    # the same plan must end up with the same identity
+    expected = meal_plan_content_hash(DAYS, ROW_META)
+    for stored in (ENVELOPE, json.dumps(ENVELOPE), {'plan_data': ENVELOPE}, json.dumps({'plan_data': ENVELOPE})):
+        columns = canonical_columns({'meal_plan': stored})
+        metadata = dict(ROW_META, **{k: columns[k] for k in ('name', 'start_date', 'end_date')})
+        assert meal_plan_content_hash(columns['meal_plan'], metadata) == expected
+
+
+# --- is_unique_violation -------------------------------------------------------
+
+@pytest.mark.parametrize('message, expected', [
+    ("{'code': '23505', 'message': 'duplicate key value violates unique constraint'}", True),
+    ('duplicate key value violates unique constraint "uq_meal_plan_management_user_content_hash"', True),
+    ("{'code': '23503', 'message': 'insert or update violates foreign key constraint'}", False),
+    ('timeout', False),
+])
+def test_is_unique_violation(message, expected):
+    assert is_unique_violation(Exception(message)) is expected
@@ -0,0 +1,120 @@
+import base64
+import json
+
+import pytest
+
+from utils.pagination import decode_cursor, decode_keyset_cursor, encode_cursor, keyset_filter, split_page
+
+
+def test_round_trip_keyset_position():
+    position = {'updated_at': '2025-01-06T10:15:00+00:00', 'id': '6f1c2a9e-0d7b-4a7e-9a55-3f0f0c1d2e3f'}
+    assert decode_cursor(encode_cursor(position)) == position
+
+
+def test_round_trip_non_ascii_and_nested_values():
+    position = {'name': 'Épinards & çà', 'offset': 3, 'tie': [1, None, True]}
+    assert decode_cursor(encode_cursor(position)) == position
+
+
+def test_token_is_url_safe_and_unpadded():
+    # Lengths that need '=' padding and bytes that map to '+' / '/' in standard base64
+    for position in ({'a': '>>>'}, {'ab': '???'}, {'abc': '\xff\xfe'}):
+        token = encode_cursor(position)
+        assert '=' not in token
+        assert '+' not in token and '/' not in token
+        assert decode_cursor(token) == position
+
+
+def test_encoding_is_deterministic():
+    position = {'updated_at': '2025-01-06T10:15:00Z', 'id': 'abc'}
+    assert encode_cursor(position) == encode_cursor(dict(position))
+
+
+def test_accepts_padded_token():
+    token = encode_cursor({'id': 'x'})
+    padded = token + '=' * (-len(token) % 4)
+    assert decode_cursor(padded) == {'id': 'x'}
+
+
+def _b64(raw: bytes) -> str:
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+@pytest.mark.parametrize('token', [
+    '',                                  # empty
+    '!!!not-base64!!!',                  # characters outside the alphabet
+    'a',                                 # impossible base64 length
+    _b64(b'{"id": "x"'),                 # truncated JSON
+    _b64(b'\xff\xfe\x00'),               # not UTF-8 / not JSON
+    _b64(b'not json at all'),
+    'é' + encode_cursor({'id': 'x'}),    # non-ASCII token
+])
+def test_malformed_tokens_raise_value_error(token):
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        decode_cursor(token)
+
+
+@pytest.mark.parametrize('payload', [[1, 2], 'id', 42, None, True])
+def test_well_formed_json_that_is_not_an_object_is_rejected(payload):
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        decode_cursor(_b64(json.dumps(payload).encode('utf-8')))
+
+
+# --- keyset cursors for (updated_at, id) pages -----------------------------------
+
+PLAN_ID = '6f1c2a9e-0d7b-4a7e-9a55-3f0f0c1d2e3f'
+
+
+@pytest.mark.parametrize('updated_at', ['2025-01-06T10:15:00+00:00', '2025-01-06T10:15:00.123456Z', '2025-01-06'])
+def test_keyset_cursor_accepts_timestamps_and_plain_ids(updated_at):
+    position = {'u': updated_at, 'i': PLAN_ID}
+    assert decode_keyset_cursor(encode_cursor(position)) == position
+
+
+@pytest.mark.parametrize('position', [
+    {'i': PLAN_ID},                                              # no updated_at
+    {'u': 1736158500, 'i': PLAN_ID},                             # not a string
+    {'u': 'yesterday', 'i': PLAN_ID},                            # not a timestamp
+    {'u': '2025-01-06T10:15:00Z,id.gt.0', 'i': PLAN_ID},         # filter injection
+    {'u': '2025-01-06T10:15:00Z'},                               # no id
+    {'u': '2025-01-06T10:15:00Z', 'i': ''},
+    {'u': '2025-01-06T10:15:00Z', 'i': 'x),or(user_id.neq.0'},  # filter injection
+])
+def test_keyset_cursor_rejects_unsafe_positions(position):
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        decode_keyset_cursor(encode_cursor(position))
+
+
+def test_keyset_cursor_rejects_malformed_tokens():
+    with pytest.raises(ValueError, match='Invalid cursor'):
+        decode_keyset_cursor('!!!not-base64!!!')
+
+
+def test_keyset_filter_continues_after_position_in_descending_order():
+    assert keyset_filter({'u': '2025-01-06T10:15:00+00:00', 'i': PLAN_ID}) == (
+        'updated_at.lt."2025-01-06T10:15:00+00:00",'
+        f'and(updated_at.eq."2025-01-06T10:15:00+00:00",id.lt.{PLAN_ID})'
+    )
+
+
+def _rows(count):
+    return [{'id': f'id-{n}', 'updated_at': f'2025-01-{30 - n:02d}T00:00:00Z'} for n in range(count)]
+
+
+def test_split_page_with_extra_row_has_more():
+    rows, next_cursor = split_page(_rows(4), 3)
+    assert [row['id'] for row in rows] == ['id-0', 'id-1', 'id-2']
+    # The cursor points at the last returned row, not the extra one
+    assert decode_cursor(next_cursor) == {'u': '2025-01-28T00:00:00Z', 'i': 'id-2'}
+    assert decode_keyset_cursor(next_cursor)
+
+
+@pytest.mark.parametrize('count', [0, 2, 3])
+def test_split_page_without_extra_row_is_the_last_page(count):
+    rows, next_cursor = split_page(_rows(count), 3)
+    assert len(rows) == count
+    assert next_cursor is None
+
+
+def test_split_page_without_limit_returns_everything():
+    assert split_page(_rows(5), None) == (_rows(5), None)
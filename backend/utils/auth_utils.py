@@ -1,30 +1,85 @@
-from flask import request, current_app
+from flask import request, current_app, g
 import traceback
 
-def get_user_id_from_token():
-    """Extract user ID from token with proper error handling"""
+def _get_auth_service():
+    """Return the AuthService from the app (legacy app.py) or the DI container (app factory)."""
+    auth_service = getattr(current_app, 'auth_service', None)
+    if auth_service is None:
+        from core.service_registry import get_service
+        auth_service = get_service('auth_service')
+    return auth_service
+
+def _extract_request_token():
+    """Return (token, source) from the Authorization header or access_token cookie."""
+    auth_header = request.headers.get('Authorization')
+    if auth_header:
+        token = auth_header[7:] if auth_header.startswith('Bearer ') else auth_header
+        return token, 'header'
+
+    # Fallback to cookie-based token if Authorization header is missing
+    cookie_token = request.cookies.get('access_token')
+    if cookie_token:
+        return cookie_token, 'cookie'
+
+    return None, None
+
+def resolve_request_principal():
+    """
+    Resolve the authenticated user for the current request, once.
+
+    The result is memoized on flask.g so every helper and decorator that runs
+    during the request shares a single token verification.
+
+    Returns:
+        tuple: (principal, error) where principal is a dict with
+        user_id, email, user_metadata and token_source, or None.
+    """
+    if getattr(g, 'auth_resolved', False):
+        return g.auth_principal, g.auth_error
+
+    principal, error = None, None
     try:
-        auth_service = current_app.auth_service
-        auth_header = request.headers.get('Authorization')
-
-        # Fallback to cookie-based token if Authorization header is missing
-        if not auth_header:
-            cookie_token = request.cookies.get('access_token')
-            if cookie_token:
-                auth_header = f"Bearer {cookie_token}"
+        token, source = _extract_request_token()
+        if not token:
+            error = "No Authorization header or access_token cookie provided"
+        else:
+            auth_service = _get_auth_service()
+            if not auth_service:
+                error = "Authentication service not available"
             else:
-                return None, "No Authorization header or access_token cookie provided"
-
-        user_id, auth_type = auth_service.get_supabase_user_id_from_token(auth_header)
-        
-        if not user_id:
-            return None, f"Token verification failed. Auth type attempted: {auth_type}"
-        
-        return user_id, None
+                principal = auth_service.get_principal_from_token(token)
+                if principal:
+                    principal = dict(principal, token_source=source)
+                else:
+                    error = f"Token verification failed. Auth type attempted: supabase ({source} token)"
     except Exception as e:
         current_app.logger.error(f"Error extracting user ID from token: {str(e)}")
         current_app.logger.error(f"Traceback: {traceback.format_exc()}")
-        return None, f"Token processing error: {str(e)}"
+        principal, error = None, f"Token processing error: {str(e)}"
+
+    g.auth_principal = principal
+    g.auth_error = error
+    g.auth_resolved = True
+    return principal, error
+
+def load_request_principal():
+    """before_request hook: resolve the caller up front for any request carrying a token."""
+    if request.method == 'OPTIONS':
+        return None
+    if request.headers.get('Authorization') or request.cookies.get('access_token'):
+        resolve_request_principal()
+    return None
+
+def init_request_auth(app):
+    """Register the shared authentication stage on a Flask app."""
+    app.before_request(load_request_principal)
+
+def get_user_id_from_token():
+    """Extract user ID from token with proper error handling"""
+    principal, error = resolve_request_principal()
+    if not principal:
+        return None, error
+    return principal['user_id'], None
 
 def log_error(message: str, error: Exception = None):
     """Centralized error logging"""
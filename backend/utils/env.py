@@ -0,0 +1,9 @@
+import os
+
+
+def int_env(name: str, default: int) -> int:
+    """Integer environment setting, or default when unset or not a number."""
+    try:
+        return int(os.environ.get(name, str(default)))
+    except ValueError:
+        return default
@@ -0,0 +1,102 @@
+from functools import wraps
+import os
+import time
+from flask import request, jsonify, make_response, current_app
+from services.idempotency_store import idempotency_store, ACTIVATED_ELSEWHERE, CLAIMED, COMPLETED, CONFLICT, IN_PROGRESS
+from utils.auth_utils import resolve_request_principal
+
+try:
+    WAIT_FOR_IN_PROGRESS_SECONDS = float(os.environ.get('IDEMPOTENCY_WAIT_SECONDS', '5'))
+except ValueError:
+    WAIT_FOR_IN_PROGRESS_SECONDS = 5.0
+
+
+def payment_reference(data: dict):
+    """Paystack reference for an activation request (body or Idempotency-Key header)."""
+    paystack_data = data.get('paystack_data') or {}
+    reference = paystack_data.get('reference') if isinstance(paystack_data, dict) else None
+    return reference or data.get('reference') or request.headers.get('Idempotency-Key')
+
+
+def _request_owner(data: dict):
+    """The caller's user id: the authenticated principal if any, else the body's user_id."""
+    principal, _ = resolve_request_principal()
+    if principal:
+        return principal['user_id']
+    return data.get('user_id')
+
+
+def idempotent_by_reference(scope: str):
+    """
+    Replay the first successful response for a payment reference.
+
+    Stored responses are per scope: only the endpoint that produced a response
+    replays it. A payment already activated through another decorated endpoint
+    is not run again; the caller gets an 'already activated' answer instead of
+    that endpoint's body. Requests without a reference run normally. Failed
+    responses are not stored, so the client can retry them.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            data = request.get_json(silent=True) or {}
+            reference = payment_reference(data)
+            if not reference:
+                return f(*args, **kwargs)
+            reference = str(reference)
+            owner = _request_owner(data)
+            owner = str(owner) if owner else None
+
+            try:
+                deadline = time.monotonic() + WAIT_FOR_IN_PROGRESS_SECONDS
+                state, stored = idempotency_store.begin(reference, owner, scope)
+                while state == IN_PROGRESS and time.monotonic() < deadline:
+                    time.sleep(0.5)
+                    state, stored = idempotency_store.begin(reference, owner, scope)
+            except Exception as e:
+                # Never block a payment on the idempotency store itself
+                current_app.logger.warning(f"[Idempotency] Store unavailable, running {scope} without it: {e}")
+                return f(*args, **kwargs)
+
+            if state == COMPLETED:
+                response = jsonify(stored['body'])
+                response.status_code = stored['status_code']
+                response.headers['Idempotent-Replayed'] = 'true'
+                return response
+            if state == ACTIVATED_ELSEWHERE:
+                current_app.logger.info(f"[Idempotency] {reference} already activated via {stored.get('scope')}; skipping {scope}")
+                return jsonify({
+                    'success': True,
+                    'already_activated': True,
+                    'message': 'This payment has already been activated'
+                }), 200
+            if state == CONFLICT:
+                return jsonify({
+                    'success': False,
+                    'error': 'This payment reference has already been used',
+                    'error_code': 'PAYMENT_REFERENCE_CONFLICT'
+                }), 409
+            if state != CLAIMED:
+                return jsonify({
+                    'success': False,
+                    'error': 'This payment is already being processed. Please retry shortly.',
+                    'error_code': 'PAYMENT_IN_PROGRESS'
+                }), 409
+
+            claim_id = stored['claim_id']
+            try:
+                response = make_response(f(*args, **kwargs))
+            except Exception:
+                idempotency_store.release(reference, scope, claim_id)
+                raise
+
+            try:
+                if 200 <= response.status_code < 300 and response.is_json:
+                    idempotency_store.complete(reference, scope, claim_id, response.status_code, response.get_json())
+                else:
+                    idempotency_store.release(reference, scope, claim_id)
+            except Exception as e:
+                current_app.logger.warning(f"[Idempotency] Could not record result for {scope}:{reference}: {e}")
+            return response
+        return decorated_function
+    return decorator
@@ -0,0 +1,68 @@
+import base64
+import json
+import re
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+
+def encode_cursor(position: dict) -> str:
+    """Opaque, URL-safe token for a keyset position."""
+    raw = json.dumps(position, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: str) -> dict:
+    """
+    Decode a token from encode_cursor.
+
+    Raises:
+        ValueError: If the token is malformed
+    """
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not isinstance(position, dict):
+        raise ValueError('Invalid cursor')
+    return position
+
+
+def decode_keyset_cursor(token: str) -> dict:
+    """
+    Decode and validate an (updated_at, id) cursor: {'u': ISO timestamp, 'i': id}.
+
+    The values are interpolated into a PostgREST filter, so anything but a
+    timestamp and a plain id is rejected.
+
+    Raises:
+        ValueError: If the token is malformed
+    """
+    position = decode_cursor(token)
+    if not isinstance(position.get('u'), str) or not re.fullmatch(r'[A-Za-z0-9-]+', str(position.get('i', ''))):
+        raise ValueError('Invalid cursor')
+    try:
+        datetime.fromisoformat(position['u'].replace('Z', '+00:00'))
+    except ValueError:
+        raise ValueError('Invalid cursor')
+    return position
+
+
+def keyset_filter(position: dict) -> str:
+    """PostgREST or= filter for rows after `position` in (updated_at, id) descending order."""
+    updated_at, row_id = f'"{position["u"]}"', position['i']
+    return f'updated_at.lt.{updated_at},and(updated_at.eq.{updated_at},id.lt.{row_id})'
+
+
+def split_page(rows: List[dict], limit: Optional[int]) -> Tuple[List[dict], Optional[str]]:
+    """
+    Trim rows fetched with limit + 1 to one page.
+
+    Returns:
+        (page rows, next_cursor): next_cursor is None on the last page
+    """
+    if not limit or len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, encode_cursor({'u': last['updated_at'], 'i': last['id']})
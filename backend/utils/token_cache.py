@@ -0,0 +1,121 @@
+"""
+Bounded, thread-safe cache of verified access tokens.
+
+Maps a SHA-256 hash of the bearer token to the resolved principal
+(user_id, email, user_metadata). Entries expire at the token's `exp` claim
+or after the configured TTL, whichever comes first.
+"""
+
+import base64
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+from utils.env import int_env
+
+
+def hash_token(token: str) -> str:
+    """Return the cache key for a raw token (never store tokens themselves)."""
+    return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+
+def get_token_expiry(token: str) -> Optional[float]:
+    """
+    Read the `exp` claim from a JWT payload without verifying it.
+
+    Only used for eviction once the token has already been verified.
+    """
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        claims = json.loads(base64.urlsafe_b64decode(payload.encode('ascii')))
+        exp = claims.get('exp')
+        return float(exp) if exp is not None else None
+    except Exception:
+        return None
+
+
+class TokenCache:
+    """LRU cache from token hash to principal with expiry-aware eviction"""
+
+    def __init__(self, max_size: int = 10000, ttl_seconds: int = 300):
+        self.max_size = max(1, max_size)
+        self.ttl_seconds = max(1, ttl_seconds)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, token: str) -> Optional[Dict[str, Any]]:
+        """Return the cached principal for a token, or None on miss/expiry."""
+        key = hash_token(token)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, principal = entry
+            if expires_at <= now:
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return dict(principal)
+
+    def set(self, token: str, principal: Dict[str, Any], exp: Optional[float] = None) -> None:
+        """
+        Cache a verified principal.
+
+        Args:
+            token: Raw access token
+            principal: Dict with user_id, email and user_metadata
+            exp: Token expiry (epoch seconds); read from the token when omitted
+        """
+        now = time.time()
+        if exp is None:
+            exp = get_token_expiry(token)
+        expires_at = now + self.ttl_seconds
+        if exp is not None:
+            expires_at = min(expires_at, exp)
+        if expires_at <= now:
+            return
+
+        key = hash_token(token)
+        with self._lock:
+            self._entries[key] = (expires_at, dict(principal))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, token: str) -> None:
+        """Drop a single token (e.g. on logout)."""
+        with self._lock:
+            self._entries.pop(hash_token(token), None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss counters and current size."""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'ttl_seconds': self.ttl_seconds,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+# Process-wide instance shared by every auth entry point
+token_cache = TokenCache(
+    max_size=int_env('TOKEN_CACHE_MAX_SIZE', 10000),
+    ttl_seconds=int_env('TOKEN_CACHE_TTL', 300),
+)
@@ -102,8 +102,10 @@ export const InviteUserForm = ({ enterpriseId, onClose, onSuccess, teamName }: I
       if (result.success) {
         resetForm();
         
-        // Always show success - invitation was created even if email failed
-        if (!result.email_sent && result.invitation_link) {
+        // Always show success - invitation was created even if email failed.
+        // Emails are queued for delivery, so 'queued' counts as on its way.
+        const emailOnItsWay = result.email_sent || result.email_status === 'queued';
+        if (!emailOnItsWay && result.invitation_link) {
           // Email failed but invitation was created - show link modal
           const fallbackReason =
             result.email_error ||
@@ -116,11 +118,11 @@ export const InviteUserForm = ({ enterpriseId, onClose, onSuccess, teamName }: I
             description: "Invitation was created but email could not be sent. Please share the link manually.",
             variant: "default",
           });
-        } else if (result.email_sent) {
-          // Email sent successfully
+        } else if (emailOnItsWay) {
+          // Email queued for delivery
           Swal.fire({
             title: "Invitation Sent!",
-            text: `Successfully sent invitation to ${formData.email}`,
+            text: `An invitation email is on its way to ${formData.email}`,
             icon: "success",
             draggable: true,
             confirmButtonColor: "#0f172a",